@@ -0,0 +1,115 @@
+"""Compare the latency and CPU cost of the threaded ``NetworkDataSource`` and
+the asyncio ``AsyncNetworkDataSource`` receiving a paced stream of JSON
+messages from a local TCP server, standing in for a VI or the simulator.
+
+The server runs in a separate process so it doesn't compete for the GIL.
+Each message carries the time it was sent, so latency is measured from the
+server's ``sendall`` to the message reaching the callback or ``async for``,
+and CPU time is only the receiving process.
+
+Run from the repository root:
+
+    python -m benchmarks.asyncio_sources
+"""
+import asyncio
+import multiprocessing
+import socket
+import threading
+import time
+
+from openxc.formats.json import JsonStreamer
+from openxc.sources import NetworkDataSource, AsyncNetworkDataSource
+from openxc.utils import Histogram
+
+MESSAGE_COUNT = 40000
+BATCH_SIZE = 20
+# Seconds between batches, i.e. 20k messages/s
+BATCH_INTERVAL = 0.001
+
+
+def serve(port_pipe):
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    port_pipe.send(server.getsockname()[1])
+
+    connection, _ = server.accept()
+    # don't let Nagle's algorithm and delayed ACKs dominate the latency
+    connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    streamer = JsonStreamer()
+    next_batch = time.time()
+    for start in range(0, MESSAGE_COUNT, BATCH_SIZE):
+        now = time.time()
+        connection.sendall(streamer.serialize_many(
+            {'name': "vehicle_speed", 'value': value, 'timestamp': now}
+            for value in range(start, start + BATCH_SIZE)))
+        next_batch += BATCH_INTERVAL
+        delay = next_batch - time.time()
+        if delay > 0:
+            time.sleep(delay)
+    connection.close()
+    server.close()
+
+
+def start_server():
+    receiver, sender = multiprocessing.Pipe(False)
+    process = multiprocessing.Process(target=serve, args=(sender,))
+    process.start()
+    return receiver.recv(), process
+
+
+def run_threaded():
+    port, server_thread = start_server()
+    latency = Histogram()
+    done = threading.Event()
+    received = [0]
+
+    def receive(message):
+        latency.record(time.time() - message['timestamp'])
+        received[0] += 1
+        if received[0] == MESSAGE_COUNT:
+            done.set()
+
+    source = NetworkDataSource(host='127.0.0.1', port=port, callback=receive,
+            payload_format="json")
+    cpu_started = time.process_time()
+    source.start()
+    done.wait(60)
+    cpu = time.process_time() - cpu_started
+    server_thread.join()
+    source.join(1)
+    return latency, cpu
+
+
+def run_asyncio():
+    port, server_thread = start_server()
+    latency = Histogram()
+
+    async def receive():
+        async with AsyncNetworkDataSource(host='127.0.0.1', port=port,
+                payload_format="json") as source:
+            async for message in source:
+                latency.record(time.time() - message['timestamp'])
+
+    loop = asyncio.new_event_loop()
+    cpu_started = time.process_time()
+    loop.run_until_complete(receive())
+    cpu = time.process_time() - cpu_started
+    loop.close()
+    server_thread.join()
+    return latency, cpu
+
+
+def main():
+    duration = MESSAGE_COUNT / BATCH_SIZE * BATCH_INTERVAL
+    for label, run in [("threaded", run_threaded), ("asyncio", run_asyncio)]:
+        latency, cpu = run()
+        assert latency.count == MESSAGE_COUNT
+        print("%-9s latency p50 %.3fms p99 %.3fms max %.3fms, "
+                "CPU %.2fs for %.1fs of data" % (label,
+                    latency.percentile(50) * 1e3, latency.percentile(99) * 1e3,
+                    latency.max / 1e6, cpu, duration))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Compare analysing a trace file by parsing every record into a dict with
+converting it to per-signal columns once and loading the saved columns.
+
+Run from the repository root:
+
+    python -m benchmarks.columnar
+"""
+import os
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+
+from openxc.columnar import ColumnarTrace
+from openxc.formats.json import JsonFormatter
+
+RECORD_COUNT = 500000
+STATES = ["park", "reverse", "neutral", "first", "second"]
+
+
+def write_trace(path):
+    with open(path, "wb") as trace_file:
+        for index in range(RECORD_COUNT):
+            if index % 4 == 0:
+                record = {'name': "transmission_gear_position",
+                        'value': STATES[index % len(STATES)]}
+            elif index % 4 == 1:
+                record = {'name': "brake_pedal_status",
+                        'value': index % 3 == 0}
+            else:
+                record = {'name': "vehicle_speed", 'value': index % 120}
+            record['timestamp'] = 1364323939.012 + index * 0.01
+            trace_file.write(JsonFormatter.serialize(record) + b"\n")
+
+
+def load_dicts(path):
+    signals = defaultdict(list)
+    with open(path, "rb") as trace_file:
+        for line in trace_file:
+            message = JsonFormatter.deserialize(line)
+            signals[message['name']].append(message)
+    return signals
+
+
+def mean_speed_dicts(signals):
+    speeds = [message['value'] for message in signals['vehicle_speed']]
+    return sum(speeds) / len(speeds)
+
+
+def mean_speed_columns(columns):
+    return columns['vehicle_speed'].values.mean()
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, "trace.json")
+        write_trace(path)
+
+        signals, elapsed = timed(load_dicts, path)
+        mean, analysis = timed(mean_speed_dicts, signals)
+        print("dicts      load %7.1fms  mean speed %6.2fms" % (elapsed * 1e3,
+                analysis * 1e3))
+        del signals
+
+        columns, elapsed = timed(ColumnarTrace.from_traces, path)
+        print("convert    %7.1fms" % (elapsed * 1e3))
+        for name in ["columns.npz", "columns"]:
+            output = os.path.join(directory, name)
+            columns.save(output)
+            loaded, elapsed = timed(ColumnarTrace.load, output)
+            column_mean, analysis = timed(mean_speed_columns, loaded)
+            assert abs(column_mean - mean) < 1e-6
+            print("%-10s load %7.1fms  mean speed %6.2fms" % (name,
+                    elapsed * 1e3, analysis * 1e3))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
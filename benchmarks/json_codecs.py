@@ -0,0 +1,36 @@
+"""Measure the encode and decode throughput of every installed JSON codec
+registered with ``JsonFormatter``, using a mix of typical OpenXC messages.
+
+Run from the repository root:
+
+    python -m benchmarks.json_codecs
+"""
+import timeit
+
+from openxc.formats.json import JSON_CODECS
+
+MESSAGES = [
+    {'name': "vehicle_speed", 'value': 42.5, 'timestamp': 1332794184.319},
+    {'name': "door_status", 'value': "driver", 'event': False},
+    {'bus': 1, 'id': 1234, 'data': "0x1234567890abcdef"},
+    {'bus': 1, 'id': 2024, 'mode': 1, 'pid': 12, 'frame': -1,
+        'success': True, 'payload': "0x1234"},
+] * 2500
+REPEAT = 5
+
+
+def main():
+    serialized = [JSON_CODECS['json'].dumps(message) for message in MESSAGES]
+    for name, codec in JSON_CODECS.items():
+        loads, dumps = codec.loads, codec.dumps
+        decode = min(timeit.repeat(lambda: [loads(data) for data in serialized],
+                number=1, repeat=REPEAT))
+        encode = min(timeit.repeat(lambda: [dumps(message)
+                for message in MESSAGES], number=1, repeat=REPEAT))
+        print("%-12s decode %6.0fk messages/s  encode %6.0fk messages/s" % (
+                name, len(MESSAGES) / decode / 1e3,
+                len(MESSAGES) / encode / 1e3))
+
+
+if __name__ == '__main__':
+    main()
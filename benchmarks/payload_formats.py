@@ -0,0 +1,51 @@
+"""Compare the encoded size and stream decode throughput of the JSON, protobuf
+and MessagePack payload formats, using a mix of typical OpenXC messages.
+
+Run from the repository root:
+
+    python -m benchmarks.payload_formats
+"""
+import timeit
+
+from openxc.formats.binary import ProtobufStreamer
+from openxc.formats.json import JsonStreamer
+from openxc.formats.messagepack import MessagePackStreamer
+
+MESSAGES = [
+    {'name': "vehicle_speed", 'value': 42.5},
+    {'name': "door_status", 'value': "driver", 'event': False},
+    {'bus': 1, 'id': 1234, 'data': "0x1234567890abcdef"},
+    {'bus': 1, 'id': 2024, 'mode': 1, 'pid': 12, 'frame': -1,
+        'success': True, 'payload': "0x1234"},
+] * 2500
+REPEAT = 5
+READ_SIZE = 4096
+
+STREAMERS = [
+    ("json", JsonStreamer),
+    ("protobuf", ProtobufStreamer),
+    ("messagepack", MessagePackStreamer),
+]
+
+
+def decode(streamer_class, serialized):
+    streamer = streamer_class()
+    count = 0
+    for start in range(0, len(serialized), READ_SIZE):
+        streamer.receive(serialized[start:start + READ_SIZE])
+        count += len(streamer.parse_all())
+    assert count == len(MESSAGES)
+
+
+def main():
+    for name, streamer_class in STREAMERS:
+        serialized = streamer_class().serialize_many(MESSAGES)
+        elapsed = min(timeit.repeat(lambda: decode(streamer_class, serialized),
+                number=1, repeat=REPEAT))
+        print("%-12s %5.1f bytes/message  decode %6.0fk messages/s" % (
+                name, len(serialized) / float(len(MESSAGES)),
+                len(MESSAGES) / elapsed / 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""Compare the CPU time per frame of ``ProtobufFormatter`` with the previous
+implementation, which allocated a new ``VehicleMessage`` for every frame and
+picked its path through if/elif chains. The "before" numbers come from a
+verbatim copy of the baseline formatter in ``benchmarks.baseline_protobuf``.
+
+Run from the repository root:
+
+    python -m benchmarks.protobuf_formatter
+"""
+import timeit
+
+from openxc.formats.binary import ProtobufFormatter
+from benchmarks.baseline_protobuf import \
+        ProtobufFormatter as BaselineProtobufFormatter
+
+MESSAGES = [
+    {'bus': 1, 'id': 0x123, 'data': "0x1234567890abcdef"},
+    {'name': "vehicle_speed", 'value': 42.5, 'event': False},
+    {'command_response': "version", 'message': "v8.0.0", 'status': True},
+] * 2000
+REPEAT = 5
+
+
+def main():
+    serialized = [ProtobufFormatter.serialize(message) for message in MESSAGES]
+    for name, formatter in [("before", BaselineProtobufFormatter),
+            ("after", ProtobufFormatter)]:
+        deserialize, serialize = formatter.deserialize, formatter.serialize
+        assert [deserialize(data) for data in serialized] == [
+                ProtobufFormatter.deserialize(data) for data in serialized]
+        decode = min(timeit.repeat(lambda: [deserialize(data)
+                for data in serialized], number=1, repeat=REPEAT))
+        encode = min(timeit.repeat(lambda: [serialize(message)
+                for message in MESSAGES], number=1, repeat=REPEAT))
+        print("%-7s deserialize %6.2f us/frame  serialize %6.2f us/frame" % (
+                name, decode / len(MESSAGES) * 1e6,
+                encode / len(MESSAGES) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
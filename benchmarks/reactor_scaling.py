@@ -0,0 +1,121 @@
+"""Compare a thread per ``NetworkDataSource`` with reading all of them from
+one ``SourceReactor`` thread, as the number of sources grows.
+
+A local TCP server in a separate process stands in for many VIs, sending a
+paced stream of JSON messages on each connection. For each source count the
+receiving process's thread count, CPU time and context switches (voluntary and
+involuntary, from ``getrusage``) are reported.
+
+Run from the repository root:
+
+    python -m benchmarks.reactor_scaling
+"""
+import multiprocessing
+import resource
+import socket
+import threading
+import time
+
+from openxc.formats.json import JsonStreamer
+from openxc.sources import NetworkDataSource, SourceReactor
+
+SOURCE_COUNTS = (1, 8, 32, 128)
+# Messages per source per second, for DURATION seconds
+MESSAGE_RATE = 500
+BATCH_SIZE = 10
+DURATION = 2.0
+
+
+def serve(source_count, port_pipe):
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(source_count)
+    port_pipe.send(server.getsockname()[1])
+
+    connections = [server.accept()[0] for _ in range(source_count)]
+    streamer = JsonStreamer()
+    batch = streamer.serialize_many({'name': "vehicle_speed", 'value': value}
+            for value in range(BATCH_SIZE))
+    batch_interval = BATCH_SIZE / float(MESSAGE_RATE)
+    next_batch = time.time()
+    for _ in range(int(DURATION / batch_interval)):
+        for connection in connections:
+            connection.sendall(batch)
+        next_batch += batch_interval
+        delay = next_batch - time.time()
+        if delay > 0:
+            time.sleep(delay)
+    for connection in connections:
+        connection.close()
+    server.close()
+
+
+def start_server(source_count):
+    receiver, sender = multiprocessing.Pipe(False)
+    process = multiprocessing.Process(target=serve,
+            args=(source_count, sender))
+    process.start()
+    return receiver.recv(), process
+
+
+def run(source_count, use_reactor):
+    port, server = start_server(source_count)
+    received = [0]
+    lock = threading.Lock()
+
+    def receive(message):
+        with lock:
+            received[0] += 1
+
+    sources = [NetworkDataSource(host='127.0.0.1', port=port,
+            callback=receive, payload_format="json")
+            for _ in range(source_count)]
+    threads_before = threading.active_count()
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_started = time.process_time()
+    if use_reactor:
+        reactor = SourceReactor()
+        for source in sources:
+            reactor.add_source(source)
+        reactor.start()
+    else:
+        for source in sources:
+            source.start()
+    threads = threading.active_count() - threads_before
+
+    server.join()
+    expected = source_count * int(DURATION * MESSAGE_RATE /
+            BATCH_SIZE) * BATCH_SIZE
+    deadline = time.time() + 10
+    while received[0] < expected and time.time() < deadline:
+        time.sleep(0.01)
+    cpu = time.process_time() - cpu_started
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+
+    if use_reactor:
+        reactor.stop()
+        reactor.join(1)
+    else:
+        for source in sources:
+            source.stop()
+    for source in sources:
+        source.socket.close()
+    return (received[0] == expected, threads, cpu,
+            usage.ru_nvcsw - usage_before.ru_nvcsw,
+            usage.ru_nivcsw - usage_before.ru_nivcsw)
+
+
+def main():
+    print("%7s %-8s %7s %7s %12s %14s" % ("sources", "reader", "threads",
+        "CPU", "voluntary cs", "involuntary cs"))
+    for source_count in SOURCE_COUNTS:
+        for label, use_reactor in [("threads", False), ("reactor", True)]:
+            complete, threads, cpu, voluntary, involuntary = run(
+                    source_count, use_reactor)
+            assert complete
+            print("%7d %-8s %7d %6.2fs %12d %14d" % (source_count, label,
+                threads, cpu, voluntary, involuntary))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Measure the throughput and CPU cost of ``SerialDataSource`` reading a
+stream of JSON messages from a local pseudo-terminal, standing in for a VI
+connected over a serial port.
+
+Run from the repository root (requires pyserial and a POSIX pty):
+
+    python -m benchmarks.serial_pty
+"""
+import os
+import threading
+import time
+
+from openxc.formats.json import JsonStreamer
+from openxc.sources import SerialDataSource
+
+MESSAGE_COUNT = 50000
+WRITE_SIZE = 4096
+
+
+def run(**kwargs):
+    master, slave = os.openpty()
+    received = [0]
+    done = threading.Event()
+
+    def receive(message):
+        received[0] += 1
+        if received[0] == MESSAGE_COUNT:
+            done.set()
+
+    source = SerialDataSource(port=os.ttyname(slave), callback=receive,
+            payload_format="json", **kwargs)
+    os.close(slave)
+    serialized = JsonStreamer().serialize_many(
+            {'name': "vehicle_speed", 'value': value}
+            for value in range(MESSAGE_COUNT))
+
+    def write():
+        for start in range(0, len(serialized), WRITE_SIZE):
+            os.write(master, serialized[start:start + WRITE_SIZE])
+
+    writer = threading.Thread(target=write)
+    started, cpu_started = time.perf_counter(), time.process_time()
+    source.start()
+    writer.start()
+    done.wait(60)
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+
+    writer.join()
+    source.stop()
+    source.join(1)
+    source.device.close()
+    os.close(master)
+    return received[0], elapsed, cpu
+
+
+def main():
+    for label, kwargs in [("max_read_size=1", dict(max_read_size=1)),
+            ("default", {})]:
+        count, elapsed, cpu = run(**kwargs)
+        print("%-16s %6.0fk messages/s  %5.2fus CPU/message (%d messages)" % (
+                label, count / elapsed / 1e3, cpu / count * 1e6, count))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Compare the per-message cost of the offset-based ``MessageBuffer`` used by
+the streamers with the previous implementation, which appended to an immutable
+``bytes`` buffer and copied the remainder after every parsed message. The
+"batch" rows use ``parse_all()`` to split everything available in one pass.
+
+Only the buffer handling differs: both sides decode each message with the
+current streamer's decoder and count it with ``_record_parse``, with parse
+timing off.
+
+Run from the repository root:
+
+    python -m benchmarks.streamer_buffer
+"""
+import timeit
+
+from google.protobuf.internal.decoder import _DecodeVarint
+
+from openxc.formats.binary import ProtobufStreamer, ProtobufFormatter
+from openxc.formats.json import JsonStreamer
+
+MESSAGE_COUNT = 20000
+READ_SIZE = 512
+LARGE_READ_SIZE = 256 * 1024
+REPEAT = 3
+
+
+class LegacyJsonStreamer(JsonStreamer):
+    def __init__(self):
+        super(LegacyJsonStreamer, self).__init__(timing=False)
+        self.message_buffer = b""
+
+    def receive(self, payload):
+        if len(payload) > 0:
+            self.message_buffer += payload
+
+    def parse_next_message(self):
+        parsed_message = None
+        remainder = self.message_buffer
+        if self.SERIALIZED_COMMAND_TERMINATOR in self.message_buffer:
+            message, _, remainder = self.message_buffer.partition(
+                    self.SERIALIZED_COMMAND_TERMINATOR)
+            parsed_message = self._deserialize(message)
+            self._record_parse(parsed_message)
+        self.message_buffer = remainder
+        return parsed_message
+
+
+class LegacyProtobufStreamer(ProtobufStreamer):
+    def __init__(self):
+        super(LegacyProtobufStreamer, self).__init__(timing=False)
+        self.message_buffer = b""
+
+    def receive(self, payload):
+        if len(payload) > 0:
+            self.message_buffer += payload
+
+    def parse_next_message(self):
+        message = None
+        remainder = self.message_buffer
+        while message is None and len(self.message_buffer) > 1:
+            message_length, message_start = _DecodeVarint(self.message_buffer, 0)
+            if message_length > self.MAX_PROTOBUF_MESSAGE_LENGTH:
+                self.message_buffer = self.message_buffer[1:]
+                continue
+            if message_start + message_length > len(self.message_buffer):
+                break
+            message_data = self.message_buffer[message_start:message_start +
+                    message_length]
+            remainder = self.message_buffer[message_start + message_length:]
+            message = ProtobufFormatter.deserialize(message_data,
+                    lazy=self.lazy, binary_can_data=self.binary_can_data)
+            if message is None:
+                self.message_buffer = self.message_buffer[1:]
+        self.message_buffer = remainder
+        if message is not None:
+            self._record_parse(message)
+        return message
+
+
+def _stream(streamer_class):
+    streamer = streamer_class()
+    return b"".join(streamer.serialize_for_stream({'bus': 1, 'id': 0x123 + i,
+            'data': "0x1234567890abcdef"}) for i in range(MESSAGE_COUNT))
+
+
+def _parse(streamer_class, stream, read_size):
+    streamer = streamer_class()
+    streamer.timing = False
+    for start in range(0, len(stream), read_size):
+        streamer.receive(stream[start:start + read_size])
+        while streamer.parse_next_message() is not None:
+            pass
+
+
+def _parse_all(streamer_class, stream, read_size):
+    streamer = streamer_class()
+    streamer.timing = False
+    for start in range(0, len(stream), read_size):
+        streamer.receive(stream[start:start + read_size])
+        streamer.parse_all()
+
+
+def main():
+    for label, legacy_class, streamer_class in [
+            ("json", LegacyJsonStreamer, JsonStreamer),
+            ("protobuf", LegacyProtobufStreamer, ProtobufStreamer)]:
+        stream = _stream(streamer_class)
+        # the default USB read size is the common case, a large read size
+        # makes the quadratic copying of the old buffer obvious
+        for read_size in [READ_SIZE, LARGE_READ_SIZE]:
+            for name, cls, parse in [("before", legacy_class, _parse),
+                    ("after", streamer_class, _parse),
+                    ("batch", streamer_class, _parse_all)]:
+                elapsed = min(timeit.repeat(
+                        lambda: parse(cls, stream, read_size),
+                        number=1, repeat=REPEAT))
+                print("%-8s read size %7d %-6s %8.2f us/message" % (label,
+                        read_size, name, elapsed / MESSAGE_COUNT * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Compare JSON lines and length-delimited protobuf trace files of the same
+records: their size, plain and gzipped, and how fast ``TraceDataSource``
+replays them.
+
+Protobuf replay speed depends heavily on the protobuf backend - the pure
+Python one is much slower to parse than JSON, so the backend is printed too.
+
+Run from the repository root:
+
+    python -m benchmarks.trace_formats
+"""
+import gzip
+import os
+import shutil
+import tempfile
+import time
+
+from google.protobuf.internal import api_implementation
+
+from openxc.formats.binary import ProtobufStreamer
+from openxc.formats.json import JsonFormatter
+from openxc.sources import TraceDataSource
+
+RECORD_COUNT = 200000
+
+
+def records():
+    for index in range(RECORD_COUNT):
+        if index % 4 == 0:
+            record = {'bus': 1, 'id': 1234, 'data': "0x1234567890abcdef"}
+        else:
+            record = {'name': "vehicle_speed", 'value': index % 120}
+        record['timestamp'] = 1364323939.012 + index * 0.01
+        yield record
+
+
+def write_traces(directory):
+    streamer = ProtobufStreamer()
+    paths = {
+        "json": os.path.join(directory, "trace.json"),
+        "protobuf": os.path.join(directory, "trace.pb"),
+    }
+    with open(paths["json"], "wb") as json_file, \
+            open(paths["protobuf"], "wb") as protobuf_file:
+        for record in records():
+            json_file.write(JsonFormatter.serialize(record) + b"\n")
+            protobuf_file.write(streamer.serialize_for_stream(record))
+    return paths
+
+
+def compressed_size(path):
+    with open(path, "rb") as trace_file:
+        return len(gzip.compress(trace_file.read()))
+
+
+def replay(path, **kwargs):
+    received = [0]
+
+    def receive(message):
+        received[0] += 1
+
+    source = TraceDataSource(filename=path, callback=receive, loop=False,
+            realtime=False, **kwargs)
+    started = time.perf_counter()
+    source.start()
+    source.join()
+    elapsed = time.perf_counter() - started
+    assert received[0] == RECORD_COUNT
+    return elapsed
+
+
+def main():
+    print("protobuf backend: %s" % api_implementation.Type())
+    directory = tempfile.mkdtemp()
+    try:
+        paths = write_traces(directory)
+        for trace_format, path in sorted(paths.items()):
+            print("%-9s %7.2f MB, %6.2f MB gzipped" % (trace_format,
+                    os.path.getsize(path) / 1e6, compressed_size(path) / 1e6))
+            modes = [("stream", {}), ("direct", dict(direct=True))]
+            if trace_format == "protobuf":
+                modes.append(("lazy", dict(direct=True, lazy_messages=True)))
+            for label, kwargs in modes:
+                elapsed = replay(path, **kwargs)
+                print("  %-7s %6.0fk records/s" % (label,
+                        RECORD_COUNT / elapsed / 1e3))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Compare replaying a large trace file through ``TraceDataSource`` as a byte
+stream (the default) and in direct mode, where each line is parsed once, then
+measure how accurately a window of it is replayed in realtime at multiples of
+the recorded rate.
+
+Run from the repository root:
+
+    python -m benchmarks.trace_replay
+"""
+import os
+import tempfile
+import time
+
+from openxc.formats.json import JsonFormatter
+from openxc.sources import TraceDataSource
+
+RECORD_COUNT = 200000
+
+
+def write_trace(path):
+    with open(path, "wb") as trace_file:
+        for index in range(RECORD_COUNT):
+            if index % 4 == 0:
+                record = {'bus': 1, 'id': 1234, 'data': "0x1234567890abcdef"}
+            else:
+                record = {'name': "vehicle_speed", 'value': index % 120}
+            record['timestamp'] = 1364323939.012 + index * 0.01
+            trace_file.write(JsonFormatter.serialize(record) + b"\n")
+
+
+def replay(path, **kwargs):
+    received = [0]
+
+    def receive(message):
+        received[0] += 1
+
+    source = TraceDataSource(filename=path, callback=receive, loop=False,
+            realtime=False, **kwargs)
+    started = time.perf_counter()
+    source.start()
+    source.join()
+    elapsed = time.perf_counter() - started
+    assert received[0] == RECORD_COUNT
+    return elapsed
+
+
+def replay_realtime(path, speed):
+    # 10 seconds of trace time, recorded at 100 records/s
+    source = TraceDataSource(filename=path, callback=lambda message: None,
+            loop=False, realtime=True, direct=True,
+            start_time=1364323939.012, end_time=1364323949.012, speed=speed)
+    started = time.perf_counter()
+    source.start()
+    source.join()
+    return time.perf_counter() - started, source.stats()['replay_drift']
+
+
+def main():
+    handle, path = tempfile.mkstemp(suffix=".json")
+    os.close(handle)
+    try:
+        write_trace(path)
+        for label, kwargs in [("stream", {}), ("direct", dict(direct=True))]:
+            elapsed = replay(path, **kwargs)
+            print("%-8s %6.0fk records/s" % (label,
+                    RECORD_COUNT / elapsed / 1e3))
+        for speed in [4, 20]:
+            elapsed, drift = replay_realtime(path, speed)
+            print("%3dx     %5.2fs for 10s of trace, drift p99 %.2fms "
+                    "max %.2fms" % (speed, elapsed, drift['p99'] * 1e3,
+                        drift['max'] * 1e3))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,414 @@
+"""Convert OpenXC trace files into per-signal columns of NumPy arrays for
+offline analysis.
+
+A trace is read once, without keeping a dict per record, into a
+:class:`ColumnarTrace` with a timestamps array and a values array for each
+signal ``name``. It can be saved as a single ``.npz`` archive, or as a
+directory of ``.npy`` files that later analyses memory-map instead of parsing
+the trace again.
+"""
+import array
+import json
+import logging
+import os
+
+from openxc.formats.binary import ProtobufFormatter
+from openxc.formats.json import JsonFormatter
+from openxc.sources.tracefile import open_trace_file, read_records, \
+        record_payload, trace_format, PROTOBUF_TRACE
+
+LOG = logging.getLogger(__name__)
+
+try:
+    import numpy
+except ImportError:
+    LOG.debug("numpy library not installed, can't convert traces to columns")
+    numpy = None
+
+
+class ColumnarUnavailableError(Exception): pass
+
+
+# Column kinds, from the most to the least specific - a column holding values
+# of more than one kind is promoted to the later one
+BOOLEAN = "boolean"
+NUMERIC = "numeric"
+STATE = "state"
+COLUMN_KINDS = (BOOLEAN, NUMERIC, STATE)
+
+# The code of a missing value in a state column
+MISSING_STATE = -1
+
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def _value_kind(value):
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return BOOLEAN
+    if isinstance(value, (int, float)):
+        return NUMERIC
+    return STATE
+
+
+def _state_label(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class _ColumnBuilder(object):
+    """Accumulate one column of values in a compact typed array, promoting it
+    to a more general kind if a value doesn't fit the kind seen so far.
+
+    Missing values are stored as NaN in numeric columns and ``MISSING_STATE``
+    in state columns, so a boolean column with a gap becomes numeric.
+    """
+
+    def __init__(self):
+        self.kind = None
+        self.states = {}
+        self._values = None
+        self._missing = 0
+
+    def append(self, value):
+        kind = _value_kind(value)
+        if kind is None:
+            self._append_missing()
+            return
+
+        if self.kind is None:
+            self._start(kind)
+        elif kind != self.kind and COLUMN_KINDS.index(kind) > \
+                COLUMN_KINDS.index(self.kind):
+            self._promote(kind)
+
+        if self.kind == STATE:
+            self._values.append(self._state_code(value))
+        else:
+            self._values.append(value)
+
+    def _append_missing(self):
+        if self.kind is None:
+            self._missing += 1
+            return
+        if self.kind == BOOLEAN:
+            self._promote(NUMERIC)
+        if self.kind == STATE:
+            self._values.append(MISSING_STATE)
+        else:
+            self._values.append(float("nan"))
+
+    def _start(self, kind):
+        if kind == BOOLEAN and self._missing > 0:
+            kind = NUMERIC
+        self.kind = kind
+        self._values = self._new_values(kind)
+        for _ in range(self._missing):
+            self._values.append(MISSING_STATE if kind == STATE
+                    else float("nan"))
+
+    @staticmethod
+    def _new_values(kind):
+        if kind == BOOLEAN:
+            return array.array('b')
+        if kind == NUMERIC:
+            return array.array('d')
+        return array.array('i')
+
+    def _state_code(self, value):
+        label = _state_label(value)
+        code = self.states.get(label)
+        if code is None:
+            code = self.states[label] = len(self.states)
+        return code
+
+    def _promote(self, kind):
+        values = self._values
+        self.kind = kind
+        self._values = self._new_values(kind)
+        if kind == NUMERIC:
+            self._values.extend(float(value) for value in values)
+            return
+
+        was_boolean = values.typecode == 'b'
+        for value in values:
+            if value != value:
+                self._values.append(MISSING_STATE)
+            else:
+                self._values.append(self._state_code(
+                    bool(value) if was_boolean else value))
+
+    def build(self):
+        """Return the column as a NumPy array, and the array of state labels
+        that its codes refer to if it's a state column.
+        """
+        if self.kind is None:
+            return numpy.full(self._missing, numpy.nan), None
+        if self.kind == BOOLEAN:
+            return numpy.frombuffer(self._values, dtype=numpy.int8).astype(
+                    bool), None
+        if self.kind == NUMERIC:
+            return numpy.frombuffer(self._values, dtype=numpy.float64), None
+
+        states = sorted(self.states, key=self.states.get)
+        return (numpy.frombuffer(self._values, dtype=numpy.int32),
+                numpy.array(states, dtype=str))
+
+
+class _SignalBuilder(object):
+    def __init__(self, name):
+        self.name = name
+        self.timestamps = array.array('d')
+        self.values = _ColumnBuilder()
+        self.events = None
+
+    def append(self, message):
+        timestamp = message.get('timestamp')
+        self.timestamps.append(float("nan") if timestamp is None
+                else timestamp)
+        self.values.append(message.get('value'))
+
+        event = message.get('event')
+        if event is not None and self.events is None:
+            self.events = _ColumnBuilder()
+            for _ in range(len(self.timestamps) - 1):
+                self.events.append(None)
+        if self.events is not None:
+            self.events.append(event)
+
+    def build(self):
+        values, states = self.values.build()
+        events = event_states = event_kind = None
+        if self.events is not None:
+            events, event_states = self.events.build()
+            event_kind = self.events.kind or NUMERIC
+        return Signal(self.name, numpy.frombuffer(self.timestamps,
+                dtype=numpy.float64), values, self.values.kind or NUMERIC,
+                states, events, event_kind, event_states)
+
+
+class Signal(object):
+    """The samples of one signal from a trace, in time order.
+
+    ``values`` is a float64 array for a numeric signal and a bool array for a
+    boolean signal. A state signal (e.g. ``transmission_gear_position``) is
+    stored as int32 codes into the ``states`` array of labels, with
+    ``MISSING_STATE`` for a missing value. Evented signals (e.g.
+    ``door_status``) also have an ``events`` array, encoded the same way.
+    """
+
+    def __init__(self, name, timestamps, values, kind, states=None,
+            events=None, event_kind=None, event_states=None):
+        self.name = name
+        self.timestamps = timestamps
+        self.values = values
+        self.kind = kind
+        self.states = states
+        self.events = events
+        self.event_kind = event_kind
+        self.event_states = event_states
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __repr__(self):
+        return "Signal(%r, %s, %d samples)" % (self.name, self.kind,
+                len(self))
+
+    @staticmethod
+    def _decode(codes, states):
+        labels = numpy.empty(len(codes), dtype=object)
+        present = codes != MISSING_STATE
+        labels[present] = states[codes[present]]
+        return labels
+
+    def decoded_values(self):
+        """Return the values, with state signals decoded to an object array
+        of their labels (``None`` where missing).
+        """
+        if self.kind == STATE:
+            return self._decode(self.values, self.states)
+        return self.values
+
+    def decoded_events(self):
+        """Return the events, decoded like :meth:`decoded_values`, or
+        ``None`` if the signal isn't evented.
+        """
+        if self.event_kind == STATE:
+            return self._decode(self.events, self.event_states)
+        return self.events
+
+    def _sorted(self):
+        """Return the signal in time order, if it isn't already."""
+        if len(self) < 2 or numpy.all(numpy.diff(self.timestamps) >= 0):
+            return self
+        order = numpy.argsort(self.timestamps, kind="stable")
+        return Signal(self.name, self.timestamps[order], self.values[order],
+                self.kind, self.states,
+                self.events[order] if self.events is not None else None,
+                self.event_kind, self.event_states)
+
+
+class ColumnarTrace(object):
+    """The signals of one or more trace files as columns of NumPy arrays,
+    keyed by signal name.
+
+    Only messages with a ``name`` are converted - the number of other records
+    (e.g. raw CAN messages or diagnostic responses) is kept in ``skipped``.
+    """
+
+    def __init__(self, signals=None, skipped=0):
+        """Raises:
+            ColumnarUnavailableError, if the numpy library isn't installed.
+        """
+        if numpy is None:
+            raise ColumnarUnavailableError("numpy library is not installed, "
+                    "can't convert traces to columns")
+        self.signals = signals or {}
+        self.skipped = skipped
+
+    def __getitem__(self, name):
+        return self.signals[name]
+
+    def __contains__(self, name):
+        return name in self.signals
+
+    def __iter__(self):
+        return iter(self.signals)
+
+    def __len__(self):
+        return len(self.signals)
+
+    @classmethod
+    def from_traces(cls, filenames):
+        """Read one or more JSON or protobuf trace files, compressed or not,
+        into columns.
+
+        Records from all of the files are combined, and each signal is sorted
+        by time if they weren't already in order.
+        """
+        if isinstance(filenames, str):
+            filenames = [filenames]
+        builders = {}
+        skipped = 0
+        for filename in filenames:
+            skipped += cls._read_trace(filename, builders)
+        signals = dict((name, builder.build()._sorted())
+                for name, builder in builders.items())
+        LOG.debug("Converted %d signals, skipped %d records", len(signals),
+                skipped)
+        return cls(signals, skipped)
+
+    @staticmethod
+    def _read_trace(filename, builders):
+        record_format = trace_format(filename)
+        skipped = 0
+        with open_trace_file(filename) as trace_file:
+            for record in read_records(trace_file, record_format):
+                payload = record_payload(record, record_format)
+                if record_format == PROTOBUF_TRACE:
+                    message = ProtobufFormatter.deserialize(payload)
+                elif payload.strip():
+                    try:
+                        message = JsonFormatter.deserialize(payload)
+                    except ValueError:
+                        message = None
+                else:
+                    continue
+
+                if not isinstance(message, dict) or 'name' not in message:
+                    skipped += 1
+                    continue
+                builder = builders.get(message['name'])
+                if builder is None:
+                    builder = builders[message['name']] = _SignalBuilder(
+                            message['name'])
+                builder.append(message)
+        return skipped
+
+    def _arrays(self):
+        manifest = {'version': MANIFEST_VERSION, 'skipped': self.skipped,
+                'signals': []}
+        arrays = {}
+        for index, name in enumerate(sorted(self.signals)):
+            signal = self.signals[name]
+            manifest['signals'].append({'name': name, 'kind': signal.kind,
+                'event_kind': signal.event_kind})
+            for column in ("timestamps", "values", "states", "events",
+                    "event_states"):
+                value = getattr(signal, column)
+                if value is not None:
+                    arrays["%d.%s" % (index, column)] = value
+        return manifest, arrays
+
+    def save(self, path, compress=False):
+        """Save the columns to ``path``: a single archive if it ends with
+        ``.npz``, otherwise a directory of ``.npy`` files that can be
+        memory-mapped when loaded.
+
+        Kwargs:
+            compress - if ``True``, compress a ``.npz`` archive. Compressed
+                archives are smaller but much slower to load.
+        """
+        manifest, arrays = self._arrays()
+        if path.endswith(".npz"):
+            arrays['manifest'] = numpy.array(json.dumps(manifest))
+            (numpy.savez_compressed if compress else numpy.savez)(path,
+                    **arrays)
+            return
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        for name, value in arrays.items():
+            numpy.save(os.path.join(path, "%s.npy" % name), value)
+        with open(os.path.join(path, MANIFEST_FILENAME), "w") as manifest_file:
+            json.dump(manifest, manifest_file)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load columns saved with :meth:`save`.
+
+        Kwargs:
+            mmap - if ``True``, memory-map the arrays of a directory instead of
+                reading them into memory. Archives are always read.
+        """
+        if numpy is None:
+            raise ColumnarUnavailableError("numpy library is not installed, "
+                    "can't load trace columns")
+
+        if path.endswith(".npz"):
+            with numpy.load(path) as archive:
+                stored = dict((name, archive[name]) for name in archive.files)
+            manifest = json.loads(str(stored.pop('manifest')))
+            load_array = stored.get
+        else:
+            with open(os.path.join(path, MANIFEST_FILENAME)) as manifest_file:
+                manifest = json.load(manifest_file)
+
+            def load_array(name):
+                filename = os.path.join(path, "%s.npy" % name)
+                if not os.path.exists(filename):
+                    return None
+                return numpy.load(filename, mmap_mode="r" if mmap else None)
+
+        if manifest.get('version') != MANIFEST_VERSION:
+            raise ValueError("Unsupported trace columns version %s" %
+                    manifest.get('version'))
+
+        signals = {}
+        for index, entry in enumerate(manifest['signals']):
+            arrays = dict((column, load_array("%d.%s" % (index, column)))
+                    for column in ("timestamps", "values", "states", "events",
+                        "event_states"))
+            signals[entry['name']] = Signal(entry['name'],
+                    arrays['timestamps'], arrays['values'], entry['kind'],
+                    arrays['states'], arrays['events'], entry['event_kind'],
+                    arrays['event_states'])
+        return cls(signals, manifest.get('skipped', 0))
@@ -188,6 +188,11 @@ class Controller(object):
     interface must define at least the ``write_bytes`` method.
     """
 
+    # The most bytes of serialized messages ``write_many`` will combine into a
+    # single call to ``write_bytes`` - implementations can raise this if their
+    # transport handles larger writes efficiently.
+    WRITE_BATCH_SIZE = 512
+
     def _prepare_response_receiver(self, request,
             receiver_class=CommandResponseReceiver):
         queue = Queue()
@@ -451,15 +456,33 @@ class Controller(object):
                     event=kwargs.get('event', None))
         return result
 
+    def write_many(self, messages):
+        """Send a sequence of raw or translated write requests to the VI,
+        packing as many as will fit into each write to the transport (up to
+        ``WRITE_BATCH_SIZE`` bytes) instead of sending them one at a time.
+
+        messages - an iterable of dicts, each with the same keys accepted as
+            keyword arguments by ``write``.
+
+        Returns the total number of bytes written.
+        """
+        bytes_written = 0
+        for batch in self.streamer.serialize_batches(
+                (self._build_write_request(message) for message in messages),
+                self.WRITE_BATCH_SIZE):
+            bytes_written += self._write_batch(batch)
+        return bytes_written
+
+    def _write_batch(self, batch):
+        bytes_written = self.write_bytes(batch)
+        assert bytes_written == len(batch)
+        return bytes_written
+
     def write_translated(self, name, value, event=None):
         """Send a translated write request to the VI.
         """
-        data = {'name': name}
-        if value is not None:
-            data['value'] = self._massage_write_value(value)
-        if event is not None:
-            data['event'] = self._massage_write_value(event);
-        message = self.streamer.serialize_for_stream(data)
+        message = self.streamer.serialize_for_stream(
+                self._build_translated_request(name, value, event))
         bytes_written = self.write_bytes(message)
         assert bytes_written == len(message)
         return bytes_written
@@ -467,6 +490,31 @@ class Controller(object):
     def write_raw(self, id, data, bus=None, frame_format=None):
         """Send a raw write request to the VI.
         """
+        message = self.streamer.serialize_for_stream(
+                self._build_raw_request(id, data, bus, frame_format))
+        bytes_written = self.write_bytes(message)
+        assert bytes_written == len(message)
+        return bytes_written
+
+    @classmethod
+    def _build_write_request(cls, message):
+        if 'id' in message and 'data' in message:
+            return cls._build_raw_request(message['id'], message['data'],
+                    message.get('bus', None), message.get('frame_format', None))
+        return cls._build_translated_request(message['name'],
+                message['value'], message.get('event', None))
+
+    @classmethod
+    def _build_translated_request(cls, name, value, event=None):
+        data = {'name': name}
+        if value is not None:
+            data['value'] = cls._massage_write_value(value)
+        if event is not None:
+            data['event'] = cls._massage_write_value(event);
+        return data
+
+    @classmethod
+    def _build_raw_request(cls, id, data, bus=None, frame_format=None):
         if not isinstance(id, numbers.Number):
             try:
                 id = int(id, 0)
@@ -477,10 +525,7 @@ class Controller(object):
             data['bus'] = bus
         if frame_format is not None:
             data['frame_format'] = frame_format
-        message = self.streamer.serialize_for_stream(data)
-        bytes_written = self.write_bytes(message)
-        assert bytes_written == len(message)
-        return bytes_written
+        return data
 
     def stop(self):
         pass
@@ -17,6 +17,9 @@ class SerialControllerMixin(Controller):
     """
 
     WAITIED_FOR_CONNECTION = False
+    # The OS serial driver buffers writes, so larger batches are just fewer
+    # system calls.
+    WRITE_BATCH_SIZE = 4096
 
     def write_bytes(self, data):
         return self.device.write(data)
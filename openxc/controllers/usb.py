@@ -20,6 +20,9 @@ class UsbControllerMixin(Controller):
     sources/controllers.
     """
     COMPLEX_CONTROL_COMMAND = 0x83
+    # Bulk transfers of a multiple of the max packet size are sent back to back
+    # with no short packet in between.
+    WRITE_BATCH_SIZE = 512
 
     def write_bytes(self, data):
         if self.out_endpoint is None:
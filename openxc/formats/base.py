@@ -1,8 +1,301 @@
+"""Common functionality for vehicle message streamers."""
+import collections
+import logging
+import time
+
+from openxc.utils import Histogram
+
+LOG = logging.getLogger(__name__)
+
+
+class MessageBuffer(object):
+    """A growable receive buffer for a stream of serialized vehicle messages.
+
+    Received bytes are appended to a single ``bytearray`` and a read offset
+    tracks how much of it has already been consumed by a parser, so pulling a
+    message off the front of the buffer doesn't copy everything behind it. The
+    consumed prefix is only discarded once it's large enough to be worth the
+    copy (see ``COMPACT_THRESHOLD``).
+
+    The number of unparsed bytes is capped at ``max_size`` - if a parser can't
+    keep up or the stream is garbage, the oldest bytes are dropped instead of
+    letting the buffer grow without bound.
+    """
+    DEFAULT_MAX_SIZE = 1024 * 1024
+    COMPACT_THRESHOLD = 64 * 1024
+
+    def __init__(self, max_size=None):
+        self._data = bytearray()
+        self._start = 0
+        self.max_size = max_size or self.DEFAULT_MAX_SIZE
+        self.bytes_dropped = 0
+
+    def __len__(self):
+        return len(self._data) - self._start
+
+    def __getitem__(self, index):
+        """Return the unsigned value of the unparsed byte at ``index``."""
+        if index < 0 or index >= len(self):
+            raise IndexError("MessageBuffer index out of range")
+        return self._data[self._start + index]
+
+    def extend(self, payload):
+        """Append ``payload`` to the end of the buffer, dropping the oldest
+        unparsed bytes if that would exceed ``max_size``.
+
+        Returns the number of bytes dropped to stay under the cap.
+        """
+        self._compact()
+        try:
+            self._data += payload
+        except BufferError:
+            # Someone is still holding a view of the old data, so it can't be
+            # resized in place - start a fresh array instead.
+            self._data = self._data[self._start:] + payload
+            self._start = 0
+
+        overflow = len(self) - self.max_size
+        if overflow > 0:
+            LOG.warn("Receive buffer exceeded %d bytes, dropping %d unparsed "
+                    "bytes", self.max_size, overflow)
+            self.consume(overflow)
+            self.bytes_dropped += overflow
+            return overflow
+        return 0
+
+    def decode_varint(self, start=0):
+        """Decode a base 128 varint (e.g. a protobuf length prefix) from the
+        unparsed bytes at ``start``.
+
+        Returns a tuple of the decoded value and the index just past it.
+
+        Raises:
+            IndexError, if the varint hasn't been completely received.
+        """
+        data = self._data
+        position = self._start + start
+        end = len(data)
+        result = 0
+        shift = 0
+        while True:
+            if position >= end:
+                raise IndexError("Incomplete varint in MessageBuffer")
+            byte = data[position]
+            result |= (byte & 0x7f) << shift
+            position += 1
+            if not byte & 0x80:
+                return result, position - self._start
+            shift += 7
+
+    def find(self, sub, start=0, end=None):
+        """Return the lowest index of ``sub`` in the unparsed bytes, or -1 if
+        it isn't found.
+        """
+        if end is not None:
+            end += self._start
+        else:
+            end = len(self._data)
+        index = self._data.find(sub, self._start + start, end)
+        if index != -1:
+            index -= self._start
+        return index
+
+    def rfind(self, sub):
+        """Return the highest index of ``sub`` in the unparsed bytes, or -1 if
+        it isn't found.
+        """
+        index = self._data.rfind(sub, self._start)
+        if index != -1:
+            index -= self._start
+        return index
+
+    def view(self, start=0, end=None):
+        """Return a ``memoryview`` of the unparsed bytes from ``start`` to
+        ``end`` without copying them.
+
+        The view should be released (e.g. by using it as a context manager) as
+        soon as the caller is done with it.
+        """
+        if end is None:
+            end = len(self)
+        return memoryview(self._data)[self._start + start:self._start + end]
+
+    def take(self, size):
+        """Remove and return a copy of the next ``size`` unparsed bytes."""
+        data = self._data[self._start:self._start + size]
+        self.consume(size)
+        return data
+
+    def take_until(self, separator):
+        """Remove and return a copy of the unparsed bytes before the next
+        ``separator``, also consuming the separator itself.
+
+        Returns ``None`` and leaves the buffer untouched if the separator
+        hasn't been received yet.
+        """
+        end = self._data.find(separator, self._start)
+        if end == -1:
+            return None
+        data = self._data[self._start:end]
+        self.consume(end - self._start + len(separator))
+        return data
+
+    def consume(self, size):
+        """Mark the next ``size`` unparsed bytes as consumed."""
+        self._start = min(self._start + size, len(self._data))
+        if self._start == len(self._data):
+            self.clear()
+
+    def clear(self):
+        """Discard all unparsed bytes."""
+        try:
+            del self._data[:]
+        except BufferError:
+            self._data = bytearray()
+        self._start = 0
+
+    def _compact(self):
+        """Drop the consumed prefix of the buffer once it's at least
+        ``COMPACT_THRESHOLD`` bytes and makes up the majority of the array, so
+        the cost of the copy is amortized over many parsed messages.
+        """
+        if (self._start >= self.COMPACT_THRESHOLD and
+                self._start * 2 >= len(self._data)):
+            try:
+                del self._data[:self._start]
+            except BufferError:
+                self._data = self._data[self._start:]
+            self._start = 0
+
+
+def message_type(message):
+    """Return a short name for the kind of OpenXC message in ``message``, e.g.
+    "simple", "can" or "command_response".
+    """
+    if 'command_response' in message:
+        return "command_response"
+    elif 'command' in message:
+        return "command"
+    elif 'name' in message:
+        return "simple"
+    elif 'id' in message:
+        if 'data' in message:
+            return "can"
+        return "diagnostic"
+    return "unknown"
+
+
 class VehicleMessageStreamer(object):
-    message_buffer = b""
     bytes_received = 0
 
+    def __init__(self, max_buffer_size=None, binary_can_data=False,
+            timing=False):
+        """Kwargs:
+            max_buffer_size - the most unparsed bytes to hold on to, see
+                :class:`MessageBuffer`
+            binary_can_data - if ``True``, the ``data`` of parsed CAN messages
+                is given as bytes instead of a hex string
+            timing - if ``True``, record how long each message takes to parse
+                in ``parse_time``. It's off by default since reading the clock
+                costs about as much as parsing a small message.
+        """
+        self.message_buffer = MessageBuffer(max_buffer_size)
+        self.binary_can_data = binary_can_data
+        self.messages_parsed = collections.Counter()
+        self.messages_invalid = 0
+        self.bytes_skipped = 0
+        self.peak_buffer_size = 0
+        self.timing = timing
+        self.parse_time = Histogram()
+
     def receive(self, payload):
         if len(payload) > 0:
-            self.message_buffer += payload
+            self.message_buffer.extend(payload)
             self.bytes_received += len(payload)
+            buffered = len(self.message_buffer)
+            if buffered > self.peak_buffer_size:
+                self.peak_buffer_size = buffered
+
+    def _parse_started(self):
+        """Return the time a parse started for ``_record_parse``, or ``None``
+        if parse timing is off.
+        """
+        if self.timing:
+            return time.perf_counter_ns()
+        return None
+
+    def _record_parse(self, message, started=None):
+        """Count a message parsed (or discarded as invalid, if ``message`` is
+        ``None``), and record how long it took if ``started`` is a value from
+        ``_parse_started``.
+        """
+        if started is not None:
+            self.parse_time.record_ns(time.perf_counter_ns() - started)
+        if message is None:
+            self.messages_invalid += 1
+        else:
+            self.messages_parsed[message_type(message)] += 1
+
+    def _count_parsed(self, messages):
+        """Count a batch of parsed messages by type."""
+        if messages:
+            self.messages_parsed.update(map(message_type, messages))
+
+    def stats(self):
+        """Return a dict of counters describing what this streamer has
+        received and parsed so far.
+        """
+        return {
+            'bytes_received': self.bytes_received,
+            'bytes_dropped': self.message_buffer.bytes_dropped,
+            'bytes_skipped': self.bytes_skipped,
+            'buffered_bytes': len(self.message_buffer),
+            'peak_buffer_size': self.peak_buffer_size,
+            'messages_parsed': dict(self.messages_parsed),
+            'messages_invalid': self.messages_invalid,
+            'parse_time': self.parse_time.as_dict(),
+        }
+
+    def parse_next_message(self):
+        raise NotImplementedError("Don't use VehicleMessageStreamer directly")
+
+    def serialize_for_stream(self, message):
+        raise NotImplementedError("Don't use VehicleMessageStreamer directly")
+
+    def serialize_many(self, messages):
+        """Serialize each of ``messages`` for the stream and return them
+        together in one contiguous buffer, ready for a single write.
+        """
+        return b"".join(self.serialize_batches(messages))
+
+    def serialize_batches(self, messages, max_size=None):
+        """Serialize each of ``messages`` for the stream and yield them in
+        contiguous buffers of at most ``max_size`` bytes, each ready for a
+        single write. A message larger than ``max_size`` is yielded on its
+        own.
+
+        With no ``max_size``, all of the messages are yielded in one buffer.
+        """
+        batch = []
+        batch_size = 0
+        for message in messages:
+            serialized_message = self.serialize_for_stream(message)
+            if (batch and max_size is not None and
+                    batch_size + len(serialized_message) > max_size):
+                yield b"".join(batch)
+                batch = []
+                batch_size = 0
+            batch.append(serialized_message)
+            batch_size += len(serialized_message)
+        if batch:
+            yield b"".join(batch)
+
+    def parse_all(self):
+        """Parse and return a list of every complete message in the buffer."""
+        messages = []
+        while True:
+            message = self.parse_next_message()
+            if message is None:
+                break
+            messages.append(message)
+        return messages
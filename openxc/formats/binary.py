@@ -4,9 +4,11 @@
 import binascii
 import numbers
 import logging
+import threading
+import time
+from collections.abc import MutableMapping
 
 import google.protobuf.message
-from google.protobuf.internal.decoder import _DecodeVarint
 from google.protobuf.internal import encoder
 
 from openxc.formats.base import VehicleMessageStreamer
@@ -16,40 +18,234 @@ LOG = logging.getLogger(__name__)
 
 class UnrecognizedBinaryCommandError(Exception): pass
 
+
+def _hex_string(data):
+    return "0x%s" % binascii.hexlify(data).decode("ascii")
+
+
+def _dynamic_field_value(field):
+    if len(field.string_value) > 0:
+        return field.string_value
+    elif field.numeric_value != 0:
+        return field.numeric_value
+    return field.boolean_value
+
+
+COMMAND_TYPES = {
+    "version": openxc_pb2.ControlCommand.VERSION,
+    "device_id": openxc_pb2.ControlCommand.DEVICE_ID,
+    "diagnostic_request": openxc_pb2.ControlCommand.DIAGNOSTIC,
+    "passthrough": openxc_pb2.ControlCommand.PASSTHROUGH,
+    "af_bypass": openxc_pb2.ControlCommand.ACCEPTANCE_FILTER_BYPASS,
+    "payload_format": openxc_pb2.ControlCommand.PAYLOAD_FORMAT,
+    "predefined_obd2": openxc_pb2.ControlCommand.PREDEFINED_OBD2_REQUESTS,
+    "platform": openxc_pb2.ControlCommand.PLATFORM,
+}
+COMMAND_NAMES = dict((value, key) for key, value in COMMAND_TYPES.items())
+
+FRAME_FORMATS = {
+    "standard": openxc_pb2.CanMessage.STANDARD,
+    "extended": openxc_pb2.CanMessage.EXTENDED,
+}
+FRAME_FORMAT_NAMES = dict((value, key) for key, value in FRAME_FORMATS.items())
+
+PAYLOAD_FORMATS = {
+    "json": openxc_pb2.PayloadFormatCommand.JSON,
+    "protobuf": openxc_pb2.PayloadFormatCommand.PROTOBUF,
+    "messagepack": openxc_pb2.PayloadFormatCommand.MESSAGEPACK,
+}
+PAYLOAD_FORMAT_NAMES = dict((value, key)
+        for key, value in PAYLOAD_FORMATS.items())
+
+DIAGNOSTIC_ACTIONS = {
+    "add": openxc_pb2.DiagnosticControlCommand.ADD,
+    "cancel": openxc_pb2.DiagnosticControlCommand.CANCEL,
+}
+DIAGNOSTIC_ACTION_NAMES = dict((value, key)
+        for key, value in DIAGNOSTIC_ACTIONS.items())
+
+# For the types of VehicleMessage that map directly to a flat dict, the name of
+# the payload field and the keys of the parsed message in order, each as
+# (key, is_present, decode) where the functions are given the payload.
+PARSED_MESSAGE_FIELDS = {
+    openxc_pb2.VehicleMessage.CAN: ("can_message", [
+        ('bus', lambda can: can.bus != 0, lambda can: can.bus),
+        ('id', lambda can: can.id != 0, lambda can: can.id),
+        ('data', lambda can: len(can.data) > 0,
+            lambda can: _hex_string(can.data)),
+        ('frame_format', lambda can: can.frame_format in FRAME_FORMAT_NAMES,
+            lambda can: FRAME_FORMAT_NAMES[can.frame_format]),
+    ]),
+    openxc_pb2.VehicleMessage.DIAGNOSTIC: ("diagnostic_response", [
+        ('bus', lambda response: response.bus != 0,
+            lambda response: response.bus),
+        ('id', lambda response: response.message_id != 0,
+            lambda response: response.message_id),
+        ('mode', lambda response: True, lambda response: response.mode),
+        ('pid', lambda response: True, lambda response: response.pid),
+        ('total_size', lambda response: response.total_size != 0,
+            lambda response: response.total_size),
+        ('frame', lambda response: True, lambda response: response.frame),
+        ('success', lambda response: True,
+            lambda response: response.success),
+        ('value',
+            lambda response: (response.value.type !=
+                openxc_pb2.DynamicField.UNUSED),
+            lambda response: _dynamic_field_value(response.value)),
+        ('negative_response_code',
+            lambda response: response.negative_response_code != 0,
+            lambda response: response.negative_response_code),
+        ('payload', lambda response: len(response.payload) > 0,
+            lambda response: _hex_string(response.payload)),
+    ]),
+    openxc_pb2.VehicleMessage.SIMPLE: ("simple_message", [
+        ('name', lambda simple: True, lambda simple: simple.name),
+        ('event', lambda simple: True,
+            lambda simple: _dynamic_field_value(simple.event)),
+        ('value', lambda simple: True,
+            lambda simple: _dynamic_field_value(simple.value)),
+    ]),
+}
+
+# The same as PARSED_MESSAGE_FIELDS, except CAN message data is left as bytes
+# instead of being formatted as a hex string.
+BINARY_CAN_PARSED_MESSAGE_FIELDS = dict(PARSED_MESSAGE_FIELDS)
+BINARY_CAN_PARSED_MESSAGE_FIELDS[openxc_pb2.VehicleMessage.CAN] = (
+        "can_message", [field if field[0] != 'data' else
+            ('data', lambda can: len(can.data) > 0, lambda can: can.data)
+            for field in PARSED_MESSAGE_FIELDS[openxc_pb2.VehicleMessage.CAN][1]])
+
+
+def _can_data_bytes(data):
+    """Convert CAN message data given as a hex string (e.g. "0x1234"), bytes
+    or an int into bytes.
+    """
+    if isinstance(data, (bytes, bytearray)):
+        return bytes(data)
+    elif isinstance(data, numbers.Integral):
+        return data.to_bytes(max(1, (data.bit_length() + 7) // 8), 'big')
+    return binascii.unhexlify(data.split('0x')[1])
+
+
 class ProtobufStreamer(VehicleMessageStreamer):
     MAX_PROTOBUF_MESSAGE_LENGTH = 200
 
+    # The first byte of a serialized VehicleMessage is the key of one of its
+    # fields: ``type`` or ``timestamp`` (varints) or one of the nested message
+    # fields (length delimited). Anything else can't be the start of a message,
+    # so we can reject it while resynchronizing without running the parser.
+    VALID_MESSAGE_KEYS = frozenset([(field.number << 3) |
+            (0 if field.type in (field.TYPE_ENUM, field.TYPE_UINT64) else 2)
+            for field in openxc_pb2.VehicleMessage.DESCRIPTOR.fields])
+
+    def __init__(self, lazy=False, **kwargs):
+        """Kwargs:
+            lazy - if ``True``, parse messages into a
+                :class:`ProtobufMessageView` that decodes fields on access
+                instead of a ``dict`` where possible.
+            binary_can_data - if ``True``, leave the ``data`` of CAN messages
+                as bytes instead of formatting it as a hex string.
+        """
+        super(ProtobufStreamer, self).__init__(**kwargs)
+        self.lazy = lazy
+        self.resync_events = 0
+        self._resyncing = False
+
     def parse_next_message(self):
-        message = None
-        remainder = self.message_buffer
-        message_data = ""
+        message, position = self._parse_message(0)
+        self.message_buffer.consume(position)
+        if message is not None:
+            self._count_parsed((message,))
+        return message
+
+    def parse_all(self):
+        """Parse every complete message in the buffer in a single pass, leaving
+        only a trailing partial message behind.
 
+        Returns a list of the parsed messages.
+        """
+        messages = []
+        position = 0
+        while True:
+            message, position = self._parse_message(position)
+            if message is None:
+                break
+            messages.append(message)
+        self.message_buffer.consume(position)
+        self._count_parsed(messages)
+        return messages
+
+    def _parse_message(self, position):
+        """Parse the next message in the buffer at or after ``position``.
+
+        Returns a tuple of the message (or ``None`` if no complete message is
+        available) and the position in the buffer where parsing should resume.
+        Nothing is consumed from the buffer, and the message isn't counted in
+        ``messages_parsed``.
+        """
         # 1. decode a varint from the top of the stream
-        # 2. using that as the length, if there's enough in the buffer, try and
-        #       decode try and decode a VehicleMessage after the varint
-        # 3. if it worked, great, we're oriented in the stream - continue
-        # 4. if either couldn't be parsed, skip to the next byte and repeat
-        while message is None and len(self.message_buffer) > 1:
-            message_length, message_start = _DecodeVarint(self.message_buffer, 0)
+        # 2. using that as the length, check that it's in range and that the
+        #       first byte after it could start a VehicleMessage
+        # 3. if there's enough in the buffer, try and decode a VehicleMessage
+        #       after the varint
+        # 4. if it worked, great, we're oriented in the stream - continue
+        # 5. if any step failed, skip to the next byte and repeat
+        timing = self.timing
+        if timing:
+            started = time.perf_counter_ns()
+        buffer = self.message_buffer
+        available = len(buffer)
+        while available - position > 1:
+            try:
+                message_length, message_start = buffer.decode_varint(position)
+            except IndexError:
+                # the length prefix itself hasn't been completely received
+                break
+
             # sanity check to make sure we didn't parse some huge number that's
-            # clearly not the length prefix
-            if message_length > self.MAX_PROTOBUF_MESSAGE_LENGTH:
-                self.message_buffer = self.message_buffer[1:]
+            # clearly not the length prefix, or a prefix that's not followed by
+            # a field key
+            if (message_length == 0 or
+                    message_length > self.MAX_PROTOBUF_MESSAGE_LENGTH or (
+                        message_start < available and buffer[message_start]
+                        not in self.VALID_MESSAGE_KEYS)):
+                position = self._skip_byte(position)
                 continue
 
-            if message_start + message_length > len(self.message_buffer):
+            message_end = message_start + message_length
+            if message_end > available:
                 break
 
-            message_data = self.message_buffer[message_start:message_start +
-                    message_length]
-            remainder = self.message_buffer[message_start + message_length:]
-
-            message = ProtobufFormatter.deserialize(message_data)
+            with buffer.view(message_start, message_end) as message_data:
+                message = ProtobufFormatter.deserialize(message_data,
+                        lazy=self.lazy, binary_can_data=self.binary_can_data)
             if message is None:
-                self.message_buffer = self.message_buffer[1:]
-
-        self.message_buffer = remainder
-        return message
+                position = self._skip_byte(position)
+            else:
+                if self._resyncing:
+                    self._resyncing = False
+                    self.resync_events += 1
+                    LOG.debug("Resynchronized protobuf stream, %d bytes "
+                            "skipped so far", self.bytes_skipped)
+                if timing:
+                    self.parse_time.record_ns(time.perf_counter_ns() - started)
+                return message, message_end
+
+        return None, position
+
+    def stats(self):
+        stats = super(ProtobufStreamer, self).stats()
+        stats['resync_events'] = self.resync_events
+        return stats
+
+    def _skip_byte(self, position):
+        # a corrupt frame is one invalid message however many bytes of it
+        # are skipped to find the next one
+        if not self._resyncing:
+            self._resyncing = True
+            self.messages_invalid += 1
+        self.bytes_skipped += 1
+        return position + 1
 
     def serialize_for_stream(self, message):
         protobuf_message = ProtobufFormatter.serialize(message)
@@ -58,9 +254,81 @@ class ProtobufStreamer(VehicleMessageStreamer):
 
 
 class ProtobufFormatter(object):
+    # Parsing and building messages reuses one VehicleMessage per thread rather
+    # than allocating a new one for every frame.
+    _thread_local = threading.local()
+
+    # The builder for the payload of each type of control command, by the
+    # command type - commands without a payload aren't listed.
+    CONTROL_COMMAND_BUILDERS = {
+        openxc_pb2.ControlCommand.PASSTHROUGH: '_handle_passthrough_cc_message',
+        openxc_pb2.ControlCommand.ACCEPTANCE_FILTER_BYPASS:
+            '_handle_acceptance_filter_bypass_cc_message',
+        openxc_pb2.ControlCommand.PREDEFINED_OBD2_REQUESTS:
+            '_handle_predefined_obd2_requests_cc_message',
+        openxc_pb2.ControlCommand.PAYLOAD_FORMAT:
+            '_handle_payload_format_cc_message',
+        openxc_pb2.ControlCommand.DIAGNOSTIC: '_handle_diagnostic_cc_message',
+    }
+
+    # The parser for the payload of each type of control command.
+    CONTROL_COMMAND_PARSERS = {
+        openxc_pb2.ControlCommand.DIAGNOSTIC:
+            '_handle_diagnostic_cc_parsed_message',
+        openxc_pb2.ControlCommand.PASSTHROUGH:
+            '_handle_passthrough_cc_parsed_message',
+        openxc_pb2.ControlCommand.PREDEFINED_OBD2_REQUESTS:
+            '_handle_predefined_obd2_requests_cc_parsed_message',
+        openxc_pb2.ControlCommand.ACCEPTANCE_FILTER_BYPASS:
+            '_handle_acceptance_filter_bypass_cc_parsed_message',
+        openxc_pb2.ControlCommand.PAYLOAD_FORMAT:
+            '_handle_payload_format_cc_parsed_message',
+    }
+
+    # The parser for each type of VehicleMessage that doesn't map directly to
+    # a flat dict (see PARSED_MESSAGE_FIELDS).
+    MESSAGE_PARSERS = {
+        openxc_pb2.VehicleMessage.CONTROL_COMMAND:
+            '_build_control_command_parsed_message',
+        openxc_pb2.VehicleMessage.COMMAND_RESPONSE:
+            '_build_command_response_parsed_message',
+    }
+
+    @classmethod
+    def _reusable_message(cls):
+        """Return this thread's VehicleMessage instance, cleared of any
+        previous contents.
+        """
+        message = getattr(cls._thread_local, 'message', None)
+        if message is None:
+            message = cls._thread_local.message = openxc_pb2.VehicleMessage()
+        else:
+            message.Clear()
+        return message
+
     @classmethod
-    def deserialize(cls, data):
-        message = openxc_pb2.VehicleMessage()
+    def deserialize(cls, data, lazy=False, binary_can_data=False):
+        """Parse a serialized VehicleMessage into a dict following the OpenXC
+        message format, or ``None`` if it isn't valid.
+
+        Kwargs:
+            lazy - if ``True``, simple, CAN and diagnostic messages are returned
+                as a :class:`ProtobufMessageView` that only decodes a field when
+                it's accessed, instead of a ``dict``.
+            binary_can_data - if ``True``, the ``data`` of CAN messages is
+                returned as bytes instead of a hex string.
+        """
+        if binary_can_data:
+            fields = BINARY_CAN_PARSED_MESSAGE_FIELDS
+        else:
+            fields = PARSED_MESSAGE_FIELDS
+
+        if lazy:
+            # the view holds on to the message, so it can't be reused
+            message = openxc_pb2.VehicleMessage()
+        else:
+            message = cls._reusable_message()
+
         try:
             message.ParseFromString(data)
         except google.protobuf.message.DecodeError as e:
@@ -68,31 +336,20 @@ class ProtobufFormatter(object):
         except UnicodeDecodeError as e:
             LOG.warn("Unable to parse protobuf: %s", e)
         else:
-            return cls._protobuf_to_dict(message)
+            if lazy and message.type in fields:
+                return ProtobufMessageView(message, fields)
+            return cls._protobuf_to_dict(message, fields)
 
     @classmethod
     def serialize(cls, data):
-        return cls._dict_to_protobuf(data).SerializeToString()
+        return cls._dict_to_protobuf(data,
+                cls._reusable_message()).SerializeToString()
 
     @classmethod
     def _command_string_to_protobuf(self, command_name):
-        if command_name == "version":
-            return openxc_pb2.ControlCommand.VERSION
-        elif command_name == "device_id":
-            return openxc_pb2.ControlCommand.DEVICE_ID
-        elif command_name == "diagnostic_request":
-            return openxc_pb2.ControlCommand.DIAGNOSTIC
-        elif command_name == "passthrough":
-            return openxc_pb2.ControlCommand.PASSTHROUGH
-        elif command_name == "af_bypass":
-            return openxc_pb2.ControlCommand.ACCEPTANCE_FILTER_BYPASS
-        elif command_name == "payload_format":
-            return openxc_pb2.ControlCommand.PAYLOAD_FORMAT
-        elif command_name == "predefined_obd2":
-            return openxc_pb2.ControlCommand.PREDEFINED_OBD2_REQUESTS
-        elif command_name == "platform":
-            return openxc_pb2.ControlCommand.PLATFORM
-        else:
+        try:
+            return COMMAND_TYPES[command_name]
+        except KeyError:
             raise UnrecognizedBinaryCommandError(command_name)
 
     @classmethod
@@ -111,19 +368,16 @@ class ProtobufFormatter(object):
 
     @classmethod
     def _handle_payload_format_cc_message(cls, data, message):
-        if data['format'] == "json":
-            message.control_command.payload_format_command.format = openxc_pb2.PayloadFormatCommand.JSON
-        elif data['format'] == "protobuf":
-            message.control_command.payload_format_command.format = openxc_pb2.PayloadFormatCommand.PROTOBUF
+        payload_format = PAYLOAD_FORMATS.get(data['format'])
+        if payload_format is not None:
+            message.control_command.payload_format_command.format = payload_format
 
     @classmethod
     def _handle_diagnostic_cc_message(cls, data, message):
         request_command = message.control_command.diagnostic_request
-        action = data['action']
-        if action == "add":
-            request_command.action = openxc_pb2.DiagnosticControlCommand.ADD
-        elif action == "cancel":
-            request_command.action = openxc_pb2.DiagnosticControlCommand.CANCEL
+        action = DIAGNOSTIC_ACTIONS.get(data['action'])
+        if action is not None:
+            request_command.action = action
         request = request_command.request
         request_data = data['request']
         if 'bus' in request_data:
@@ -143,19 +397,12 @@ class ProtobufFormatter(object):
 
     @classmethod
     def _build_control_command_message(cls, data, message):
-        command_name = data['command']
         message.type = openxc_pb2.VehicleMessage.CONTROL_COMMAND
-        message.control_command.type = cls._command_string_to_protobuf(command_name)
-        if message.control_command.type == openxc_pb2.ControlCommand.PASSTHROUGH:
-            cls._handle_passthrough_cc_message(data, message)
-        elif message.control_command.type == openxc_pb2.ControlCommand.ACCEPTANCE_FILTER_BYPASS:
-            cls._handle_acceptance_filter_bypass_cc_message(data, message)
-        elif message.control_command.type == openxc_pb2.ControlCommand.PREDEFINED_OBD2_REQUESTS:
-            cls._handle_predefined_obd2_requests_cc_message(data, message)
-        elif message.control_command.type == openxc_pb2.ControlCommand.PAYLOAD_FORMAT:
-            cls._handle_payload_format_cc_message(data, message)
-        elif message.control_command.type == openxc_pb2.ControlCommand.DIAGNOSTIC:
-            cls._handle_diagnostic_cc_message(data, message)
+        command_type = cls._command_string_to_protobuf(data['command'])
+        message.control_command.type = command_type
+        builder = cls.CONTROL_COMMAND_BUILDERS.get(command_type)
+        if builder is not None:
+            getattr(cls, builder)(data, message)
 
     @classmethod
     def _build_command_response_message(cls, data, message):
@@ -171,12 +418,11 @@ class ProtobufFormatter(object):
         if 'bus' in data:
             message.can_message.bus = data['bus']
         if 'frame_format' in data:
-            if data['frame_format'] == "standard":
-                message.can_message.frame_format = openxc_pb2.CanMessage.STANDARD
-            elif data['frame_format'] == "extended":
-                message.can_message.frame_format = openxc_pb2.CanMessage.EXTENDED
+            frame_format = FRAME_FORMATS.get(data['frame_format'])
+            if frame_format is not None:
+                message.can_message.frame_format = frame_format
         message.can_message.id = data['id']
-        message.can_message.data = binascii.unhexlify(data['data'].split('0x')[1])
+        message.can_message.data = _can_data_bytes(data['data'])
 
     @classmethod
     def _build_diagnostic_message(cls, data, message):
@@ -196,43 +442,35 @@ class ProtobufFormatter(object):
         if 'negative_response_code' in data:
             response.negative_response_code = data['negative_response_code']
         if 'value' in data:
-            response.value = data['value']
+            cls._build_dynamic_field(data['value'], response.value)
         if 'payload' in data:
             response.payload = binascii.unhexlify(data['payload'].split('0x')[1])
 
     @classmethod
-    def _build_simple_message(cls, data, message):
-        message.type = openxc_pb2.VehicleMessage.SIMPLE
-        message.simple_message.name = data['name']
-        value = data['value']
+    def _build_dynamic_field(cls, value, field):
         if isinstance(value, bool):
-            message.simple_message.value.type = openxc_pb2.DynamicField.BOOL
-            message.simple_message.value.boolean_value = value
+            field.type = openxc_pb2.DynamicField.BOOL
+            field.boolean_value = value
         elif isinstance(value, str):
-            message.simple_message.value.type = openxc_pb2.DynamicField.STRING
-            message.simple_message.value.string_value = value
+            field.type = openxc_pb2.DynamicField.STRING
+            field.string_value = value
         elif isinstance(value, numbers.Number):
-            message.simple_message.value.type = openxc_pb2.DynamicField.NUM
-            message.simple_message.value.numeric_value = value
+            field.type = openxc_pb2.DynamicField.NUM
+            field.numeric_value = value
 
+    @classmethod
+    def _build_simple_message(cls, data, message):
+        message.type = openxc_pb2.VehicleMessage.SIMPLE
+        message.simple_message.name = data['name']
+        cls._build_dynamic_field(data['value'], message.simple_message.value)
         if 'event' in data:
-            event = data['event']
-            # TODO holy repeated code, batman. this will be easier to DRY
-            # when https://github.com/openxc/openxc-message-format/issues/19
-            # is resolved
-            if isinstance(event, bool):
-                message.simple_message.event.type = openxc_pb2.DynamicField.BOOL
-                message.simple_message.event.boolean_value = event
-            elif isinstance(event, str):
-                message.simple_message.event.type = openxc_pb2.DynamicField.STRING
-                message.simple_message.event.string_value = event
-            elif isinstance(event, numbers.Number):
-                message.simple_message.event.type = openxc_pb2.DynamicField.NUM
-                message.simple_message.event.numeric_value = event
+            cls._build_dynamic_field(data['event'],
+                    message.simple_message.event)
 
     @classmethod
-    def _dict_to_protobuf(cls, data):
-        message = openxc_pb2.VehicleMessage()
+    def _dict_to_protobuf(cls, data, message=None):
+        if message is None:
+            message = openxc_pb2.VehicleMessage()
         if 'command' in data:
             cls._build_control_command_message(data, message)
         elif 'command_response' in data:
@@ -243,72 +481,32 @@ class ProtobufFormatter(object):
             cls._build_diagnostic_message(data, message)
         elif 'name' in data and 'value' in data:
             cls._build_simple_message(data, message)
+        if data.get('timestamp') is not None:
+            message.timestamp = cls._timestamp_to_protobuf(data['timestamp'])
         return message
 
-    @classmethod
-    def _build_can_parsed_message(cls, message, parsed_message):
-        can_message = message.can_message
-        if can_message.bus != 0:
-            parsed_message['bus'] = can_message.bus
-        if can_message.id != 0:
-            parsed_message['id'] = can_message.id
-        if len(binascii.hexlify(can_message.data).decode("ascii")) > 0:
-            parsed_message['data'] = "0x%s" % binascii.hexlify(can_message.data).decode("ascii")
-        if can_message.frame_format == openxc_pb2.CanMessage.STANDARD:
-            parsed_message['frame_format'] = "standard"
-        elif can_message.frame_format == openxc_pb2.CanMessage.EXTENDED:
-            parsed_message['frame_format'] = "extended"
-
-    @classmethod
-    def _build_diagnostic_parsed_message(cls, message, parsed_message):
-        diagnostic_message = message.diagnostic_response
-        if diagnostic_message.bus != 0:
-            parsed_message['bus'] = diagnostic_message.bus
-        if diagnostic_message.message_id != 0:
-            parsed_message['id'] = diagnostic_message.message_id
-        parsed_message['mode'] = diagnostic_message.mode
-        parsed_message['pid'] = diagnostic_message.pid
-        if diagnostic_message.total_size != 0:
-            parsed_message['total_size'] = diagnostic_message.total_size
-        parsed_message['frame'] = diagnostic_message.frame
-        parsed_message['success'] = diagnostic_message.success
-        if diagnostic_message.value.type != openxc_pb2.DynamicField.UNUSED:     ##GJA
-            parsed_message['value'] = diagnostic_message.value
-        if diagnostic_message.negative_response_code !=0:
-            parsed_message['negative_response_code'] = diagnostic_message.negative_response_code
-        if len(binascii.hexlify(diagnostic_message.payload).decode("ascii")) > 0:
-            parsed_message['payload'] = "0x%s" % binascii.hexlify(diagnostic_message.payload).decode("ascii")
+    @staticmethod
+    def _timestamp_to_protobuf(timestamp):
+        """Convert a Unix timestamp in seconds to the milliseconds used by the
+        ``VehicleMessage.timestamp`` field.
+        """
+        return int(round(timestamp * 1000))
 
     @classmethod
-    def _build_simple_parsed_message(cls, message, parsed_message):
-        simple_message = message.simple_message
-        parsed_message['name'] = simple_message.name
-        event = simple_message.event
-        if (len(event.string_value) > 0):
-            parsed_message['event'] = event.string_value
-        elif event.numeric_value != 0:
-            parsed_message['event'] = event.numeric_value
-        else:
-            parsed_message['event'] = event.boolean_value
-
-        value = simple_message.value
-        if (len(value.string_value) > 0):
-            parsed_message['value'] = value.string_value
-        elif value.numeric_value != 0:
-            parsed_message['value'] = value.numeric_value
-        else:
-            parsed_message['value'] = value.boolean_value
-
+    def _build_field_parsed_message(cls, message, parsed_message,
+            message_fields=PARSED_MESSAGE_FIELDS):
+        payload_name, fields = message_fields[message.type]
+        payload = getattr(message, payload_name)
+        for key, is_present, decode in fields:
+            if is_present(payload):
+                parsed_message[key] = decode(payload)
 
     @classmethod
     def _handle_diagnostic_cc_parsed_message(cls, command, parsed_message):
-        parsed_message['command'] = "diagnostic_request"
         parsed_message['request'] = {}
-        action = command.diagnostic_request.action
-        if action == openxc_pb2.DiagnosticControlCommand.ADD:
-            parsed_message['action'] = "add"
-        elif action == openxc_pb2.DiagnosticControlCommand.CANCEL:
-            parsed_message['action'] = "cancel"
+        action = DIAGNOSTIC_ACTION_NAMES.get(command.diagnostic_request.action)
+        if action is not None:
+            parsed_message['action'] = action
 
         request = command.diagnostic_request.request
         parsed_message['request']['id'] = request.message_id
@@ -322,73 +520,46 @@ class ProtobufFormatter(object):
         parsed_message['request']['multiple_responses'] = request.multiple_responses
         if request.pid != 0:
             parsed_message['request']['pid'] = request.pid
-        if len(binascii.hexlify(request.payload).decode("ascii")) > 0:
-            parsed_message['request']['payload'] = "0x%s" % binascii.hexlify(request.payload).decode("ascii")
-        print("Finished _handle_diagnostic_cc_parsed_message")
+        if len(request.payload) > 0:
+            parsed_message['request']['payload'] = _hex_string(request.payload)
 
     @classmethod
     def _handle_passthrough_cc_parsed_message(cls, command, parsed_message):
-        parsed_message['command'] = "passthrough"
         parsed_message['bus'] = command.passthrough_mode_request.bus
         parsed_message['enabled'] = command.passthrough_mode_request.enabled
 
     @classmethod
     def _handle_predefined_obd2_requests_cc_parsed_message(cls, command, parsed_message):
-        parsed_message['command'] = "predefined_obd2"
         parsed_message['enabled'] = command.predefined_obd2_requests_command.enabled
-        
+
     @classmethod
     def _handle_acceptance_filter_bypass_cc_parsed_message(cls, command, parsed_message):
-        parsed_message['command'] = "af_bypass"
         parsed_message['bus'] = command.acceptance_filter_bypass_command.bus
         parsed_message['bypass'] = command.acceptance_filter_bypass_command.bypass
-        
+
     @classmethod
     def _handle_payload_format_cc_parsed_message(cls, command, parsed_message):
-        parsed_message['command'] = "payload_format"
-        if command.payload_format_command.format == openxc_pb2.PayloadFormatCommand.JSON:
-            parsed_message['format'] = "json"
-        elif command.payload_format_command.format == openxc_pb2.PayloadFormatCommand.PROTOBUF:
-            parsed_message['format'] = "protobuf"
+        payload_format = PAYLOAD_FORMAT_NAMES.get(
+                command.payload_format_command.format)
+        if payload_format is not None:
+            parsed_message['format'] = payload_format
 
     @classmethod
     def _build_control_command_parsed_message(cls, message, parsed_message):
         command = message.control_command
-        if command.type == openxc_pb2.ControlCommand.VERSION:
-            parsed_message['command'] = "version"
-        elif command.type == openxc_pb2.ControlCommand.DEVICE_ID:
-            parsed_message['command'] = "device_id"
-        elif command.type == openxc_pb2.ControlCommand.DIAGNOSTIC:
-            cls._handle_diagnostic_cc_parsed_message(command, parsed_message)
-        elif command.type == openxc_pb2.ControlCommand.PASSTHROUGH:
-            cls._handle_passthrough_cc_parsed_message(command, parsed_message)
-        elif command.type == openxc_pb2.ControlCommand.PREDEFINED_OBD2_REQUESTS:
-            cls._handle_passthrough_cc_parsed_message(command, parsed_message)
-        elif command.type == openxc_pb2.ControlCommand.ACCEPTANCE_FILTER_BYPASS:
-            cls._handle_acceptance_filter_bypass_cc_parsed_message(command, parsed_message)
-        elif command.type == openxc_pb2.ControlCommand.PAYLOAD_FORMAT:
-            cls._handle_payload_format_cc_parsed_message(command, parsed_message)
+        command_name = COMMAND_NAMES.get(command.type)
+        if command_name is not None:
+            parsed_message['command'] = command_name
+            parser = cls.CONTROL_COMMAND_PARSERS.get(command.type)
+            if parser is not None:
+                getattr(cls, parser)(command, parsed_message)
 
     @classmethod
     def _build_command_response_parsed_message(cls, message, parsed_message):
         response = message.command_response
-        if response.type == openxc_pb2.ControlCommand.VERSION:
-            parsed_message['command_response'] = "version"
-        elif response.type == openxc_pb2.ControlCommand.DEVICE_ID:
-            parsed_message['command_response'] = "device_id"
-        elif response.type == openxc_pb2.ControlCommand.DIAGNOSTIC:
-            parsed_message['command_response'] = "diagnostic_request"
-        elif response.type == openxc_pb2.ControlCommand.PASSTHROUGH:
-            parsed_message['command_response'] = "passthrough"
-        elif response.type == openxc_pb2.ControlCommand.PAYLOAD_FORMAT:
-            parsed_message['command_response'] = "payload_format"
-        elif response.type == openxc_pb2.ControlCommand.ACCEPTANCE_FILTER_BYPASS:
-            parsed_message['command_response'] = "af_bypass"
-        elif response.type == openxc_pb2.ControlCommand.PREDEFINED_OBD2_REQUESTS:
-            parsed_message['command_response'] = "predefined_obd2"
-        elif response.type == openxc_pb2.ControlCommand.PLATFORM:
-            parsed_message['command_response'] = "platform"
-        else:
+        try:
+            parsed_message['command_response'] = COMMAND_NAMES[response.type]
+        except KeyError:
             raise UnrecognizedBinaryCommandError(response.type)
 
         parsed_message['status'] = response.status
@@ -396,19 +567,95 @@ class ProtobufFormatter(object):
             parsed_message['message'] = response.message
 
     @classmethod
-    def _protobuf_to_dict(cls, message):
+    def _protobuf_to_dict(cls, message, message_fields=PARSED_MESSAGE_FIELDS):
         parsed_message = {}
         if message is not None:
-            if message.type == message.CAN:
-                cls._build_can_parsed_message(message, parsed_message)
-            elif message.type == message.DIAGNOSTIC:
-                cls._build_diagnostic_parsed_message(message, parsed_message)
-            elif message.type == message.SIMPLE:
-                cls._build_simple_parsed_message(message, parsed_message)
-            elif message.type == message.CONTROL_COMMAND:
-                cls._build_control_command_parsed_message(message, parsed_message)
-            elif message.type == message.COMMAND_RESPONSE:
-                cls._build_command_response_parsed_message(message, parsed_message)
+            if message.type in message_fields:
+                cls._build_field_parsed_message(message, parsed_message,
+                        message_fields)
             else:
-                parsed_message = None
+                parser = cls.MESSAGE_PARSERS.get(message.type)
+                if parser is None:
+                    return None
+                getattr(cls, parser)(message, parsed_message)
+            if message.timestamp:
+                parsed_message['timestamp'] = message.timestamp / 1000.0
         return parsed_message
+
+
+class ProtobufMessageView(MutableMapping):
+    """A read-mostly, dict-like view of a parsed ``openxc_pb2.VehicleMessage``
+    that only decodes a field of the OpenXC message format when it's accessed.
+
+    Most consumers only look at one or two fields of each message (e.g. the
+    ``name``), so this avoids building a complete dict - including hex
+    formatting CAN data - for every message on a busy link.
+
+    The view can be modified like a dict (e.g. sinks adding a ``timestamp``),
+    which never touches the underlying protobuf message.
+    """
+    def __init__(self, message, message_fields=PARSED_MESSAGE_FIELDS):
+        self._message = message
+        payload_name, fields = message_fields[message.type]
+        self._payload = getattr(message, payload_name)
+        self._fields = fields
+        self._values = {}
+        if message.timestamp:
+            self._values['timestamp'] = message.timestamp / 1000.0
+        self._deleted = set()
+
+    def _field(self, key):
+        for field in self._fields:
+            if field[0] == key:
+                return field
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+
+        if key not in self._deleted:
+            field = self._field(key)
+            if field is not None and field[1](self._payload):
+                value = self._values[key] = field[2](self._payload)
+                return value
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in self._values:
+            return True
+        if key in self._deleted:
+            return False
+        field = self._field(key)
+        return field is not None and field[1](self._payload)
+
+    def __setitem__(self, key, value):
+        self._values[key] = value
+        self._deleted.discard(key)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._values.pop(key, None)
+        self._deleted.add(key)
+
+    def __iter__(self):
+        for key, is_present, _ in self._fields:
+            if ((key in self._values or is_present(self._payload)) and
+                    key not in self._deleted):
+                yield key
+
+        for key in self._values:
+            if self._field(key) is None:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self.to_dict())
+
+    def to_dict(self):
+        """Decode every field and return them as a plain ``dict``."""
+        return dict(self.items())
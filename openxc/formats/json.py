@@ -1,27 +1,179 @@
 """JSON formatting utilities."""
 
 
+import binascii
 import json
+import logging
+import numbers
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
 
 from openxc.formats.base import VehicleMessageStreamer
 
+LOG = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    LOG.debug("orjson library not installed, can't use orjson JSON codec")
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    LOG.debug("ujson library not installed, can't use ujson JSON codec")
+    ujson = None
+
+try:
+    import simplejson
+except ImportError:
+    LOG.debug("simplejson library not installed, can't use simplejson JSON "
+            "codec")
+    simplejson = None
+
+
+class UnrecognizedJsonCodecError(Exception): pass
+
+
+class JsonCodec(object):
+    """A JSON implementation that :class:`JsonFormatter` can use to encode and
+    decode messages.
+
+    ``loads`` must accept a ``str``, ``bytes`` or ``bytearray`` and raise a
+    ``ValueError`` if it isn't valid JSON. ``dumps`` must return the UTF-8
+    encoded JSON as ``bytes``.
+    """
+    def __init__(self, name, loads, dumps):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+
+    def __repr__(self):
+        return "JsonCodec(%s)" % self.name
+
+
+# Registered codecs, in order of preference when one is selected automatically
+JSON_CODECS = OrderedDict()
+
+
+def register_json_codec(codec, preferred=False):
+    """Make ``codec`` (a :class:`JsonCodec`) available for
+    :meth:`JsonFormatter.set_codec`.
+
+    Kwargs:
+        preferred - if ``True``, the codec will be tried first when one is
+            selected automatically.
+    """
+    JSON_CODECS[codec.name] = codec
+    if preferred:
+        JSON_CODECS.move_to_end(codec.name, last=False)
+
+
+def _encode_default(value):
+    """Convert values the JSON libraries can't encode natively, e.g. lazy
+    message views, into something they can.
+    """
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise TypeError("%r is not JSON serializable" % value)
+
+
+def _can_data_hex(data):
+    """Format CAN message data given as bytes or an int as the hex string
+    (e.g. "0x1234") used in the JSON message format.
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return "0x%s" % binascii.hexlify(data).decode("ascii")
+    elif isinstance(data, numbers.Integral) and not isinstance(data, bool):
+        digits = "%x" % data
+        return "0x%s%s" % ("0" * (len(digits) % 2), digits)
+    return data
+
+
+def _as_bytes(data):
+    if isinstance(data, (bytearray, memoryview)):
+        data = bytes(data)
+    return data
+
+
+if orjson is not None:
+    register_json_codec(JsonCodec("orjson", orjson.loads,
+            lambda data: orjson.dumps(data, default=_encode_default)))
+
+if ujson is not None:
+    register_json_codec(JsonCodec("ujson",
+            lambda data: ujson.loads(_as_bytes(data)),
+            lambda data: ujson.dumps(data, escape_forward_slashes=False,
+                default=_encode_default).encode("utf8")))
+
+if simplejson is not None:
+    register_json_codec(JsonCodec("simplejson",
+            lambda data: simplejson.loads(_as_bytes(data)),
+            lambda data: simplejson.dumps(data,
+                default=_encode_default).encode("utf8")))
+
+register_json_codec(JsonCodec("json", json.loads,
+        lambda data: json.dumps(data,
+            default=_encode_default).encode("utf8")))
+
 class JsonStreamer(VehicleMessageStreamer):
     SERIALIZED_COMMAND_TERMINATOR = b"\x00"
 
     def parse_next_message(self):
-        parsed_message = None
-        remainder = self.message_buffer
-        message = ""
-        if self.SERIALIZED_COMMAND_TERMINATOR in self.message_buffer:
-            message, _, remainder = self.message_buffer.partition(
-                    self.SERIALIZED_COMMAND_TERMINATOR)
-            try:
-                parsed_message = JsonFormatter.deserialize(message)
-                if not isinstance(parsed_message, dict):
-                    raise ValueError()
-            except ValueError:
-                pass
-        self.message_buffer = remainder
+        started = self._parse_started()
+        message = self.message_buffer.take_until(
+                self.SERIALIZED_COMMAND_TERMINATOR)
+        if message is not None:
+            parsed_message = self._deserialize(message)
+            self._record_parse(parsed_message, started)
+            return parsed_message
+
+    def parse_all(self):
+        """Parse every complete message in the buffer at once, leaving only a
+        trailing partial message behind.
+
+        Returns a list of the parsed messages - any that aren't valid JSON
+        objects are skipped.
+        """
+        end = self.message_buffer.rfind(self.SERIALIZED_COMMAND_TERMINATOR)
+        if end == -1:
+            return []
+
+        data = self.message_buffer.take(end)
+        self.message_buffer.consume(len(self.SERIALIZED_COMMAND_TERMINATOR))
+        messages = []
+        timing = self.timing
+        parse_time = self.parse_time
+        for message in data.split(self.SERIALIZED_COMMAND_TERMINATOR):
+            if timing:
+                started = time.perf_counter_ns()
+            parsed_message = self._deserialize(message)
+            if timing:
+                parse_time.record_ns(time.perf_counter_ns() - started)
+            if parsed_message is None:
+                self.messages_invalid += 1
+            else:
+                messages.append(parsed_message)
+        self._count_parsed(messages)
+        return messages
+
+    def _deserialize(self, message):
+        try:
+            parsed_message = JsonFormatter.deserialize(message)
+            if not isinstance(parsed_message, dict):
+                raise ValueError()
+        except ValueError:
+            parsed_message = None
+        else:
+            if self.binary_can_data and 'id' in parsed_message:
+                data = parsed_message.get('data')
+                if isinstance(data, str):
+                    try:
+                        parsed_message['data'] = bytes.fromhex(
+                                data.split('0x')[-1])
+                    except ValueError:
+                        pass
         return parsed_message
 
     def serialize_for_stream(self, message):
@@ -29,14 +181,50 @@ class JsonStreamer(VehicleMessageStreamer):
                 message) + self.SERIALIZED_COMMAND_TERMINATOR
 
 class JsonFormatter(object):
+    # The JSON implementation used to encode and decode messages, the fastest
+    # installed one by default - see ``set_codec``.
+    codec = next(iter(JSON_CODECS.values()))
+
+    @classmethod
+    def set_codec(cls, name=None):
+        """Select the JSON implementation used by every ``JsonFormatter`` and
+        ``JsonStreamer``.
+
+        Kwargs:
+            name - the name of a registered codec (e.g. "orjson" or "json"), or
+                ``None`` / "auto" to select the most preferred one installed.
+
+        Raises:
+            UnrecognizedJsonCodecError, if no codec is registered as ``name``.
+        """
+        if name is None or name == "auto":
+            codec = next(iter(JSON_CODECS.values()))
+        else:
+            codec = JSON_CODECS.get(name)
+            if codec is None:
+                raise UnrecognizedJsonCodecError("JSON codec %s is not "
+                        "available, choose from %s" % (name,
+                            ", ".join(JSON_CODECS)))
+        cls.codec = codec
+        LOG.debug("Using %s JSON codec", codec.name)
 
     @classmethod
     def deserialize(cls, message):
-        return json.loads(message)
+        return cls.codec.loads(message)
 
     @classmethod
     def serialize(cls, data):
-        return json.dumps(data).encode("utf8")
+        """Encode a message as JSON.
+
+        The ``data`` of a CAN message may be given as bytes or an int instead
+        of a hex string - it's formatted as hex here, since not every codec
+        lets bytes reach the ``default`` hook.
+        """
+        if isinstance(data, Mapping) and 'data' in data and not isinstance(
+                data['data'], str):
+            data = dict(data)
+            data['data'] = _can_data_hex(data['data'])
+        return cls.codec.dumps(data)
 
     @classmethod
     def _validate(cls, message):
@@ -0,0 +1,193 @@
+"""MessagePack formatting utilities."""
+
+
+import collections
+import logging
+import re
+import time
+
+from openxc.formats.base import VehicleMessageStreamer
+from openxc.formats.json import _can_data_hex
+
+LOG = logging.getLogger(__name__)
+
+try:
+    import msgpack
+except ImportError:
+    LOG.debug("msgpack library not installed, can't use MessagePack payload "
+            "format")
+    msgpack = None
+
+
+class MessagePackUnavailableError(Exception): pass
+
+
+class MessagePackStreamer(VehicleMessageStreamer):
+    """Parse a stream of MessagePack encoded vehicle messages.
+
+    MessagePack values are self-delimiting, so unlike JSON and protobuf the
+    messages are written back to back with no terminator or length prefix. A
+    message is the same dict as the JSON format would produce.
+    """
+    # Anything larger than this can't be a valid message, so it must be garbage
+    MAX_MESSAGE_LENGTH = 1024
+    # Every message is a non-empty map with string keys, so after corrupt
+    # data the stream can only pick up again at a fixmap, map16 or map32 marker
+    # with at most MAX_MESSAGE_LENGTH entries, followed by a fixstr, str8,
+    # str16 or str32 marker. Matching them all in one regular expression
+    # skips garbage without looking at each byte in Python.
+    MAP_START_PATTERN = re.compile(b"[\x80-\x8f\xde\xdf]")
+    MESSAGE_START_PATTERN = re.compile(
+            b"(?:[\x81-\x8f]"
+            b"|\xde(?:\x00[\x01-\xff]|[\x01-\x03][\x00-\xff]|\x04\x00)"
+            b"|\xdf\x00\x00(?:\x00[\x01-\xff]|[\x01-\x03][\x00-\xff]"
+            b"|\x04\x00))"
+            b"[\xa0-\xbf\xd9-\xdb]")
+    # A message start split by the end of the buffer is at most this long
+    MESSAGE_START_LENGTH = 6
+    # How much to unpack when checking if a map marker really starts a message
+    RESYNC_WINDOW = 4 * MAX_MESSAGE_LENGTH
+
+    def __init__(self, **kwargs):
+        """Raises:
+            MessagePackUnavailableError, if the msgpack library isn't
+                installed.
+        """
+        if msgpack is None:
+            raise MessagePackUnavailableError("msgpack library is not "
+                    "installed, can't use MessagePack payload format")
+        super(MessagePackStreamer, self).__init__(**kwargs)
+        self._resyncing = False
+        # messages parsed but not yet returned by parse_next_message
+        self._pending = collections.deque()
+
+    def parse_next_message(self):
+        if len(self._pending) == 0:
+            self._pending.extend(self._parse())
+        if len(self._pending) > 0:
+            return self._pending.popleft()
+
+    def parse_all(self):
+        """Parse every complete message in the buffer in a single pass, leaving
+        only a trailing partial message behind.
+
+        Returns a list of the parsed messages - any that aren't valid
+        MessagePack maps are skipped.
+        """
+        messages = list(self._pending)
+        self._pending.clear()
+        messages.extend(self._parse())
+        return messages
+
+    def _unpacker(self, data):
+        unpacker = msgpack.Unpacker(raw=False,
+                max_buffer_size=max(len(data), 1),
+                max_bin_len=self.MAX_MESSAGE_LENGTH,
+                max_str_len=self.MAX_MESSAGE_LENGTH,
+                max_array_len=self.MAX_MESSAGE_LENGTH,
+                max_map_len=self.MAX_MESSAGE_LENGTH)
+        unpacker.feed(data)
+        return unpacker
+
+    def _parse(self):
+        messages = []
+        timing = self.timing
+        # the unpacker's position is relative to where it was started
+        offset = 0
+        position = 0
+        with self.message_buffer.view() as data:
+            unpacker = self._unpacker(data)
+            while True:
+                if timing:
+                    started = time.perf_counter_ns()
+                try:
+                    message = unpacker.unpack()
+                except msgpack.OutOfData:
+                    break
+                except (ValueError, msgpack.UnpackException):
+                    # The stream is corrupt and the unpacker can't recover on
+                    # its own, so start a fresh one at the next message
+                    if not self._resyncing:
+                        self._resyncing = True
+                        self.messages_invalid += 1
+                    resumed = self._resync(data, position)
+                    self.bytes_skipped += resumed - position
+                    position = offset = resumed
+                    unpacker = self._unpacker(data[position:])
+                    continue
+
+                self._resyncing = False
+                position = offset + unpacker.tell()
+                message = self._message_from_unpacked(message)
+                if timing:
+                    self.parse_time.record_ns(time.perf_counter_ns() - started)
+                if message is None:
+                    self.messages_invalid += 1
+                else:
+                    messages.append(message)
+        self.message_buffer.consume(position)
+        self._count_parsed(messages)
+        return messages
+
+    def _resync(self, data, position):
+        """Return the position of the next message start after ``position``,
+        or the end of ``data`` if there isn't one.
+
+        Each candidate is checked by unpacking at most ``RESYNC_WINDOW`` bytes,
+        so skipping a long run of garbage doesn't copy the rest of the buffer.
+        """
+        while True:
+            match = self.MESSAGE_START_PATTERN.search(data, position + 1)
+            if match is None:
+                break
+            position = match.start()
+            try:
+                self._unpacker(data[position:position +
+                    self.RESYNC_WINDOW]).unpack()
+            except msgpack.OutOfData:
+                # it might be the start of a message that isn't all here yet
+                return position
+            except (ValueError, msgpack.UnpackException):
+                continue
+            return position
+
+        # hold on to a map marker at the very end, which may be completed by
+        # the next bytes received
+        tail = max(position + 1, len(data) - self.MESSAGE_START_LENGTH + 1)
+        match = self.MAP_START_PATTERN.search(data, tail)
+        if match is not None:
+            return match.start()
+        return len(data)
+
+    def _message_from_unpacked(self, message):
+        if not isinstance(message, dict):
+            return None
+        if self.binary_can_data and 'id' in message:
+            data = message.get('data')
+            if isinstance(data, str):
+                try:
+                    message['data'] = bytes.fromhex(data.split('0x')[-1])
+                except ValueError:
+                    pass
+        return message
+
+    def serialize_for_stream(self, message):
+        return MessagePackFormatter.serialize(message)
+
+
+class MessagePackFormatter(object):
+    @classmethod
+    def deserialize(cls, message):
+        return msgpack.unpackb(message, raw=False)
+
+    @classmethod
+    def serialize(cls, data):
+        """Encode a message as MessagePack.
+
+        The ``data`` of a CAN message may be given as bytes or an int instead
+        of a hex string, and is encoded as hex like the JSON format.
+        """
+        if 'data' in data and not isinstance(data['data'], str):
+            data = dict(data)
+            data['data'] = _can_data_hex(data['data'])
+        return msgpack.packb(data, use_bin_type=True, default=dict)
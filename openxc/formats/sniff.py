@@ -0,0 +1,89 @@
+"""Detect the payload format of a stream of vehicle messages from its first
+bytes.
+"""
+import logging
+
+from openxc.formats.binary import ProtobufStreamer
+
+LOG = logging.getLogger(__name__)
+
+# Bytes that can appear in a stream of null-terminated JSON messages - anything
+# else in the low ASCII range is a control character that means it's binary.
+JSON_CONTROL_BYTES = frozenset(b"\x00\t\n\r")
+JSON_WHITESPACE = b"\x00\t\n\r "
+
+
+def _looks_like_json(data):
+    return not any(byte < 0x20 and byte not in JSON_CONTROL_BYTES or
+            byte == 0x7f for byte in data)
+
+
+def _protobuf_messages(data):
+    """Return the number of protobuf messages parsed from ``data`` and the
+    number of bytes that had to be skipped to find them.
+    """
+    streamer = ProtobufStreamer()
+    streamer.receive(data)
+    return len(streamer.parse_all()), streamer.bytes_skipped
+
+
+def sniff_payload_format(data, final=False):
+    """Guess whether ``data``, the first bytes received from a vehicle
+    interface, is a stream of JSON or protobuf messages.
+
+    A format is only returned once the bytes are convincing: a complete,
+    null-terminated JSON object, a complete protobuf message right at the start
+    or, if the data starts partway through a message, a couple of complete
+    protobuf messages after it. Otherwise ``None`` is returned so the caller
+    can wait for more data.
+
+    Kwargs:
+        final - if ``True``, no more data is coming, so a best guess is made
+            based on whether the bytes are printable if the stream isn't
+            conclusive.
+    """
+    data = bytes(data)
+    stripped = data.lstrip(JSON_WHITESPACE)
+    if len(stripped) == 0:
+        return None
+
+    if _looks_like_json(stripped):
+        if stripped[:1] == b"{":
+            if b"}\x00" in stripped or final:
+                return "json"
+            # don't risk reading a partial JSON object as protobuf
+            return None
+        elif b"}\x00{" in stripped:
+            return "json"
+
+    parsed, skipped = _protobuf_messages(data)
+    if (parsed > 0 and skipped == 0) or parsed > 1:
+        return "protobuf"
+    elif final:
+        return "json" if _looks_like_json(stripped) else "protobuf"
+    return None
+
+
+class PayloadFormatSniffer(object):
+    """Collect the first bytes read from a vehicle interface until its payload
+    format can be detected.
+    """
+    # Give up waiting for a conclusive sample after this many bytes and take
+    # a best guess
+    MAX_SNIFF_SIZE = 1024
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def receive(self, payload):
+        """Add ``payload`` to the sample and try to detect the format.
+
+        Returns the detected format, or ``None`` if more data is needed.
+        """
+        self.buffer += payload
+        payload_format = sniff_payload_format(self.buffer,
+                final=len(self.buffer) >= self.MAX_SNIFF_SIZE)
+        if payload_format is not None:
+            LOG.debug("Detected %s payload format after %d bytes",
+                    payload_format, len(self.buffer))
+        return payload_format
@@ -4,6 +4,7 @@ import datetime
 import time
 
 from openxc.formats import JsonFormatter
+from openxc.formats.binary import ProtobufStreamer
 from .queued import QueuedSink
 
 
@@ -13,34 +14,60 @@ class FileRecorderSink(QueuedSink):
     """
     FILENAME_DATE_FORMAT = "%Y-%m-%d-%H"
     FILENAME_FORMAT = "%s.json"
+    # Trace file extensions by format, for formats other than JSON
+    FILENAME_FORMATS = {
+        "protobuf": "%s.pb",
+    }
+    TRACE_FORMATS = ("json", "protobuf")
 
-    def __init__(self):
+    def __init__(self, trace_format="json"):
+        """Kwargs:
+            trace_format - "json" to record a line of JSON per message, or
+                "protobuf" to record length-delimited protobuf messages, which
+                are smaller and faster to replay.
+        """
         super(FileRecorderSink, self).__init__()
-        self.recorder = self.Recorder(self.queue)
+        if trace_format not in self.TRACE_FORMATS:
+            raise ValueError("Unrecognized trace format %s, must be one of %s"
+                    % (trace_format, ", ".join(self.TRACE_FORMATS)))
+        self.trace_format = trace_format
+        self.recorder = self.Recorder(self.queue, trace_format)
 
     class Recorder(Thread):
-        def __init__(self, queue):
+        def __init__(self, queue, trace_format="json"):
             super(FileRecorderSink.Recorder, self).__init__()
             self.daemon = True
             self.queue = queue
+            self.trace_format = trace_format
+            if trace_format == "protobuf":
+                self._serialize = ProtobufStreamer().serialize_for_stream
+            else:
+                self._serialize = self._serialize_json_line
             self.start()
 
         @staticmethod
-        def _generate_filename():
+        def _serialize_json_line(message):
+            return JsonFormatter.serialize(message) + b"\n"
+
+        def _generate_filename(self):
             current_date = datetime.datetime.now()
-            return FileRecorderSink.FILENAME_FORMAT % current_date.strftime(
+            filename_format = FileRecorderSink.FILENAME_FORMATS.get(
+                    self.trace_format, FileRecorderSink.FILENAME_FORMAT)
+            return filename_format % current_date.strftime(
                     FileRecorderSink.FILENAME_DATE_FORMAT)
 
         def run(self):
             while True:
                 last_hour_opened = datetime.datetime.now().hour
                 filename = self._generate_filename()
-                with open(filename, 'a') as output_file:
+                with open(filename, 'ab') as output_file:
                     while True:
                         message, _ = self.queue.get()
                         message['timestamp'] = time.time()
-                        output_file.write(JsonFormatter.serialize(message))
+                        output_file.write(self._serialize(message))
+                        if self.queue.empty():
+                            output_file.flush()
                         self.queue.task_done()
 
-                        if datetime.datetime.now().hour > last_hour_opened:
+                        if datetime.datetime.now().hour != last_hour_opened:
                             break
@@ -1,6 +1,9 @@
 from .base import DataSource, DataSourceError
 from .usb import UsbDataSource
 from .serial import SerialDataSource
-from .trace import TraceDataSource
+from .trace import TraceDataSource, MultiTraceDataSource
 from .network import NetworkDataSource
+from .reactor import SourceReactor
 from .bluetooth import BluetoothVehicleInterface
+from .aio import AsyncDataSource, AsyncSocketDataSource, \
+        AsyncNetworkDataSource, AsyncTraceDataSource
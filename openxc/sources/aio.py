@@ -0,0 +1,304 @@
+"""Data sources for asyncio applications.
+
+Instead of running a thread and pushing messages to a callback, these sources
+do all of their I/O on the event loop and are read with ``async for``:
+
+    async with AsyncNetworkDataSource(host="localhost") as source:
+        async for message in source:
+            print(message)
+"""
+import asyncio
+import logging
+import socket
+import time
+
+from .base import DataSourceError, PayloadFormatMixin
+from .network import NetworkDataSource
+from .socket import SocketDataSource
+from .trace import TraceDataSource
+from .tracefile import open_trace_file, read_records, record_timestamp, \
+        trace_format, PROTOBUF_TRACE, TRACE_READ_ERRORS
+
+LOG = logging.getLogger(__name__)
+
+
+class AsyncDataSource(PayloadFormatMixin):
+    """Interface for asyncio vehicle data sources, the counterpart of
+    :class:`BytestreamDataSource`.
+
+    Subclasses implement ``open``, ``read`` and ``close`` as coroutines.
+    Iterating over the source opens it if necessary, then parses each payload
+    that ``read`` returns and yields every valid message, until ``read``
+    returns an empty payload at the end of the stream.
+    """
+
+    def __init__(self, payload_format=None, lazy_messages=False,
+            binary_can_data=False):
+        """Kwargs:
+            payload_format - "json", "protobuf" or "messagepack", or ``None``
+                to detect it from the first bytes received
+            lazy_messages - if ``True`` and the payload format is protobuf,
+                yield messages as dict-like views that only decode a field
+                when it's accessed
+            binary_can_data - if ``True``, yield the ``data`` of CAN messages
+                as bytes instead of a hex string
+        """
+        self._init_payload_format(payload_format, lazy_messages,
+                binary_can_data)
+        self.corrupted_messages = 0
+        self.opened = False
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def __aiter__(self):
+        return self.messages()
+
+    async def open(self):
+        self.opened = True
+
+    async def close(self):
+        self.opened = False
+
+    async def read(self):
+        """Return the next bytes received, or an empty bytes object at the
+        end of the stream.
+
+        Raises:
+            DataSourceError, if the source can't be read from.
+        """
+        raise NotImplementedError("Don't use AsyncDataSource directly")
+
+    async def messages(self):
+        """Yield each valid message received until the end of the stream."""
+        if not self.opened:
+            await self.open()
+
+        while True:
+            payload = await self.read()
+            if len(payload) == 0:
+                break
+
+            if self._streamer is None:
+                payload = self._sniff_payload_format(payload)
+                if payload is None:
+                    continue
+            self.streamer.receive(payload)
+            for message in self._parse_messages():
+                yield message
+
+        payload = self._finish_sniffing()
+        if payload is not None:
+            self.streamer.receive(payload)
+            for message in self._parse_messages():
+                yield message
+
+    def _parse_messages(self):
+        messages = []
+        for message in self.streamer.parse_all():
+            if self._message_valid(message):
+                messages.append(message)
+            else:
+                self.corrupted_messages += 1
+        return messages
+
+    def stats(self):
+        stats = super(AsyncDataSource, self).stats()
+        stats['corrupted_messages'] = self.corrupted_messages
+        return stats
+
+
+class AsyncSocketDataSource(AsyncDataSource):
+    """Read from a connected stream socket, e.g. a Bluetooth RFCOMM socket,
+    with asyncio streams.
+    """
+    DEFAULT_RECEIVE_SIZE = SocketDataSource.DEFAULT_RECEIVE_SIZE
+
+    def __init__(self, sock=None, receive_size=None, **kwargs):
+        """Kwargs:
+            sock - the connected socket to read from
+            receive_size - the most bytes to read at once (default is 4096)
+        """
+        super(AsyncSocketDataSource, self).__init__(**kwargs)
+        self.socket = sock
+        self.receive_size = receive_size or self.DEFAULT_RECEIVE_SIZE
+        self.reader = None
+        self.writer = None
+
+    async def _open_connection(self):
+        return await asyncio.open_connection(sock=self.socket)
+
+    def _describe(self):
+        return "socket %s" % self.socket
+
+    async def open(self):
+        """Raises:
+            DataSourceError, if the connection can't be opened.
+        """
+        try:
+            self.reader, self.writer = await self._open_connection()
+        except (OSError, socket.error) as e:
+            raise DataSourceError("Unable to open %s: %s" % (self._describe(),
+                e))
+        await super(AsyncSocketDataSource, self).open()
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            # only available since Python 3.7
+            wait_closed = getattr(self.writer, 'wait_closed', None)
+            if wait_closed is not None:
+                try:
+                    await wait_closed()
+                except (OSError, socket.error):
+                    pass
+            self.writer = None
+        await super(AsyncSocketDataSource, self).close()
+
+    async def read(self):
+        try:
+            return await self.reader.read(self.receive_size)
+        except (OSError, socket.error) as e:
+            raise DataSourceError("Unable to read from %s: %s" % (
+                self._describe(), e))
+
+    async def write_bytes(self, data):
+        self.writer.write(data)
+        await self.writer.drain()
+        return len(data)
+
+
+class AsyncNetworkDataSource(AsyncSocketDataSource):
+    """The asyncio counterpart of :class:`NetworkDataSource`, connecting to a
+    network socket when opened.
+    """
+    DEFAULT_PORT = NetworkDataSource.DEFAULT_PORT
+
+    def __init__(self, host=None, port=None, **kwargs):
+        """Kwargs:
+            host - optionally override the default network host (default is
+                local machine)
+            port - optionally override the default network port (default is
+                50001)
+        """
+        super(AsyncNetworkDataSource, self).__init__(**kwargs)
+        self.host = host or socket.gethostbyname(socket.gethostname())
+        self.port = int(port or self.DEFAULT_PORT)
+
+    async def _open_connection(self):
+        connection = await asyncio.open_connection(self.host, self.port)
+        LOG.debug("Opened socket connection at %s:%s", self.host, self.port)
+        return connection
+
+    def _describe(self):
+        return "socket connection at %s:%s" % (self.host, self.port)
+
+
+class AsyncTraceDataSource(AsyncDataSource):
+    """The asyncio counterpart of :class:`TraceDataSource`, replaying a JSON
+    or protobuf trace file through the streamer.
+
+    The file is read on the event loop, without the read-ahead thread used
+    for compressed files by :class:`TraceDataSource`, and waiting between
+    records in realtime is an ``asyncio.sleep``.
+    """
+    DEFAULT_SCHEDULING_SLOT = TraceDataSource.DEFAULT_SCHEDULING_SLOT
+
+    def __init__(self, filename=None, realtime=True, loop=True, speed=1.0,
+            scheduling_slot=None, **kwargs):
+        """Kwargs:
+            filename - the path to the trace file
+            realtime - if ``True``, replay the trace at approximately the
+                recorded cadence, otherwise as fast as possible
+            loop - if ``True``, start again from the beginning at the end of
+                the file
+            speed - when replaying in realtime, a multiple of the recorded
+                rate to replay at
+            scheduling_slot - when replaying in realtime, records due within
+                this many seconds are released without sleeping
+
+        Raises:
+            DataSourceError, if the trace file can't be opened.
+        """
+        if filename is None:
+            raise DataSourceError("Trace filename is not defined")
+        if speed <= 0:
+            raise DataSourceError("Trace replay speed must be positive")
+        try:
+            self.trace_format = trace_format(filename)
+        except TRACE_READ_ERRORS as e:
+            raise DataSourceError("Unable to open trace file %s" % filename, e)
+        kwargs['payload_format'] = self.trace_format
+        super(AsyncTraceDataSource, self).__init__(**kwargs)
+        self.filename = filename
+        self.realtime = realtime
+        self.loop = loop
+        self.speed = speed
+        self.scheduling_slot = (scheduling_slot if scheduling_slot is not None
+                else self.DEFAULT_SCHEDULING_SLOT)
+        self.trace_file = None
+        self._records = None
+        self.first_timestamp = None
+        self.starting_time = None
+
+    async def open(self):
+        self._reopen_file()
+        await super(AsyncTraceDataSource, self).open()
+
+    async def close(self):
+        self._close_file()
+        await super(AsyncTraceDataSource, self).close()
+
+    def _reopen_file(self):
+        self._close_file()
+        try:
+            self.trace_file = open_trace_file(self.filename, read_ahead=False)
+        except IOError as e:
+            raise DataSourceError("Unable to open trace file %s" %
+                    self.filename, e)
+        self._records = read_records(self.trace_file, self.trace_format)
+        self.first_timestamp = None
+        self.starting_time = time.perf_counter()
+
+    def _close_file(self):
+        if self.trace_file is not None:
+            self.trace_file.close()
+            self.trace_file = None
+
+    def _next_record(self):
+        try:
+            return next(self._records, None)
+        except TRACE_READ_ERRORS as e:
+            raise DataSourceError("Unable to read trace file %s: %s" % (
+                self.filename, e))
+
+    async def read(self):
+        """Return the next record of the trace, once it's due if replaying
+        in realtime.
+        """
+        record = self._next_record()
+        if record is None and self.loop:
+            self._reopen_file()
+            record = self._next_record()
+        if record is None:
+            return b""
+
+        timestamp = record_timestamp(record, self.trace_format)
+        if self.realtime and timestamp is not None:
+            await self._wait_until_due(timestamp)
+        if self.trace_format == PROTOBUF_TRACE:
+            return record
+        return record + b"\x00"
+
+    async def _wait_until_due(self, timestamp):
+        if self.first_timestamp is None:
+            self.first_timestamp = timestamp
+        target_time = self.starting_time + (
+                (timestamp - self.first_timestamp) / self.speed)
+        delay = target_time - time.perf_counter()
+        if delay > self.scheduling_slot:
+            await asyncio.sleep(delay)
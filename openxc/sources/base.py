@@ -3,46 +3,38 @@
 
 import threading
 import logging
-import string
 import sys
+import time
 import datetime
 
+from openxc.utils import Histogram
+from .dispatch import DispatchQueue, BLOCK
 from openxc.formats.binary import ProtobufStreamer, ProtobufFormatter
 from openxc.formats.json import JsonStreamer, JsonFormatter
+from openxc.formats.messagepack import MessagePackStreamer, \
+        MessagePackFormatter
+from openxc.formats.sniff import PayloadFormatSniffer, sniff_payload_format
 
 LOG = logging.getLogger(__name__)
 
 class MissingPayloadFormatError(Exception): pass
 
-class DataSource(threading.Thread):
-    """Interface for all vehicle data sources. This inherits from Thread and
-    when a source is added to a vehicle it attempts to call the ``start()``
-    method if it exists. If an implementer of DataSource needs some background
-    process to read data, it's just a matter of defining a ``run()`` method.
 
-    A data source requires a callback method to be specified. Whenever new data
-    is received, it will pass it to that callback.
+class PayloadFormatMixin(object):
+    """The payload format of a data source, and the streamer and formatter
+    for it, detecting the format from the first bytes received if it isn't
+    known up front.
     """
-    def __init__(self, callback=None, log_mode=None, payload_format=None):
-        """Construct a new DataSource.
-
-        By default, DataSource threads are marked as ``daemon`` threads, so they
-        will die as soon as all other non-daemon threads in the process have
-        quit.
 
-        Kwargs:
-            callback - function to call with any new data received
-        """
-        super(DataSource, self).__init__()
-        self.callback = callback
-        self.daemon = True
-        self.running = True
+    def _init_payload_format(self, payload_format=None, lazy_messages=False,
+            binary_can_data=False):
+        self.lazy_messages = lazy_messages
+        self.binary_can_data = binary_can_data
         self._streamer = None
         self._formatter = None
+        self._sniffer = None
         self._format = payload_format
-        self.format = payload_format  # Added 7/30/2021 to fix protobuf streaming out
-
-        self.logger = SourceLogger(self, log_mode)
+        self.format = payload_format
 
     @property
     def format(self):
@@ -52,17 +44,24 @@ class DataSource(threading.Thread):
     def format(self, value):
         self._format = value
         if value == "json":
-            self.streamer = JsonStreamer()
+            self.streamer = JsonStreamer(
+                    binary_can_data=self.binary_can_data)
             self.formatter = JsonFormatter
         elif value == "protobuf":
-            self.streamer = ProtobufStreamer()
+            self.streamer = ProtobufStreamer(lazy=self.lazy_messages,
+                    binary_can_data=self.binary_can_data)
             self.formatter = ProtobufFormatter
+        elif value == "messagepack":
+            self.streamer = MessagePackStreamer(
+                    binary_can_data=self.binary_can_data)
+            self.formatter = MessagePackFormatter
 
     @property
     def streamer(self):
         if self._streamer is None:
             raise MissingPayloadFormatError("Unable to auto-detect payload "
-                "format, must specify manually with --format [json|protobuf]")
+                "format, must specify manually with "
+                "--format [json|protobuf|messagepack]")
         return self._streamer
 
     @streamer.setter
@@ -73,7 +72,8 @@ class DataSource(threading.Thread):
     def formatter(self):
         if self._formatter is None:
             raise MissingPayloadFormatError("Unable to auto-detect payload "
-                "format, must specify manually with --format [json|protobuf]")
+                "format, must specify manually with "
+                "--format [json|protobuf|messagepack]")
         return self._formatter
 
     @formatter.setter
@@ -84,6 +84,95 @@ class DataSource(threading.Thread):
     def bytes_received(self):
         return self.streamer.bytes_received
 
+    def stats(self):
+        """Return a dict of counters describing the data received from this
+        source so far, e.g. bytes received, messages parsed by type, invalid
+        messages and a summary of the time taken to parse each message.
+        """
+        if self._streamer is None:
+            return {}
+        return self._streamer.stats()
+
+    def _message_valid(self, message):
+        if not hasattr(message, '__iter__'):
+            return False
+        if not ('name' in message and 'value' in message or
+                    ('id' in message and 'data' in message) or
+                    ('id' in message and 'bus' in message) or
+                    'command_response' in message):
+            return False
+        return True
+
+    def _sniff_payload_format(self, payload):
+        """Hold on to the first bytes read until the payload format can be
+        detected, then set it.
+
+        Returns all of the bytes received so far once the format is known, or
+        ``None`` if more data is needed.
+        """
+        if self._sniffer is None:
+            self._sniffer = PayloadFormatSniffer()
+        payload_format = self._sniffer.receive(payload)
+        if payload_format is None:
+            return None
+        self.format = payload_format
+        payload = self._sniffer.buffer
+        self._sniffer = None
+        return payload
+
+    def _finish_sniffing(self):
+        """Take a best guess at the payload format with whatever was received
+        before the source stopped, if it's still unknown.
+
+        Returns the bytes received so far if a format was guessed, otherwise
+        ``None``.
+        """
+        payload = None
+        if self._streamer is None and self._sniffer is not None:
+            payload_format = sniff_payload_format(self._sniffer.buffer,
+                    final=True)
+            if payload_format is not None:
+                self.format = payload_format
+                payload = self._sniffer.buffer
+            self._sniffer = None
+        return payload
+
+
+class DataSource(PayloadFormatMixin, threading.Thread):
+    """Interface for all vehicle data sources. This inherits from Thread and
+    when a source is added to a vehicle it attempts to call the ``start()``
+    method if it exists. If an implementer of DataSource needs some background
+    process to read data, it's just a matter of defining a ``run()`` method.
+
+    A data source requires a callback method to be specified. Whenever new data
+    is received, it will pass it to that callback.
+    """
+    def __init__(self, callback=None, log_mode=None, payload_format=None,
+            lazy_messages=False, binary_can_data=False):
+        """Construct a new DataSource.
+
+        By default, DataSource threads are marked as ``daemon`` threads, so they
+        will die as soon as all other non-daemon threads in the process have
+        quit.
+
+        Kwargs:
+            callback - function to call with any new data received
+            lazy_messages - if ``True`` and the payload format is protobuf,
+                pass messages to the callback as dict-like views that only
+                decode a field when it's accessed
+            binary_can_data - if ``True``, pass the ``data`` of CAN messages to
+                the callback as bytes instead of a hex string
+        """
+        super(DataSource, self).__init__()
+        self.callback = callback
+        self.daemon = True
+        self.running = True
+        # Added 7/30/2021 to fix protobuf streaming out
+        self._init_payload_format(payload_format, lazy_messages,
+                binary_can_data)
+
+        self.logger = SourceLogger(self, log_mode)
+
     def start(self):
         self.logger.start()
         super(DataSource, self).start()
@@ -171,63 +260,128 @@ class BytestreamDataSource(DataSource):
     Subclasses of this class need only to implement the ``read`` method.
     """
 
-    def __init__(self, **kwargs):
+    def __init__(self, dispatch_queue_size=None, dispatch_policy=BLOCK,
+            **kwargs):
+        """Kwargs:
+            dispatch_queue_size - if given, run the callback on a separate
+                thread, with up to this many parsed messages queued for it, so
+                a slow callback doesn't hold up reading from the source. By
+                default the callback runs on the reader thread.
+            dispatch_policy - what to do with a new message when the dispatch
+                queue is full: "block" (the default), "drop-oldest",
+                "drop-newest" or "latest" to keep only the latest value of
+                each signal. See :class:`DispatchQueue`.
+        """
         super(BytestreamDataSource, self).__init__(**kwargs)
         self.corrupted_messages = 0
+        self.callback_time = Histogram()
+        self.dispatch_queue = None
+        if dispatch_queue_size is not None:
+            self.dispatch_queue = DispatchQueue(dispatch_queue_size,
+                    dispatch_policy)
+        self._dispatcher = None
         self.running = True
 
-    def _message_valid(self, message):
-        if not hasattr(message, '__iter__'):
-            return False
-        if not ('name' in message and 'value' in message or
-                    ('id' in message and 'data' in message) or
-                    ('id' in message and 'bus' in message) or
-                    'command_response' in message):
-            return False
-        return True
+    def stats(self):
+        stats = super(BytestreamDataSource, self).stats()
+        stats['corrupted_messages'] = self.corrupted_messages
+        stats['callback_time'] = self.callback_time.as_dict()
+        if self.dispatch_queue is not None:
+            stats['dispatch'] = self.dispatch_queue.stats()
+        return stats
 
     def parse_messages(self):
-        while True:
-            message = self.streamer.parse_next_message()
-            if message is None:
-                break
-
+        for message in self.streamer.parse_all():
             if not self._message_valid(message):
                 self.corrupted_messages += 1
-                break
+                continue
+            self._dispatch(message)
 
+    def _dispatch(self, message):
+        """Pass a valid message to the callback, or to the dispatch queue if
+        there is one.
+
+        Command responses are always handed to any open requests from the
+        reader thread, so they can't be dropped from the queue.
+        """
+        if self.dispatch_queue is not None:
+            self.dispatch_queue.put(message)
+        elif self.callback is not None:
+            self._run_callback(message)
+        self._receive_command_response(message)
+
+    def _run_callback(self, message):
+        started = time.perf_counter()
+        self.callback(message)
+        self.callback_time.record(time.perf_counter() - started)
+
+    def _run_dispatcher(self):
+        while True:
+            message = self.dispatch_queue.get()
+            if message is None:
+                break
             if self.callback is not None:
-                self.callback(message)
-            self._receive_command_response(message)
+                self._run_callback(message)
 
     def run(self):
         """Continuously read data from the source and attempt to parse a valid
         message from the buffer of bytes. When a message is parsed, passes it
         off to the callback if one is set.
+
+        With a dispatch queue, the callback runs on a separate thread, which
+        finishes with any messages still queued when the source stops.
         """
+        self._start_dispatcher()
+        try:
+            self._read_messages()
+        finally:
+            self._stop_dispatcher()
+
+    def _start_dispatcher(self):
+        if self.dispatch_queue is not None and self._dispatcher is None:
+            self._dispatcher = threading.Thread(target=self._run_dispatcher)
+            self._dispatcher.daemon = True
+            self._dispatcher.start()
+
+    def _stop_dispatcher(self):
+        if self._dispatcher is not None:
+            self.dispatch_queue.close()
+            self._dispatcher.join()
+
+    def _read_messages(self):
         while self.running:
-            payload = ""
-            payloadsave = ""
             try:
                 payload = self.read()
-                try:
-                    payloadsave = str(payload, "cp437", "ignore")
-                except:
-                    payloadsave = ""
             except DataSourceError as e:
-                if self.running:
-                    LOG.warn("Can't read from data source -- stopping: %s", e)
+                if self.running and self._recover(e):
+                    continue
                 break
+            self._receive_payload(payload)
+        self._finish_stream()
 
-            try:
-                self.streamer
-            except MissingPayloadFormatError:
-                json_chars = ['\x00']
-                json_chars.extend(string.printable)
-                if all((char in json_chars for char in payloadsave)):
-                    self.format = "json"
-                else:
-                    self.format = "protobuf"
+    def _recover(self, error):
+        """Called when reading from the source fails while it's running.
+
+        Returns ``True`` if the source can be read from again, or ``False`` to
+        stop reading.
+        """
+        LOG.warn("Can't read from data source -- stopping: %s", error)
+        return False
+
+    def _receive_payload(self, payload):
+        """Parse the bytes read from the source, and dispatch any complete
+        messages.
+        """
+        if self._streamer is None:
+            payload = self._sniff_payload_format(payload)
+            if payload is None:
+                return
+        self.streamer.receive(payload)
+        self.parse_messages()
+
+    def _finish_stream(self):
+        payload = self._finish_sniffing()
+        if payload is not None:
             self.streamer.receive(payload)
             self.parse_messages()
 
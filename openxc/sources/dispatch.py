@@ -0,0 +1,145 @@
+"""A bounded queue to hand parsed messages from a data source's reader thread
+to a separate thread that runs the callback, so a slow callback doesn't stop
+the source from draining the vehicle interface.
+"""
+import itertools
+import logging
+import threading
+from collections import OrderedDict
+
+LOG = logging.getLogger(__name__)
+
+# What to do with a new message when the queue is full
+BLOCK = "block"
+DROP_OLDEST = "drop-oldest"
+DROP_NEWEST = "drop-newest"
+LATEST = "latest"
+DISPATCH_POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST, LATEST)
+
+
+def signal_key(message):
+    """Return a key identifying the signal a message is a sample of, or
+    ``None`` if it isn't one (e.g. a command or diagnostic response).
+
+    Evented signals are keyed by their value too, since it says which of
+    several things the event is about (e.g. which door is ajar).
+    """
+    if 'name' in message:
+        if 'event' in message:
+            return ('name', message['name'], message.get('value'))
+        return ('name', message['name'])
+    if 'id' in message and 'data' in message:
+        return ('can', message.get('bus'), message['id'])
+    return None
+
+
+class DispatchQueue(object):
+    """A thread-safe FIFO queue of messages holding at most ``capacity``,
+    with a policy for when it's full:
+
+        block - wait for the callback to catch up, as if there was no queue
+            but with some slack.
+        drop-oldest - discard the oldest queued message.
+        drop-newest - discard the new message.
+        latest - keep only the latest value of each signal: a new sample
+            replaces a queued sample of the same signal, in its place in the
+            queue, and the oldest message is discarded if it's still full.
+            Messages that aren't signal samples are never replaced.
+    """
+
+    def __init__(self, capacity, policy=BLOCK):
+        """Raises:
+            ValueError, if the capacity is less than 1 or the policy is not
+                one of ``DISPATCH_POLICIES``.
+        """
+        if capacity < 1:
+            raise ValueError("Dispatch queue capacity must be at least 1")
+        if policy not in DISPATCH_POLICIES:
+            raise ValueError("Unrecognized dispatch policy %s, must be one "
+                    "of %s" % (policy, ", ".join(DISPATCH_POLICIES)))
+        self.capacity = capacity
+        self.policy = policy
+        self.queued = 0
+        self.dropped = 0
+        self.peak_depth = 0
+        self._messages = OrderedDict()
+        self._keys = itertools.count()
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def __len__(self):
+        return len(self._messages)
+
+    def put(self, message):
+        """Add a message to the queue, applying the policy if it's full.
+
+        Returns ``True`` if the message was queued, or ``False`` if it was
+        dropped.
+        """
+        with self._condition:
+            key = None
+            if self.policy == LATEST:
+                key = signal_key(message)
+                if key is not None and key in self._messages:
+                    self._messages[key] = message
+                    self.queued += 1
+                    self.dropped += 1
+                    return True
+
+            if len(self._messages) >= self.capacity:
+                if self.policy == BLOCK:
+                    while (len(self._messages) >= self.capacity and
+                            not self._closed):
+                        self._condition.wait()
+                elif self.policy == DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                else:
+                    self._messages.popitem(last=False)
+                    self.dropped += 1
+            if self._closed:
+                self.dropped += 1
+                return False
+
+            if key is None:
+                key = ('message', next(self._keys))
+            self._messages[key] = message
+            self.queued += 1
+            self.peak_depth = max(self.peak_depth, len(self._messages))
+            self._condition.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """Remove and return the oldest message, waiting up to ``timeout``
+        seconds for one.
+
+        Returns ``None`` if the wait times out, or if the queue has been
+        closed and is empty.
+        """
+        with self._condition:
+            while len(self._messages) == 0:
+                if self._closed:
+                    return None
+                if not self._condition.wait(timeout):
+                    return None
+            _, message = self._messages.popitem(last=False)
+            self._condition.notify_all()
+            return message
+
+    def close(self):
+        """Stop accepting messages. Those already queued can still be read,
+        and then ``get`` returns ``None`` straight away.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def stats(self):
+        return {
+            'capacity': self.capacity,
+            'policy': self.policy,
+            'depth': len(self._messages),
+            'peak_depth': self.peak_depth,
+            'queued': self.queued,
+            'dropped': self.dropped,
+        }
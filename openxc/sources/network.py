@@ -3,6 +3,8 @@
 
 import logging
 import socket
+import threading
+import time
 
 from .base import DataSourceError
 from .socket import SocketDataSource
@@ -13,16 +15,36 @@ LOG = logging.getLogger(__name__)
 class NetworkDataSource(SocketDataSource):
     """A data source reading from a network socket, as implemented
     in the openxc-vehicle-simulator .
+
+    If ``reconnect`` is enabled, a lost connection (e.g. the simulator or a
+    TCP bridge restarting) is reopened with exponential backoff instead of
+    stopping the source. The payload format detected on the first connection
+    is kept, and any partial message received before the connection dropped
+    is discarded and counted in ``bytes_lost``. Reconnecting only happens
+    when the source runs its own thread, not when it's read by a
+    :class:`SourceReactor`.
     """
     DEFAULT_PORT = 50001
+    DEFAULT_RECONNECT_DELAY = 0.1
+    DEFAULT_MAX_RECONNECT_DELAY = 30.0
 
-    def __init__(self, host=None, port=None, **kwargs):
+    def __init__(self, host=None, port=None, reconnect=False,
+            reconnect_delay=None, max_reconnect_delay=None,
+            max_reconnect_attempts=None, **kwargs):
         """Initialize a connection to the network socket.
 
         Kwargs:
             host - optionally override the default network host (default is local machine)
             port - optionally override the default network port (default is 50001)
             log_mode - optionally record or print logs from the network source
+            reconnect - if ``True``, reconnect when the connection is lost
+                instead of stopping
+            reconnect_delay - seconds to wait before the first attempt to
+                reconnect, doubled after each failed attempt (default is 0.1)
+            max_reconnect_delay - the most seconds to wait between attempts to
+                reconnect (default is 30)
+            max_reconnect_attempts - give up and stop after this many failed
+                attempts in a row (default is to keep trying)
 
         Raises:
             DataSourceError if the socket connection cannot be opened.
@@ -31,12 +53,109 @@ class NetworkDataSource(SocketDataSource):
         self.host = host or socket.gethostbyname(socket.gethostname())
         self.port = port or self.DEFAULT_PORT
         self.port = int(self.port)
+        self.reconnect = reconnect
+        self.reconnect_delay = reconnect_delay or self.DEFAULT_RECONNECT_DELAY
+        self.max_reconnect_delay = (max_reconnect_delay or
+                self.DEFAULT_MAX_RECONNECT_DELAY)
+        self.max_reconnect_attempts = max_reconnect_attempts
+        self.reconnects = 0
+        self.failed_reconnects = 0
+        self.bytes_lost = 0
+        self.connected_time = 0.0
+        self._connected_at = None
+        self._stopped = threading.Event()
+
+        self._connect()
 
+    def _connect(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.connect((self.host, self.port))
+            sock.connect((self.host, self.port))
         except (OSError, socket.error) as e:
+            sock.close()
             raise DataSourceError("Unable to open socket connection at  "
                     "%s:%s: %s" % (self.host,self.port, e))
+        self.socket = sock
+        self._connected_at = time.monotonic()
+        LOG.debug("Opened socket connection at %s:%s", self.host, self.port)
+
+    def _disconnected(self):
+        """Close the lost connection and discard any partial message received
+        on it, which can't be completed by the next connection.
+        """
+        if self._connected_at is not None:
+            self.connected_time += time.monotonic() - self._connected_at
+            self._connected_at = None
+        try:
+            self.socket.close()
+        except (OSError, socket.error):
+            pass
+
+        sniffed = len(self._sniffer.buffer) if self._sniffer is not None else 0
+        self._finish_stream()
+        if self._streamer is None:
+            lost = sniffed
         else:
-            LOG.debug("Opened socket connection at %s:%s", self.host, self.port)
+            lost = len(self._streamer.message_buffer)
+            self._streamer.message_buffer.clear()
+        if lost > 0:
+            LOG.debug("Discarded %d bytes of a partial message", lost)
+            self.bytes_lost += lost
+
+    def _reconnect_delays(self):
+        """Yield the seconds to wait before each attempt to reconnect."""
+        delay = self.reconnect_delay
+        attempts = 0
+        while (self.max_reconnect_attempts is None or
+                attempts < self.max_reconnect_attempts):
+            yield delay
+            attempts += 1
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _recover(self, error):
+        if not self.reconnect:
+            return super(NetworkDataSource, self)._recover(error)
+
+        LOG.warn("Lost socket connection at %s:%s -- reconnecting: %s",
+                self.host, self.port, error)
+        self._disconnected()
+        for delay in self._reconnect_delays():
+            if self._stopped.wait(delay) or not self.running:
+                return False
+            try:
+                self._connect()
+            except DataSourceError as e:
+                self.failed_reconnects += 1
+                LOG.debug("Unable to reconnect, retrying: %s", e)
+                continue
+            self.reconnects += 1
+            return True
+
+        LOG.warn("Unable to reconnect to %s:%s -- stopping", self.host,
+                self.port)
+        return False
+
+    def stop(self):
+        super(NetworkDataSource, self).stop()
+        self._stopped.set()
+
+    @property
+    def uptime(self):
+        """Seconds since the current connection was opened, or 0 if it's been
+        lost.
+        """
+        if self._connected_at is None:
+            return 0.0
+        return time.monotonic() - self._connected_at
+
+    def stats(self):
+        stats = super(NetworkDataSource, self).stats()
+        stats['connection'] = {
+            'connected': self._connected_at is not None,
+            'uptime': self.uptime,
+            'total_uptime': self.connected_time + self.uptime,
+            'reconnects': self.reconnects,
+            'failed_reconnects': self.failed_reconnects,
+            'bytes_lost': self.bytes_lost,
+        }
+        return stats
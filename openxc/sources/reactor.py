@@ -0,0 +1,162 @@
+"""Read many data sources from a single thread, instead of a thread per
+source.
+"""
+import logging
+import selectors
+import socket
+import threading
+
+from .base import DataSourceError
+
+LOG = logging.getLogger(__name__)
+
+
+class SourceReactor(threading.Thread):
+    """Multiplexes reads from many file descriptor backed sources, e.g.
+    :class:`NetworkDataSource` and :class:`SerialDataSource`, in one thread
+    with ``selectors``.
+
+    Whenever a source's socket or serial port is readable, the reactor reads
+    from it and hands the bytes to the source's own streamer, which passes
+    each message to the source's callback on the reactor thread (or to its
+    dispatch queue, if it has one). Sources added to a reactor must not be
+    started themselves, so they don't get a reader thread or a log thread.
+
+    A source is removed once it can't be read from any more.
+    """
+    DEFAULT_SELECT_TIMEOUT = 1.0
+
+    def __init__(self, select_timeout=None):
+        """Kwargs:
+            select_timeout - the most seconds to wait for any source to be
+                ready before checking if the reactor has been stopped (default
+                is 1)
+        """
+        super(SourceReactor, self).__init__()
+        self.daemon = True
+        self.running = True
+        self.select_timeout = select_timeout or self.DEFAULT_SELECT_TIMEOUT
+        self.sources = set()
+        self.reads = 0
+        self.selects = 0
+        self._selector = selectors.DefaultSelector()
+        self._pending = []
+        self._lock = threading.Lock()
+        # written to wake the reactor up when sources are added or removed
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+        self._wakeup_reader.setblocking(False)
+        self._selector.register(self._wakeup_reader, selectors.EVENT_READ)
+
+    def add_source(self, source):
+        """Start reading from ``source``, which must have a ``fileno`` method.
+
+        Raises:
+            DataSourceError, if the source isn't backed by a file descriptor.
+        """
+        if not hasattr(source, 'fileno'):
+            raise DataSourceError("%s can't be read by a reactor, it has no "
+                    "file descriptor" % source)
+        self._change(self._register, source)
+
+    def remove_source(self, source):
+        """Stop reading from ``source``, which can then be closed."""
+        self._change(self._unregister, source)
+
+    def _change(self, operation, source):
+        with self._lock:
+            self._pending.append((operation, source))
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wakeup_writer.send(b"\x00")
+        except OSError:
+            # already stopped
+            pass
+
+    def _apply_changes(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for operation, source in pending:
+            operation(source)
+
+    def _register(self, source):
+        if source in self.sources:
+            return
+        self._selector.register(source.fileno(), selectors.EVENT_READ, source)
+        self.sources.add(source)
+        source._start_dispatcher()
+        LOG.debug("Added %s to reactor", source)
+
+    def _unregister(self, source):
+        if source not in self.sources:
+            return
+        self.sources.discard(source)
+        try:
+            self._selector.unregister(source.fileno())
+        except (KeyError, ValueError, OSError):
+            # the source may have closed its file descriptor already
+            for key in list(self._selector.get_map().values()):
+                if key.data is source:
+                    self._selector.unregister(key.fileobj)
+        source._finish_stream()
+        source._stop_dispatcher()
+        LOG.debug("Removed %s from reactor", source)
+
+    def stop(self):
+        self.running = False
+        self._wake()
+
+    def run(self):
+        """Wait for any of the sources to be readable, read from them and
+        parse the bytes, until stopped.
+        """
+        try:
+            while self.running:
+                self._apply_changes()
+                events = self._selector.select(self.select_timeout)
+                self.selects += 1
+                for key, _ in events:
+                    if key.data is None:
+                        self._drain_wakeups()
+                    else:
+                        self._read(key.data)
+        finally:
+            self._apply_changes()
+            for source in list(self.sources):
+                self._unregister(source)
+            self._selector.close()
+            self._wakeup_reader.close()
+            self._wakeup_writer.close()
+
+    def _drain_wakeups(self):
+        try:
+            while self._wakeup_reader.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    def _read(self, source):
+        if not source.running:
+            self._unregister(source)
+            return
+
+        try:
+            payload = source.read()
+        except DataSourceError as e:
+            LOG.warn("Can't read from %s -- removing it: %s", source, e)
+            self._unregister(source)
+            return
+        self.reads += 1
+        if len(payload) > 0:
+            source._receive_payload(payload)
+
+    def stats(self):
+        """Return the number of sources being read, and the number of selects
+        and reads done so far.
+        """
+        return {
+            'sources': len(self.sources),
+            'selects': self.selects,
+            'reads': self.reads,
+        }
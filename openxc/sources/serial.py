@@ -20,13 +20,28 @@ class SerialDataSource(BytestreamDataSource):
     """
     DEFAULT_PORT = "/dev/ttyUSB0"
     DEFAULT_BAUDRATE = 230400
+    DEFAULT_MAX_READ_SIZE = 4096
+    # At 230400 baud a byte takes ~43us, so a gap this long means the VI has
+    # finished sending a burst of messages.
+    DEFAULT_INTER_BYTE_TIMEOUT = 0.005
+    # The longest a single read waits, so a continuous stream is still handed
+    # to the streamer promptly and the read loop can notice it's been stopped.
+    DEFAULT_READ_TIMEOUT = 0.1
 
-    def __init__(self, port=None, baudrate=None, **kwargs):
+    def __init__(self, port=None, baudrate=None, max_read_size=None,
+            inter_byte_timeout=None, read_timeout=None, **kwargs):
         """Initialize a connection to the serial device.
 
         Kwargs:
             port - optionally override the default virtual COM port
             baudrate - optionally override the default baudrate
+            max_read_size - the most bytes to read from the port at once
+                (default is 4096)
+            inter_byte_timeout - when waiting for data, return what has been
+                received once the line is idle for this many seconds (default
+                is 0.005)
+            read_timeout - the most seconds to wait in a single read (default
+                is 0.1)
 
         Raises:
             DataSourceError if the serial device cannot be opened.
@@ -34,12 +49,19 @@ class SerialDataSource(BytestreamDataSource):
         super(SerialDataSource, self).__init__(**kwargs)
         port = port or self.DEFAULT_PORT
         baudrate = baudrate or self.DEFAULT_BAUDRATE
+        self.max_read_size = max_read_size or self.DEFAULT_MAX_READ_SIZE
+        if inter_byte_timeout is None:
+            inter_byte_timeout = self.DEFAULT_INTER_BYTE_TIMEOUT
+        if read_timeout is None:
+            read_timeout = self.DEFAULT_READ_TIMEOUT
 
         if serial is None:
             raise DataSourceError("pyserial library is not available")
 
         try:
-            self.device = serial.Serial(port, baudrate, rtscts=True)
+            self.device = serial.Serial(port, baudrate, rtscts=True,
+                    timeout=read_timeout,
+                    inter_byte_timeout=inter_byte_timeout)
         except (OSError, serial.SerialException) as e:
             raise DataSourceError("Unable to open serial device at port "
                     "%s: %s" % (port, e))
@@ -47,4 +69,20 @@ class SerialDataSource(BytestreamDataSource):
             LOG.debug("Opened serial device at %s", port)
 
     def read(self):
-        return self.device.read()
+        """Read everything that's available from the serial port, up to
+        ``max_read_size`` bytes.
+
+        If nothing has been received yet, wait for the next burst of data and
+        return it once the line goes idle, the read times out or
+        ``max_read_size`` bytes have arrived.
+        """
+        try:
+            waiting = self.device.in_waiting
+            if waiting > 0:
+                return self.device.read(min(waiting, self.max_read_size))
+            return self.device.read(self.max_read_size)
+        except (OSError, serial.SerialException) as e:
+            raise DataSourceError("Unable to read from serial device: %s" % e)
+
+    def fileno(self):
+        return self.device.fileno()
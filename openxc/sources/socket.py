@@ -1,5 +1,3 @@
-
-
 from .base import BytestreamDataSource, DataSourceError
 
 # TODO can we get rid of this?
@@ -7,19 +5,44 @@ import socket
 
 
 class SocketDataSource(BytestreamDataSource):
+    DEFAULT_RECEIVE_SIZE = 4096
+
+    def __init__(self, receive_size=None, **kwargs):
+        """Kwargs:
+            receive_size - the most bytes to read from the socket at once
+                (default is 4096)
+        """
+        super(SocketDataSource, self).__init__(**kwargs)
+        self.receive_size = receive_size or self.DEFAULT_RECEIVE_SIZE
+        self._receive_buffer = bytearray(self.receive_size)
+        self._receive_view = memoryview(self._receive_buffer)
+
     def read(self):
+        """Read whatever is available from the socket, up to ``receive_size``
+        bytes, into a preallocated buffer.
+
+        The returned ``memoryview`` is only valid until the next read - the
+        streamer copies it into its own buffer straight away.
+        """
         try:
-            line = ""
-            while '\x00' not in line:
-                # TODO this is fairly inefficient
-                line += self.socket.recv(1)
+            recv_into = getattr(self.socket, 'recv_into', None)
+            if recv_into is not None:
+                received = recv_into(self._receive_buffer)
+                data = self._receive_view[:received]
+            else:
+                # e.g. Bluetooth sockets, which only implement recv
+                data = self.socket.recv(self.receive_size)
         except (OSError, socket.error, IOError) as e:
             raise DataSourceError("Unable to read from socket connection at  "
                     "%s:%s: %s" % (self.host,self.port, e))
-        if not line:
+        if len(data) == 0:
             raise DataSourceError("Unable to read from socket connection at  "
                     "%s:%s" % (self.host,self.port))
-        return line
+        return data
+
+    def fileno(self):
+        return self.socket.fileno()
 
     def write_bytes(self, data):
-        return self.socket.send(data)
+        self.socket.sendall(data)
+        return len(data)
@@ -2,12 +2,19 @@
 
 
 
+import glob
+import heapq
 import logging
 import time
+from operator import itemgetter
 
 from .base import DataSourceError, BytestreamDataSource
+from .traceindex import TraceIndex
+from .tracefile import open_trace_file, read_records, record_payload, \
+        record_timestamp, trace_format, PROTOBUF_TRACE, TRACE_READ_ERRORS
 
-from openxc.formats.json import JsonFormatter
+from openxc.formats.binary import ProtobufFormatter
+from openxc.utils import Histogram
 
 LOG = logging.getLogger(__name__)
 
@@ -15,9 +22,16 @@ class TraceDataSource(BytestreamDataSource):
     """A class to replay a previously recorded OpenXC vehicle data trace file.
     For details on the trace file format, see
     http://openxcplatform.com/android/testing.html.
+
+    Binary trace files of length-delimited protobuf messages, as written by
+    :class:`FileRecorderSink` with the "protobuf" trace format, are detected
+    and replayed too.
     """
+    DEFAULT_SCHEDULING_SLOT = 0.002
 
-    def __init__(self, filename=None, realtime=True, loop=True, **kwargs):
+    def __init__(self, filename=None, realtime=True, loop=True, direct=False,
+            start_time=None, end_time=None, use_index=True, speed=1.0,
+            scheduling_slot=None, **kwargs):
         """Construct the source and attempt to open the trace file.
 
             filename - the full absolute path to the trace file
@@ -29,18 +43,84 @@ class TraceDataSource(BytestreamDataSource):
 
             loop - if ``True``, the trace file will be looped and will provide
             data until the process exist or the source is stopped.
+
+            direct - if ``True``, parse each record of the trace once and pass
+            the message straight to the callback, instead of feeding the
+            records through the byte stream parser like a live VI.
+
+            start_time, end_time - if given, only replay the records with a
+            timestamp in this window.
+
+            use_index - if ``True`` and a ``start_time`` is given, seek
+            straight to the window using a sidecar index of the trace file
+            (``<filename>.index``), building it first if necessary.
+
+            speed - when replaying in realtime, a multiple of the recorded rate
+            to replay at, e.g. 0.5 or 20.
+
+            scheduling_slot - when replaying in realtime, records due within
+            this many seconds of each other are released together instead of
+            sleeping between each one (default is 2ms).
         """
         super(TraceDataSource, self).__init__(**kwargs)
         self.realtime = realtime
+        if speed <= 0:
+            raise DataSourceError("Trace replay speed must be positive")
+        self.speed = speed
+        self.scheduling_slot = (scheduling_slot if scheduling_slot is not None
+                else self.DEFAULT_SCHEDULING_SLOT)
+        self.replay_drift = Histogram()
         self.loop = loop
+        self.direct = direct
         self.filename = filename
+        self.start_time = start_time
+        self.end_time = end_time
+        self.use_index = use_index
+        self._start_offset = None
+        self.trace_format = self._detect_trace_format()
+        self.format = self.trace_format
         self._reopen_file()
 
     def _reopen_file(self):
+        self._close_file()
+        self._records = self._open_records()
+        self.starting_time = time.perf_counter()
+
+    def _detect_trace_format(self):
+        return self._file_format(self.filename)
+
+    def _open_records(self):
+        """Open the trace file, seeking to the start of the time window if
+        possible, and return an iterator over its records.
+        """
+        self.trace_file = self._open_file(self.filename)
+        if self.start_time is not None and self.use_index:
+            if self._start_offset is None:
+                self._start_offset = self._index_offset(self.filename)
+            self.trace_file.seek(self._start_offset)
+        return self._file_records(self.trace_file, self.filename,
+                self.trace_format)
+
+    def _close_file(self):
         if getattr(self, 'trace_file', None) is not None:
             self.trace_file.close()
-        self.trace_file = self._open_file(self.filename)
-        self.starting_time = time.time()
+            self.trace_file = None
+
+    def _index_offset(self, filename):
+        return TraceIndex.for_trace(filename).offset_for(self.start_time)
+
+    @staticmethod
+    def _file_records(trace_file, filename, trace_format):
+        records = read_records(trace_file, trace_format)
+        while True:
+            try:
+                record = next(records)
+            except StopIteration:
+                return
+            except TRACE_READ_ERRORS as e:
+                raise DataSourceError("Unable to read trace file %s: %s" % (
+                    filename, e))
+            yield record
 
     def _store_timestamp(self, timestamp):
         """If not already saved, cache the first timestamp in the active trace
@@ -52,26 +132,119 @@ class TraceDataSource(BytestreamDataSource):
                     self.first_timestamp, self.filename)
 
     def read(self):
-        """Read a line of data from the input source at a time."""
-        line = self.trace_file.readline()
-        if line == '':
-            if self.loop:
+        """Read a record of data from the input source at a time."""
+        record, _ = self._read_record()
+        if self.trace_format == PROTOBUF_TRACE:
+            # already delimited by its length prefix
+            return record
+        return record + b"\x00"
+
+    def _read_messages(self):
+        """In direct mode, parse each record of the trace file and pass the
+        message to the callback. Otherwise, replay the trace through the
+        streamer one record at a time like any other byte stream.
+        """
+        if not self.direct:
+            return super(TraceDataSource, self)._read_messages()
+
+        streamer = self.streamer
+        while self.running:
+            try:
+                record, message = self._read_record()
+            except DataSourceError as e:
+                if self.running and e.args:
+                    LOG.warn("Can't read from data source -- stopping: %s", e)
+                break
+
+            streamer.bytes_received += len(record)
+            if message is None or not self._message_valid(message):
+                self.corrupted_messages += 1
+                continue
+            self._dispatch(message)
+
+    def _read_record(self):
+        """Read the next record of the trace file, waiting until it's due if
+        replaying in realtime.
+
+        Returns a tuple of the record and, in direct mode, the message parsed
+        from it, or ``None`` if the record isn't a valid message.
+
+        Raises:
+            DataSourceError, once the end of the trace file is reached and it
+            isn't being looped, or if the file can't be read (e.g. a corrupt
+            compressed trace).
+        """
+        try:
+            record = self._next_record()
+            if record is None and self.loop:
                 self._reopen_file()
-            else:
-                self.trace_file.close()
-                self.trace_file = None
-                raise DataSourceError()
+                record = self._next_record()
+        except DataSourceError:
+            self._close_file()
+            raise
+        if record is None:
+            self._close_file()
+            raise DataSourceError()
+
+        message = None
+        if self.direct:
+            started = self.streamer._parse_started()
+            message = self._deserialize_record(record)
+            self.streamer._record_parse(message, started)
+            timestamp = (message.get('timestamp', None)
+                    if isinstance(message, dict) else None)
+        else:
+            timestamp = record_timestamp(record, self.trace_format)
 
-        message = JsonFormatter.deserialize(line)
-        timestamp = message.get('timestamp', None)
         if self.realtime and timestamp is not None:
             self._store_timestamp(timestamp)
-            self._wait(self.starting_time, self.first_timestamp, timestamp)
-        return (line + "\x00").encode("cp437")
+            self._wait_until_due(timestamp)
+        return record, message
+
+    def _deserialize_record(self, record):
+        if self.trace_format == PROTOBUF_TRACE:
+            return ProtobufFormatter.deserialize(
+                    record_payload(record, self.trace_format),
+                    lazy=self.lazy_messages,
+                    binary_can_data=self.binary_can_data)
+        return self.streamer._deserialize(record)
+
+    def _next_record(self):
+        """Return the next record of the trace file in the time window, or
+        ``None`` at the end of the window or the file.
+        """
+        for record in self._records:
+            if self.start_time is None and self.end_time is None:
+                return record
+
+            timestamp = record_timestamp(record, self.trace_format)
+            if timestamp is None or (self.start_time is not None and
+                    timestamp < self.start_time):
+                continue
+            if self.end_time is not None and timestamp > self.end_time:
+                return None
+            return record
+        return None
+
+    @staticmethod
+    def _file_format(filename):
+        """Return the format of the trace file at ``filename``.
+
+        Raises:
+            DataSourceError, if the file cannot be opened.
+        """
+        if filename is None:
+            raise DataSourceError("Trace filename is not defined")
+
+        try:
+            return trace_format(filename)
+        except TRACE_READ_ERRORS as e:
+            raise DataSourceError("Unable to open trace file %s" % filename, e)
 
     @staticmethod
     def _open_file(filename):
-        """Attempt to open the the file at ``filename`` for reading.
+        """Attempt to open the the file at ``filename`` for reading,
+        decompressing it on the fly if it's a gzip, bz2 or xz archive.
 
         Raises:
             DataSourceError, if the file cannot be opened.
@@ -80,18 +253,113 @@ class TraceDataSource(BytestreamDataSource):
             raise DataSourceError("Trace filename is not defined")
 
         try:
-            trace_file = open(filename, "r")
+            trace_file = open_trace_file(filename)
         except IOError as e:
             raise DataSourceError("Unable to open trace file %s" % filename, e)
         else:
             LOG.debug("Opened trace file %s", filename)
             return trace_file
 
-    @staticmethod
-    def _wait(starting_time, first_timestamp, timestamp):
+    def _wait_until_due(self, timestamp):
         """Given that the first timestamp in the trace file is
         ``first_timestamp`` and we started playing back the file at
-        ``starting_time``, block until the current ``timestamp`` should occur.
+        ``starting_time``, block until the current ``timestamp`` should occur
+        at the replay speed.
+
+        Records due within ``scheduling_slot`` of now are released without
+        sleeping, and how late each record is released is recorded in
+        ``replay_drift``.
+        """
+        target_time = self.starting_time + (
+                (timestamp - self.first_timestamp) / self.speed)
+        now = time.perf_counter()
+        if target_time - now > self.scheduling_slot:
+            time.sleep(target_time - now)
+            now = time.perf_counter()
+        self.replay_drift.record(max(now - target_time, 0))
+
+    def stats(self):
+        stats = super(TraceDataSource, self).stats()
+        if self.realtime:
+            stats['replay_speed'] = self.speed
+            stats['replay_drift'] = self.replay_drift.as_dict()
+        return stats
+
+
+class MultiTraceDataSource(TraceDataSource):
+    """Replay a set of trace files as one stream, in timestamp order.
+
+    Each file must already be in time order. The files are merged on the fly
+    with a k-way merge that holds one lookahead record per file, so memory use
+    doesn't depend on how long the traces are.
+    """
+
+    def __init__(self, filenames=None, **kwargs):
+        """Construct the source and attempt to open every trace file.
+
+            filenames - a list of trace file paths, or a glob pattern matching
+            them (e.g. "traces/2013-03-26-*.json.gz")
+
+        All other arguments are the same as :class:`TraceDataSource`.
+
+        Raises:
+            DataSourceError, if no trace files are given or any cannot be
+            opened.
+        """
+        if isinstance(filenames, str):
+            filenames = sorted(glob.glob(filenames))
+        if not filenames:
+            raise DataSourceError("No trace files to replay")
+        self.filenames = list(filenames)
+        self.trace_files = []
+        self._start_offsets = {}
+        super(MultiTraceDataSource, self).__init__(
+                filename=", ".join(self.filenames), **kwargs)
+
+    def _detect_trace_format(self):
+        formats = set(self._file_format(filename)
+                for filename in self.filenames)
+        if len(formats) > 1:
+            raise DataSourceError("Can't merge JSON and protobuf trace files")
+        return formats.pop()
+
+    def _open_records(self):
+        iterators = []
+        for filename in self.filenames:
+            trace_file = self._open_file(filename)
+            self.trace_files.append(trace_file)
+            if self.start_time is not None and self.use_index:
+                if filename not in self._start_offsets:
+                    self._start_offsets[filename] = self._index_offset(
+                            filename)
+                trace_file.seek(self._start_offsets[filename])
+            iterators.append(self._timestamped_records(
+                    self._file_records(trace_file, filename,
+                        self.trace_format), filename, self.trace_format))
+        return (record for _, record in heapq.merge(*iterators,
+                key=itemgetter(0)))
+
+    def _close_file(self):
+        for trace_file in getattr(self, 'trace_files', []):
+            trace_file.close()
+        self.trace_files = []
+
+    @staticmethod
+    def _timestamped_records(records, filename, trace_format):
+        """Pair each record with its timestamp for merging. A record without
+        one stays with the record before it.
+
+        The merge can't reorder records within a file, so a warning is logged
+        the first time a file goes back in time.
         """
-        target_time = starting_time + (timestamp - first_timestamp)
-        time.sleep(max(target_time - time.time(), 0))
+        timestamp = float("-inf")
+        warned = False
+        for record in records:
+            record_time = record_timestamp(record, trace_format)
+            if record_time is not None:
+                if record_time < timestamp and not warned:
+                    LOG.warn("Trace file %s is not in time order, merged "
+                            "records will be out of order", filename)
+                    warned = True
+                timestamp = record_time
+            yield timestamp, record
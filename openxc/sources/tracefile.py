@@ -0,0 +1,302 @@
+"""Open and read OpenXC trace files, transparently decompressing gzip, bz2
+and xz archives.
+
+A trace file is either JSON lines, one message per line, or binary: a series
+of varint length-delimited protobuf ``VehicleMessage``s, exactly as a VI sends
+them with the protobuf payload format, with the time each one was received in
+its ``timestamp`` field.
+"""
+import bz2
+import gzip
+import logging
+import lzma
+import queue
+import re
+import threading
+import zlib
+
+from openxc.formats.sniff import sniff_payload_format
+
+LOG = logging.getLogger(__name__)
+
+JSON_TRACE = "json"
+PROTOBUF_TRACE = "protobuf"
+
+# Read this much of a trace file to detect its format
+TRACE_FORMAT_SNIFF_SIZE = 1024
+
+JSON_TIMESTAMP_PATTERN = re.compile(
+        br'"timestamp"\s*:\s*(-?[0-9.]+(?:[eE][-+]?\d+)?)')
+# The key of the VehicleMessage.timestamp field, field 7 as a varint
+PROTOBUF_TIMESTAMP_KEY = (7 << 3) | 0
+
+# Compression formats by the magic bytes at the start of the file and by file
+# extension, with the function to open each one in binary mode
+COMPRESSION_MAGIC = [
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bz2"),
+    (b"\xfd7zXZ\x00", "xz"),
+]
+COMPRESSION_EXTENSIONS = {
+    ".gz": "gzip",
+    ".bz2": "bz2",
+    ".xz": "xz",
+}
+# What reading a trace file can raise, including decompressing a corrupt or
+# truncated archive
+TRACE_READ_ERRORS = (IOError, EOFError, lzma.LZMAError, zlib.error)
+
+COMPRESSION_OPENERS = {
+    "gzip": gzip.open,
+    "bz2": bz2.open,
+    "xz": lzma.open,
+}
+
+
+def compression_format(filename):
+    """Return the compression format of the file ("gzip", "bz2" or "xz"), or
+    ``None`` if it's not compressed.
+
+    The magic bytes at the start of the file are checked first, falling back to
+    the file extension.
+    """
+    with open(filename, "rb") as trace_file:
+        header = trace_file.read(6)
+    for magic, name in COMPRESSION_MAGIC:
+        if header.startswith(magic):
+            return name
+    for extension, name in COMPRESSION_EXTENSIONS.items():
+        if filename.endswith(extension):
+            return name
+
+
+def open_trace_file(filename, read_ahead=True):
+    """Open a trace file for reading in binary mode, decompressing it on the
+    fly if it's compressed.
+
+    Kwargs:
+        read_ahead - if ``True``, compressed files are decompressed ahead of
+            the reader in a background thread (see :class:`ReadAheadFile`).
+
+    Raises:
+        IOError, if the file cannot be opened.
+    """
+    compression = compression_format(filename)
+    if compression is None:
+        return open(filename, "rb")
+
+    LOG.debug("Decompressing %s trace file %s", compression, filename)
+    trace_file = COMPRESSION_OPENERS[compression](filename, "rb")
+    if read_ahead:
+        trace_file = ReadAheadFile(trace_file)
+    return trace_file
+
+
+def trace_format(filename):
+    """Return the format of the trace file, ``JSON_TRACE`` or
+    ``PROTOBUF_TRACE``, from its first few records.
+    """
+    with open_trace_file(filename, read_ahead=False) as trace_file:
+        head = trace_file.read(TRACE_FORMAT_SNIFF_SIZE)
+    if sniff_payload_format(head, final=True) == "protobuf":
+        return PROTOBUF_TRACE
+    return JSON_TRACE
+
+
+def read_records(trace_file, trace_format=JSON_TRACE):
+    """Yield each record of an open trace file: a line of a JSON trace, or a
+    length-delimited message (including its length prefix) of a protobuf
+    trace.
+
+    A partial record at the end of a protobuf trace is ignored.
+    """
+    if trace_format == PROTOBUF_TRACE:
+        return _protobuf_records(trace_file)
+    return iter(trace_file.readline, b"")
+
+
+def _protobuf_records(trace_file):
+    while True:
+        prefix = trace_file.read(1)
+        while prefix[-1:] and prefix[-1] & 0x80:
+            byte = trace_file.read(1)
+            if not byte:
+                return
+            prefix += byte
+        if not prefix:
+            return
+
+        length, _ = _decode_varint(prefix, 0)
+        message = trace_file.read(length)
+        if len(message) < length:
+            LOG.warn("Ignoring partial message at the end of trace file")
+            return
+        yield prefix + message
+
+
+def record_payload(record, trace_format=JSON_TRACE):
+    """Return the serialized message in a trace file record, i.e. a protobuf
+    record without its length prefix.
+    """
+    if trace_format == PROTOBUF_TRACE:
+        _, position = _decode_varint(record, 0)
+        return record[position:]
+    return record
+
+
+def _decode_varint(data, position):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        result |= (byte & 0x7f) << shift
+        position += 1
+        if not byte & 0x80:
+            return result, position
+        shift += 7
+
+
+def record_timestamp(record, trace_format=JSON_TRACE):
+    """Return the timestamp of a trace file record in seconds without parsing
+    the whole message, or ``None`` if it doesn't have one.
+    """
+    if trace_format == PROTOBUF_TRACE:
+        return _protobuf_record_timestamp(record)
+    match = JSON_TIMESTAMP_PATTERN.search(record)
+    if match is not None:
+        return float(match.group(1))
+
+
+def _protobuf_record_timestamp(record):
+    # Walk the top level fields of the message, skipping over nested ones
+    try:
+        length, position = _decode_varint(record, 0)
+        end = position + length
+        while position < end:
+            key, position = _decode_varint(record, position)
+            wire_type = key & 0x7
+            if wire_type == 0:
+                value, position = _decode_varint(record, position)
+                if key == PROTOBUF_TIMESTAMP_KEY:
+                    return value / 1000.0
+            elif wire_type == 2:
+                length, position = _decode_varint(record, position)
+                position += length
+            elif wire_type == 1:
+                position += 8
+            elif wire_type == 5:
+                position += 4
+            else:
+                return None
+    except IndexError:
+        return None
+
+
+class ReadAheadFile(object):
+    """Wraps a binary file, reading it in chunks from a background thread so
+    that decompression overlaps with whatever the caller does with each line.
+
+    Only reading is supported, and the file can only be seeked before the
+    first read.
+    """
+    CHUNK_SIZE = 256 * 1024
+    MAX_PENDING_CHUNKS = 8
+
+    def __init__(self, source):
+        self.source = source
+        self._chunks = queue.Queue(self.MAX_PENDING_CHUNKS)
+        self._buffer = b""
+        self._position = 0
+        self._thread = None
+        self._eof = False
+        self._error = None
+        self._closed = threading.Event()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.readline()
+        if line == b"":
+            raise StopIteration
+        return line
+
+    def seek(self, offset):
+        if self._thread is not None:
+            raise IOError("Can't seek a ReadAheadFile after reading from it")
+        return self.source.seek(offset)
+
+    def readline(self):
+        """Return the next line of the file including the newline, or an
+        empty bytes object at the end of the file.
+        """
+        while True:
+            end = self._buffer.find(b"\n", self._position)
+            if end != -1:
+                line = self._buffer[self._position:end + 1]
+                self._position = end + 1
+                return line
+            if self._eof:
+                line = self._buffer[self._position:]
+                self._buffer = b""
+                self._position = 0
+                return line
+            self._next_chunk()
+
+    def read(self, size):
+        """Return up to ``size`` bytes, fewer only at the end of the file."""
+        while len(self._buffer) - self._position < size and not self._eof:
+            self._next_chunk()
+        data = self._buffer[self._position:self._position + size]
+        self._position += len(data)
+        return data
+
+    def _next_chunk(self):
+        # the read-ahead thread has exited after an error, so raise it again
+        # instead of waiting for a chunk that will never come
+        if self._error is not None:
+            raise self._error
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._read_ahead)
+            self._thread.daemon = True
+            self._thread.start()
+
+        chunk = self._chunks.get()
+        if isinstance(chunk, Exception):
+            self._error = chunk
+            raise chunk
+        if chunk == b"":
+            self._eof = True
+        self._buffer = self._buffer[self._position:] + chunk
+        self._position = 0
+
+    def _read_ahead(self):
+        try:
+            while not self._closed.is_set():
+                chunk = self.source.read(self.CHUNK_SIZE)
+                self._put(chunk)
+                if chunk == b"":
+                    break
+        except Exception as e:
+            self._put(e)
+
+    def _put(self, chunk):
+        while not self._closed.is_set():
+            try:
+                self._chunks.put(chunk, timeout=0.1)
+            except queue.Full:
+                continue
+            else:
+                return
+
+    def close(self):
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.source.close()
@@ -0,0 +1,136 @@
+"""A sidecar index of timestamps to byte offsets in OpenXC trace files, so a
+window of a long trace can be replayed without reading it from the start.
+"""
+import bisect
+import json
+import logging
+import os
+
+from .tracefile import open_trace_file, read_records, record_timestamp, \
+        trace_format
+
+LOG = logging.getLogger(__name__)
+
+
+class TraceIndex(object):
+    """Maps timestamps in a trace file to the byte offsets to start reading
+    from to find them.
+
+    Offsets in compressed trace files are into the decompressed data. Seeking
+    to one still decompresses everything before it, so an index saves parsing
+    the records before the window but not decompressing them.
+
+    The file is split into blocks of ``RECORDS_PER_ENTRY`` records, and each
+    entry has the offset of a block and the latest timestamp seen up to the
+    end of that block. Seeking to a timestamp starts at the first block that
+    could contain it, so the rest is a short scan even if the trace isn't
+    strictly in order.
+    """
+    RECORDS_PER_ENTRY = 1000
+    VERSION = 2
+
+    def __init__(self, offsets, timestamps, size=None, mtime=None, end=None):
+        """Kwargs:
+            size - the size of the trace file when it was indexed, to tell
+                if the index is out of date
+            mtime - the modification time of the trace file when it was
+                indexed, to tell if the index is out of date
+            end - the offset of the end of the records, which for a
+                compressed trace is the decompressed length, not ``size``
+        """
+        self.offsets = offsets
+        self.timestamps = timestamps
+        self.size = size
+        self.mtime = mtime
+        self.end = end if end is not None else size
+
+    @staticmethod
+    def index_filename(trace_filename):
+        return "%s.index" % trace_filename
+
+    @classmethod
+    def build(cls, trace_filename, records_per_entry=None):
+        """Read through the trace file once and return a new index for it."""
+        records_per_entry = records_per_entry or cls.RECORDS_PER_ENTRY
+        blocks = []
+        block_offset = 0
+        latest = None
+        records = 0
+        offset = 0
+        stat = os.stat(trace_filename)
+        record_format = trace_format(trace_filename)
+        with open_trace_file(trace_filename) as trace_file:
+            for record in read_records(trace_file, record_format):
+                if records > 0 and records % records_per_entry == 0:
+                    blocks.append((block_offset, latest))
+                    block_offset = offset
+                timestamp = record_timestamp(record, record_format)
+                if timestamp is not None and (latest is None or
+                        timestamp > latest):
+                    latest = timestamp
+                records += 1
+                offset += len(record)
+        if records > 0:
+            blocks.append((block_offset, latest))
+
+        # blocks before the first timestamp can't contain any time window
+        blocks = [block for block in blocks if block[1] is not None]
+        offsets = [block[0] for block in blocks]
+        timestamps = [block[1] for block in blocks]
+        LOG.debug("Indexed %d records of %s into %d blocks", records,
+                trace_filename, len(blocks))
+        return cls(offsets, timestamps, stat.st_size, stat.st_mtime, offset)
+
+    @classmethod
+    def load(cls, trace_filename):
+        """Load the sidecar index of the trace file, or return ``None`` if it
+        doesn't exist or is out of date.
+        """
+        try:
+            with open(cls.index_filename(trace_filename)) as index_file:
+                data = json.load(index_file)
+            stat = os.stat(trace_filename)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if (data.get('version') != cls.VERSION or
+                data.get('size') != stat.st_size or
+                data.get('mtime') != stat.st_mtime):
+            LOG.debug("Index of %s is out of date", trace_filename)
+            return None
+        return cls(data['offsets'], data['timestamps'], data['size'],
+                data['mtime'], data['end'])
+
+    @classmethod
+    def for_trace(cls, trace_filename):
+        """Return the index of a trace file, building and saving it if there
+        isn't an up to date one already.
+        """
+        index = cls.load(trace_filename)
+        if index is None:
+            index = cls.build(trace_filename)
+            index.save(trace_filename)
+        return index
+
+    def save(self, trace_filename):
+        """Write the index alongside the trace file. Failing to write it isn't
+        an error, it'll just be rebuilt next time.
+        """
+        try:
+            with open(self.index_filename(trace_filename), "w") as index_file:
+                json.dump({'version': self.VERSION, 'size': self.size,
+                        'mtime': self.mtime, 'end': self.end,
+                        'offsets': self.offsets,
+                        'timestamps': self.timestamps}, index_file)
+        except (IOError, OSError) as e:
+            LOG.debug("Unable to save trace index for %s: %s", trace_filename,
+                    e)
+
+    def offset_for(self, timestamp):
+        """Return the byte offset to start reading from to find the first
+        record at or after ``timestamp``.
+        """
+        block = bisect.bisect_left(self.timestamps, timestamp)
+        if block >= len(self.offsets):
+            return self.end
+        return self.offsets[block]
@@ -11,6 +11,73 @@ from .base import BytestreamDataSource, DataSourceError
 LOG = logging.getLogger(__name__)
 
 
+class AdaptiveReadPolicy(object):
+    """Choose the size and timeout of each USB read request from how full the
+    previous reads came back.
+
+    A read that fills the whole request means data is arriving faster than
+    we're asking for it, so the next request is doubled. Partial and empty
+    reads halve it again. While data is flowing the timeout is held at the
+    target latency, so a request is never held back longer than that waiting
+    to fill. When reads start timing out with nothing to return, the timeout
+    is doubled up to ``max_timeout`` so an idle VI doesn't keep us busy.
+    """
+    DEFAULT_READ_SIZE = 512
+    MIN_READ_SIZE = 64
+    MAX_READ_SIZE = 16384
+    DEFAULT_TARGET_LATENCY = 50
+    MAX_TIMEOUT = 200
+
+    def __init__(self, read_size=None, target_latency=None, min_read_size=None,
+            max_read_size=None, max_timeout=None):
+        """Kwargs:
+            read_size - the size of the first read request in bytes
+            target_latency - the timeout in milliseconds while data is
+                arriving
+            min_read_size, max_read_size - the range of read request sizes
+            max_timeout - the longest timeout in milliseconds when idle
+        """
+        self.read_size = read_size or self.DEFAULT_READ_SIZE
+        self.target_latency = target_latency or self.DEFAULT_TARGET_LATENCY
+        self.min_read_size = min_read_size or self.MIN_READ_SIZE
+        self.max_read_size = max_read_size or self.MAX_READ_SIZE
+        self.max_timeout = max_timeout or self.MAX_TIMEOUT
+        self.timeout = self.target_latency
+        self.full_reads = 0
+        self.partial_reads = 0
+        self.empty_reads = 0
+        self.peak_read_size = self.read_size
+
+    def record(self, requested, received):
+        """Adjust the read size and timeout after a read of ``requested``
+        bytes that returned ``received`` bytes.
+        """
+        if received >= requested:
+            self.full_reads += 1
+            self.read_size = min(self.read_size * 2, self.max_read_size)
+            self.peak_read_size = max(self.peak_read_size, self.read_size)
+            self.timeout = self.target_latency
+        elif received > 0:
+            self.partial_reads += 1
+            if received <= requested // 2:
+                self.read_size = max(self.read_size // 2, self.min_read_size)
+            self.timeout = self.target_latency
+        else:
+            self.empty_reads += 1
+            self.read_size = max(self.read_size // 2, self.min_read_size)
+            self.timeout = min(self.timeout * 2, self.max_timeout)
+
+    def stats(self):
+        return {
+            'read_size': self.read_size,
+            'peak_read_size': self.peak_read_size,
+            'read_timeout': self.timeout,
+            'full_reads': self.full_reads,
+            'partial_reads': self.partial_reads,
+            'empty_reads': self.empty_reads,
+        }
+
+
 class UsbDataSource(BytestreamDataSource):
     """A source to receive data from an OpenXC vehicle interface via USB."""
     DEFAULT_VENDOR_ID = 0x1bc4
@@ -21,7 +88,9 @@ class UsbDataSource(BytestreamDataSource):
     # milliseconds, bail early and return whatever we have - could be zero,
     # could be just less than 512. If data is really pumpin' we can get better
     # throughput if the READ_REQUEST_SIZE is higher, but this delay has to be
-    # low enough that a single request isn't held back too long.
+    # low enough that a single request isn't held back too long. Vehicle data
+    # reads make that tradeoff on the fly with an AdaptiveReadPolicy, this is
+    # just the timeout for reading logs.
     DEFAULT_READ_TIMEOUT = 200
     LIBUSB0_TIMEOUT_CODE = -116
     LIBUSB1_TIMEOUT_CODE = -7
@@ -31,7 +100,8 @@ class UsbDataSource(BytestreamDataSource):
     VEHICLE_DATA_IN_ENDPOINT = 2
     LOG_IN_ENDPOINT = 11
 
-    def __init__(self, vendor_id=None, product_id=None, **kwargs):
+    def __init__(self, vendor_id=None, product_id=None, read_policy=None,
+            **kwargs):
         """Initialize a connection to the USB device's IN endpoint.
 
         Kwargs:
@@ -46,11 +116,17 @@ class UsbDataSource(BytestreamDataSource):
             log_mode - optionally record or print logs from the USB device, which
                 are on a separate channel.
 
+            read_policy - an ``AdaptiveReadPolicy`` that sizes and times out
+                each read of vehicle data (default is one starting with
+                ``DEFAULT_READ_REQUEST_SIZE``)
+
         Raises:
             DataSourceError if the USB device with the given vendor ID is not
             connected.
         """
         super(UsbDataSource, self).__init__(**kwargs)
+        self.read_policy = read_policy or AdaptiveReadPolicy(
+                self.DEFAULT_READ_REQUEST_SIZE)
         if vendor_id is not None and not isinstance(vendor_id, int):
             vendor_id = int(vendor_id, 0)
         self.vendor_id = vendor_id or self.DEFAULT_VENDOR_ID
@@ -79,11 +155,20 @@ class UsbDataSource(BytestreamDataSource):
         raise DataSourceError("No USB vehicle interface detected - is one plugged in?")
 
     def read(self, timeout=None):
-        return self._read(self.VEHICLE_DATA_IN_ENDPOINT, timeout)
+        read_size = self.read_policy.read_size
+        data = self._read(self.VEHICLE_DATA_IN_ENDPOINT,
+                timeout or self.read_policy.timeout, read_size)
+        self.read_policy.record(read_size, len(data))
+        return data
 
     def read_logs(self, timeout=None):
         return self._read(self.LOG_IN_ENDPOINT, timeout, 64)
 
+    def stats(self):
+        stats = super(UsbDataSource, self).stats()
+        stats['usb_reads'] = self.read_policy.stats()
+        return stats
+
     def stop(self):
         super(UsbDataSource, self).stop()
         usb.util.dispose_resources(self.device)
@@ -98,5 +183,5 @@ class UsbDataSource(BytestreamDataSource):
         except (usb.core.USBError, AttributeError) as e:
             if e.backend_error_code in [self.LIBUSB0_TIMEOUT_CODE, self.LIBUSB1_TIMEOUT_CODE, self.OPENUSB_TIMEOUT_CODE]:
                 # Timeout, it may just not be sending
-                return ""
+                return b""
             raise DataSourceError("USB device couldn't be read", e)
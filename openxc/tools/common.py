@@ -4,6 +4,8 @@ command line utilities.
 import argparse
 import logging
 
+from openxc.formats.json import JsonFormatter, JSON_CODECS
+from openxc.sources.dispatch import DISPATCH_POLICIES
 from openxc.sources.trace import TraceDataSource
 from openxc.interface import SerialVehicleInterface, UsbVehicleInterface, \
          BluetoothVehicleInterface
@@ -26,6 +28,22 @@ def device_options():
             help="use a network-connected VI as the data source")
     device_group.add_argument("--trace", action="store", dest="trace_file",
             help="use a pre-recorded OpenXC JSON trace file as the data source")
+    parser.add_argument("--trace-start",
+            action="store",
+            type=float,
+            dest="trace_start",
+            help="only replay trace records at or after this Unix timestamp")
+    parser.add_argument("--trace-end",
+            action="store",
+            type=float,
+            dest="trace_end",
+            help="only replay trace records at or before this Unix timestamp")
+    parser.add_argument("--trace-speed",
+            action="store",
+            type=float,
+            default=1.0,
+            dest="trace_speed",
+            help="replay the trace at this multiple of the recorded rate")
     parser.add_argument("--usb-vendor",
             action="store",
             dest="usb_vendor",
@@ -56,9 +74,36 @@ def device_options():
             help="record logs to a file or stderr, if available from the interface")
     parser.add_argument("--format",
             action="store",
-            choices=["json", "protobuf"],
+            choices=["json", "protobuf", "messagepack"],
             dest="format",
             help="select the data format for sending and receiving with the VI")
+    parser.add_argument("--json-codec",
+            action="store",
+            default="auto",
+            choices=["auto"] + list(JSON_CODECS),
+            dest="json_codec",
+            help="select the installed JSON library used to encode and decode "
+                    "JSON messages (default is the fastest available)")
+    parser.add_argument("--binary-can-data",
+            action="store_true",
+            default=False,
+            dest="binary_can_data",
+            help="keep the data of received CAN messages as bytes, only "
+                    "formatting it as hex for output")
+    parser.add_argument("--dispatch-queue-size",
+            action="store",
+            type=int,
+            dest="dispatch_queue_size",
+            help="handle received messages on a separate thread, with up to "
+                    "this many queued, so slow output doesn't hold up reading "
+                    "from the VI")
+    parser.add_argument("--dispatch-policy",
+            action="store",
+            default="block",
+            choices=list(DISPATCH_POLICIES),
+            dest="dispatch_policy",
+            help="what to do with new messages when the dispatch queue is "
+                    "full (default is to block)")
     return parser
 
 
@@ -73,7 +118,10 @@ def select_device(arguments):
                 baudrate=arguments.baudrate)
     elif arguments.trace_file:
         source_class = TraceDataSource
-        source_kwargs = dict(filename=arguments.trace_file)
+        source_kwargs = dict(filename=arguments.trace_file,
+                start_time=arguments.trace_start,
+                end_time=arguments.trace_end,
+                speed=arguments.trace_speed)
     elif arguments.use_bluetooth:
         source_class = BluetoothVehicleInterface
         source_kwargs = dict(address=arguments.bluetooth_address)
@@ -82,6 +130,13 @@ def select_device(arguments):
         source_kwargs = dict(vendor_id=arguments.usb_vendor,
                 product_id=arguments.usb_product)
 
+    JsonFormatter.set_codec(arguments.json_codec)
+
     source_kwargs['log_mode'] = arguments.log_mode
     source_kwargs['payload_format'] = arguments.format
+    if arguments.binary_can_data:
+        source_kwargs['binary_can_data'] = True
+    if arguments.dispatch_queue_size is not None:
+        source_kwargs['dispatch_queue_size'] = arguments.dispatch_queue_size
+        source_kwargs['dispatch_policy'] = arguments.dispatch_policy
     return source_class, source_kwargs
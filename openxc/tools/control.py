@@ -12,8 +12,13 @@ import sys
 import time
 
 from openxc.formats.json import JsonFormatter
+from openxc.sources.tracefile import open_trace_file
 from .common import device_options, configure_logging, select_device
 
+# When replaying a file falls behind the original timing, at most this many
+# overdue messages are batched together into one call to ``write_many``.
+MAX_PENDING_WRITES = 100
+
 
 def version(interface):
     print(("Device is running version %s" % interface.version()))
@@ -60,32 +65,41 @@ def modem_configuration(interface, host, port):
 
 def write_file(interface, filename):
     first_timestamp = None
-    with open(filename, "r") as output_file:
+    with open_trace_file(filename) as output_file:
         corrupt_entries = 0
         message_count = 0
+        pending_messages = []
         start_time = time.time()
         for line in output_file:
             try:
-                parsed_message = JsonFormatter.deserialize(line.encode("utf-8"))
+                parsed_message = JsonFormatter.deserialize(line)
                 if not isinstance(parsed_message, dict):
                     raise ValueError()
             except ValueError:
                 corrupt_entries += 1
             else:
-                # TODO at the moment it's taking longer to write all of
-                # individual CAN messages than the time that actually
-                # elapsed in receiving the trace - need to implement
-                # batching to speed this up. right now this will never sleep
-                # because it's always behind.
                 timestamp = parsed_message.get('timestamp', None)
                 # TODO this duplicates some code from sources/trace.py
                 if timestamp is not None:
                     first_timestamp = first_timestamp or timestamp
                     target_time = start_time + (timestamp - first_timestamp)
-                    time.sleep(max(.0002, target_time - time.time()))
-
-                message_count += 1
-                interface.write(**parsed_message)
+                    delay = target_time - time.time()
+                    if delay > 0:
+                        # send everything that's already due in as few
+                        # transfers as possible before waiting for this one
+                        interface.write_many(pending_messages)
+                        message_count += len(pending_messages)
+                        pending_messages = []
+                        time.sleep(delay)
+
+                pending_messages.append(parsed_message)
+                if len(pending_messages) >= MAX_PENDING_WRITES:
+                    interface.write_many(pending_messages)
+                    message_count += len(pending_messages)
+                    pending_messages = []
+
+        interface.write_many(pending_messages)
+        message_count += len(pending_messages)
         print(("%d lines sent" % message_count))
         if corrupt_entries > 0:
             print(("%d invalid lines in the data file were not sent" %
@@ -127,7 +141,8 @@ def parse_options():
     parser.add_argument("--no-af-bypass", action="store_false", default=None,
             dest="af_bypass")
     parser.add_argument("--new-payload-format", action="store", default=None,
-            choices=['json', 'protobuf'], dest="new_payload_format")
+            choices=['json', 'protobuf', 'messagepack'],
+            dest="new_payload_format")
     parser.add_argument("--time", action="store",default=None,
             dest="unix_time")
     parser.add_argument("--host", action="store", default=None,
@@ -26,9 +26,9 @@ class GPXTranscoder(object):
         return ET.tostring(ET.ElementTree(self.root).getroot())
 
     def receive(self, message, **kwargs):
-        if message['name'] == 'latitude':
+        if message.get('name') == 'latitude':
             self.latitude = message['value']
-        elif message['name'] == 'longitude':
+        elif message.get('name') == 'longitude':
             self.longitude = message['value']
 
         if self.latitude and self.longitude:
@@ -54,8 +54,9 @@ def main():
     arguments = parse_options()
 
     transcoder = GPXTranscoder()
-    source = TraceDataSource(transcoder.receive, filename=arguments.trace_file,
-            loop=False, realtime=False)
+    source = TraceDataSource(callback=transcoder.receive,
+            filename=arguments.trace_file, loop=False, realtime=False,
+            direct=True)
     source.start()
     source.join()
 
@@ -0,0 +1,40 @@
+"""
+This module contains the methods for the ``openxc-trace-columns`` command line
+program.
+
+`main` is executed when ``openxc-trace-columns`` is run, and all other
+callables in this module are internal only.
+"""
+
+
+import argparse
+
+from openxc.columnar import ColumnarTrace
+from .common import configure_logging
+
+
+def parse_options():
+    parser = argparse.ArgumentParser(description="Convert OpenXC trace files "
+            "to per-signal NumPy arrays")
+    parser.add_argument("files", action="store", nargs='+', default=False)
+    parser.add_argument("-o", "--output", action="store", required=True,
+            help="a .npz file, or a directory to save memory-mappable .npy "
+            "files to")
+    parser.add_argument("--compress", action="store_true", default=False,
+            help="compress the .npz file")
+
+    arguments = parser.parse_args()
+    return arguments
+
+
+def main():
+    configure_logging()
+    arguments = parse_options()
+
+    columns = ColumnarTrace.from_traces(arguments.files)
+    columns.save(arguments.output, compress=arguments.compress)
+    for name in sorted(columns):
+        signal = columns[name]
+        print("%s: %d %s samples" % (name, len(signal), signal.kind))
+    if columns.skipped > 0:
+        print("Skipped %d records without a signal name" % columns.skipped)
@@ -13,7 +13,7 @@ from operator import itemgetter
 from collections import defaultdict
 
 from openxc.formats.json import JsonFormatter
-from openxc.sources.trace import TraceDataSource
+from openxc.sources.trace import MultiTraceDataSource
 from .common import configure_logging
 
 
@@ -26,19 +26,25 @@ class BaseSplitter(object):
         raise NotImplementedError
 
     def split(self, files):
-        for filename in files:
-            source = TraceDataSource(self.receive, filename=filename,
-                    loop=False, realtime=False)
-            source.start()
+        """Merge the trace files and split the records into buckets.
 
+        Every record is held in memory and sorted by timestamp before it's
+        bucketed, so the files don't need to be in time order.
+        """
+        source = MultiTraceDataSource(callback=self.receive, filenames=files,
+                loop=False, realtime=False, direct=True)
+        source.start()
+        source.join()
+
+        # already merged, so this is cheap unless a file is out of order
         self.records.sort(key=itemgetter('timestamp'))
         for record in self.records:
             self.buckets[self._key_for_record(record)].append(record)
-
         return self.buckets
 
     def receive(self, message, **kwargs):
-        self.records.append(message)
+        if 'timestamp' in message:
+            self.records.append(message)
 
 
 class TimeSplitter(BaseSplitter):
@@ -74,7 +80,9 @@ class TripSplitter(BaseSplitter):
 
 def parse_options():
     parser = argparse.ArgumentParser(description="Split a collection of "
-            "OpenXC trace files by day, hour or trips")
+            "OpenXC trace files by day, hour or trips. The records of all of "
+            "the files are sorted by timestamp, so they don't need to be in "
+            "time order, but they're all held in memory while splitting.")
     parser.add_argument("files", action="store", nargs='+', default=False)
     parser.add_argument("-s", "--split", action="store",
             choices=['day', 'hour', 'trip'], default="trip",
@@ -94,6 +102,6 @@ def main():
         splitter = TimeSplitter(arguments.split)
 
     for key, split in list(splitter.split(arguments.files).items()):
-        with open("%s.json" % key, 'w') as output_file:
+        with open("%s.json" % key, 'wb') as output_file:
             for record in split:
-                output_file.write(JsonFormatter.serialize(record) + "\n")
+                output_file.write(JsonFormatter.serialize(record) + b"\n")
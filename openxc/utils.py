@@ -36,6 +36,78 @@ class AgingData(object):
         return time.time() - self.created_at
 
 
+class Histogram(object):
+    """A cheap histogram of non-negative durations, e.g. how long it takes to
+    parse each message.
+
+    Values are recorded in whole nanoseconds into power-of-two buckets, so
+    recording is just a ``bit_length`` and a list increment and percentiles are
+    approximate - accurate to within a factor of 2.
+    """
+    BUCKET_COUNT = 40
+
+    def __init__(self):
+        self.buckets = [0] * self.BUCKET_COUNT
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, seconds):
+        """Add a duration, in seconds, to the histogram."""
+        self.record_ns(int(seconds * 1e9))
+
+    def record_ns(self, nanoseconds):
+        """Add a duration, in whole nanoseconds (e.g. the difference of two
+        ``time.perf_counter_ns()`` calls), to the histogram.
+        """
+        self.buckets[min(nanoseconds.bit_length(), self.BUCKET_COUNT - 1)] += 1
+        self.count += 1
+        self.total += nanoseconds
+        if nanoseconds > self.max:
+            self.max = nanoseconds
+
+    @property
+    def mean(self):
+        """Return the mean of the recorded values in seconds."""
+        if self.count == 0:
+            return 0
+        return self.total / self.count / 1e9
+
+    def percentile(self, percent):
+        """Return an upper bound (in seconds) for the given percentile of the
+        recorded values.
+        """
+        if self.count == 0:
+            return 0
+        threshold = self.count * percent / 100.0
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count > 0 and seen >= threshold:
+                return min((1 << bucket) - 1, self.max) / 1e9
+        return self.max / 1e9
+
+    def clear(self):
+        self.buckets = [0] * self.BUCKET_COUNT
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def as_dict(self):
+        """Return a summary of the histogram, with durations in seconds."""
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max / 1e9,
+            # keyed by the upper bound of each bucket in nanoseconds
+            'buckets': dict(((1 << bucket) - 1, count)
+                for bucket, count in enumerate(self.buckets) if count > 0),
+        }
+
+
 def quacks_like_dict(object):
     """Check if object is dict-like"""
     return isinstance(object, collections.Mapping)
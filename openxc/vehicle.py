@@ -3,8 +3,14 @@ using the Python library to access vehicle data programatically. Most users will
 want to interact with an instance of Vehicle, and won't need to deal with other
 parts of the library directly (besides measurement types).
 """
+import asyncio
+import logging
+
 from .measurements import Measurement
 from .sinks import MeasurementNotifierSink
+from .sources.base import DataSourceError
+
+LOG = logging.getLogger(__name__)
 
 class Vehicle(object):
     """The Vehicle class is the main entry point for the OpenXC Python library.
@@ -99,3 +105,87 @@ class Vehicle(object):
         raw_measurement = self.measurements.get(measurement_id, None)
         if raw_measurement is not None:
             return Measurement.from_dict(raw_measurement)
+
+
+class AsyncVehicle(Vehicle):
+    """A Vehicle for asyncio applications, reading from asyncio data sources
+    (see :mod:`openxc.sources.aio`) on the event loop instead of threads.
+
+    Messages from every source are merged and can be iterated over with
+    ``async for``, or consumed with ``run`` to just keep ``get`` up to date
+    and feed the sinks:
+
+        vehicle = AsyncVehicle(AsyncNetworkDataSource(host="localhost"))
+        async for message in vehicle:
+            print(vehicle.get(VehicleSpeed))
+
+    Listeners registered with ``listen`` are still called from the
+    notifier's thread.
+    """
+    # The most messages buffered from all sources before reading them is
+    # paused
+    MAX_PENDING_MESSAGES = 1024
+
+    def add_source(self, source):
+        """Add an asyncio data source to the instance. It's read once the
+        vehicle is iterated over or run.
+        """
+        if source is not None:
+            self.sources.add(source)
+
+    def __aiter__(self):
+        return self.messages()
+
+    async def messages(self):
+        """Yield every message received from all of the sources, after
+        updating the latest measurements and passing it to the sinks, until
+        every source has reached the end of its stream.
+        """
+        queue = asyncio.Queue(self.MAX_PENDING_MESSAGES)
+        readers = [asyncio.ensure_future(self._read_source(source, queue))
+                for source in self.sources]
+        remaining = len(readers)
+        try:
+            while remaining > 0:
+                message = await queue.get()
+                if message is None:
+                    remaining -= 1
+                    continue
+                elif isinstance(message, Exception):
+                    raise message
+                self._receive(message)
+                yield message
+        finally:
+            for reader in readers:
+                reader.cancel()
+            for reader in readers:
+                try:
+                    await reader
+                except asyncio.CancelledError:
+                    pass
+
+    @staticmethod
+    async def _read_source(source, queue):
+        """Queue each message from the source, then ``None`` when it stops,
+        or the exception if it fails unexpectedly.
+        """
+        ended = None
+        try:
+            async for message in source:
+                await queue.put(message)
+        except asyncio.CancelledError:
+            raise
+        except DataSourceError as e:
+            LOG.warn("Can't read from data source -- stopping: %s", e)
+        except Exception as e:
+            ended = e
+        finally:
+            await source.close()
+        await queue.put(ended)
+
+    async def run(self):
+        """Read from all of the sources until they reach the end of their
+        streams, without handling each message.
+        """
+        async for _ in self.messages():
+            pass
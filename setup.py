@@ -38,7 +38,10 @@ setup(name='openxc',
     extras_require = {
         'serial': ["pyserial==3.1.1"],
         'bluetooth': ["pybluez"],
+        'messagepack': ["msgpack"],
         'lxml': ["lxml"],
+        'fastjson': ["orjson"],
+        'columnar': ["numpy"],
     },
     entry_points={
         'console_scripts': [
@@ -47,6 +50,7 @@ setup(name='openxc',
             'openxc-control = openxc.tools.control:main',
             'openxc-gps = openxc.tools.gps:main',
             'openxc-trace-split = openxc.tools.tracesplit:main',
+            'openxc-trace-columns = openxc.tools.tracecolumns:main',
             'openxc-generate-firmware-code = openxc.tools.generate_code:main',
             'openxc-diag = openxc.tools.diagnostics:main',
             'openxc-scanner = openxc.tools.scanner:main',
@@ -34,6 +34,54 @@ class BaseStreamerTests(object):
         eq_(message['value'], 24)
         eq_(None, self.streamer.parse_next_message())
 
+    def test_receive_many_in_chunks(self):
+        serialized_messages = b"".join(self.streamer.serialize_for_stream(
+                {'name': "foo", 'value': value}) for value in range(100))
+        messages = []
+        for start in range(0, len(serialized_messages), 7):
+            self.streamer.receive(serialized_messages[start:start + 7])
+            while True:
+                message = self.streamer.parse_next_message()
+                if message is None:
+                    break
+                messages.append(message)
+        eq_([message['value'] for message in messages], list(range(100)))
+        eq_(len(self.streamer.message_buffer), 0)
+
+    def test_parse_all(self):
+        serialized_messages = b"".join(self.streamer.serialize_for_stream(
+                {'name': "foo", 'value': value}) for value in range(10))
+        self.streamer.receive(serialized_messages[:-3])
+        messages = self.streamer.parse_all()
+        eq_([message['value'] for message in messages], list(range(9)))
+        eq_(self.streamer.parse_all(), [])
+
+        self.streamer.receive(serialized_messages[-3:])
+        messages = self.streamer.parse_all()
+        eq_(len(messages), 1)
+        eq_(messages[0]['value'], 9)
+        eq_(len(self.streamer.message_buffer), 0)
+
+    def test_serialize_many(self):
+        messages = [{'name': "foo", 'value': value} for value in range(5)]
+        serialized_messages = self.streamer.serialize_many(messages)
+        eq_(serialized_messages, b"".join(
+            self.streamer.serialize_for_stream(message)
+            for message in messages))
+        self.streamer.receive(serialized_messages)
+        eq_([message['value'] for message in self.streamer.parse_all()],
+                list(range(5)))
+
+    def test_serialize_batches(self):
+        messages = [{'name': "foo", 'value': 42} for _ in range(20)]
+        size = len(self.streamer.serialize_for_stream(messages[0]))
+        batches = list(self.streamer.serialize_batches(messages,
+                max_size=size * 3))
+        eq_(len(batches), 7)
+        ok_(all(len(batch) <= size * 3 for batch in batches))
+        eq_(b"".join(batches), self.streamer.serialize_many(messages))
+        eq_(list(self.streamer.serialize_batches([])), [])
+
     def test_serialize_command(self):
         serialized_message = self.streamer.serialize_for_stream(
                 {'command': "version"})
@@ -42,6 +90,49 @@ class BaseStreamerTests(object):
         ok_(message is not None)
         eq_(message['command'], "version")
 
+    def test_binary_can_data(self):
+        self.streamer.binary_can_data = True
+        for data in [b"\x12\x34\x56\x78", 0x12345678, "0x12345678"]:
+            self.streamer.receive(self.streamer.serialize_for_stream(
+                    {'bus': 1, 'id': 1234, 'data': data}))
+            message = self.streamer.parse_next_message()
+            ok_(message is not None)
+            eq_(message['id'], 1234)
+            eq_(message['data'], b"\x12\x34\x56\x78")
+
+    def test_can_data_as_hex_by_default(self):
+        self.streamer.receive(self.streamer.serialize_for_stream(
+                {'bus': 1, 'id': 1234, 'data': b"\x01\x02"}))
+        eq_(self.streamer.parse_next_message()['data'], "0x0102")
+
+    def test_stats(self):
+        messages = [{'name': "foo", 'value': 42},
+                {'bus': 1, 'id': 1234, 'data': "0x1234"},
+                {'command_response': "version", 'message': "v7.0",
+                    'status': True},
+                {'name': "bar", 'value': 24}]
+        self.streamer.receive(self.streamer.serialize_many(messages))
+        eq_(len(self.streamer.parse_all()), 4)
+        stats = self.streamer.stats()
+        eq_(stats['messages_parsed'],
+                {'simple': 2, 'can': 1, 'command_response': 1})
+        eq_(stats['messages_invalid'], 0)
+        eq_(stats['bytes_received'], stats['peak_buffer_size'])
+        eq_(stats['buffered_bytes'], 0)
+        # timing is off by default
+        eq_(stats['parse_time']['count'], 0)
+
+    def test_parse_timing(self):
+        self.streamer.timing = True
+        messages = [{'name': "foo", 'value': value} for value in range(4)]
+        self.streamer.receive(self.streamer.serialize_many(messages))
+        ok_(self.streamer.parse_next_message() is not None)
+        eq_(len(self.streamer.parse_all()), 3)
+        stats = self.streamer.stats()
+        eq_(stats['messages_parsed'], {'simple': 4})
+        eq_(stats['parse_time']['count'], 4)
+        ok_(stats['parse_time']['max'] >= stats['parse_time']['p50'])
+
 class BaseFormatterTests(object):
     """A test for every format defined in the OpenXC Message Format
     spec: https://github.com/openxc/openxc-message-format
@@ -72,6 +163,22 @@ class BaseFormatterTests(object):
             "enabled": True
         })
 
+    def test_predefined_obd2_command(self):
+        self._check_serialized_deserialize_equal({ "command": "predefined_obd2",
+            "enabled": True
+        })
+
+    def test_af_bypass_command(self):
+        self._check_serialized_deserialize_equal({ "command": "af_bypass",
+            "bus": 2,
+            "bypass": True
+        })
+
+    def test_payload_format_command(self):
+        self._check_serialized_deserialize_equal({ "command": "payload_format",
+            "format": "protobuf"
+        })
+
     def test_evented(self):
         self._check_serialized_deserialize_equal({"name": "button_event",
             "value": "up", "event": "pressed"})
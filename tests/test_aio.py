@@ -0,0 +1,166 @@
+from nose.tools import eq_, ok_
+import asyncio
+import lzma
+import socket
+import threading
+import time
+import unittest
+
+from openxc.formats.binary import ProtobufStreamer
+from openxc.formats.json import JsonStreamer
+from openxc.measurements import VehicleSpeed
+from openxc.sources import TraceDataSource, AsyncNetworkDataSource, \
+        AsyncSocketDataSource, AsyncTraceDataSource, DataSourceError
+from openxc.vehicle import AsyncVehicle
+
+from .trace_test_utils import TraceFileTests, corrupt_trace
+
+MESSAGES = [{'name': "vehicle_speed", 'value': value}
+        for value in range(1000)]
+
+
+def serve_once(data):
+    """Start a local TCP server that sends ``data`` to the first client and
+    closes the connection, returning the server's port and thread.
+    """
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+
+    def serve():
+        connection, _ = server.accept()
+        connection.sendall(data)
+        connection.close()
+        server.close()
+
+    server_thread = threading.Thread(target=serve)
+    server_thread.start()
+    return server.getsockname()[1], server_thread
+
+
+class AsyncTestCase(unittest.TestCase):
+    def setUp(self):
+        super(AsyncTestCase, self).setUp()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        super(AsyncTestCase, self).tearDown()
+
+    def _run(self, coroutine):
+        return self.loop.run_until_complete(asyncio.wait_for(coroutine, 10))
+
+    async def _collect(self, source):
+        return [message async for message in source]
+
+
+class AsyncNetworkDataSourceTests(AsyncTestCase):
+    def _receive(self, streamer, **kwargs):
+        port, server_thread = serve_once(streamer.serialize_many(MESSAGES))
+
+        async def receive():
+            async with AsyncNetworkDataSource(host='127.0.0.1', port=port,
+                    **kwargs) as source:
+                return source, await self._collect(source)
+
+        source, received = self._run(receive())
+        server_thread.join()
+        return source, received
+
+    def test_receive_json(self):
+        source, received = self._receive(JsonStreamer(),
+                payload_format="json")
+        eq_(received, MESSAGES)
+        eq_(sum(source.stats()['messages_parsed'].values()), len(MESSAGES))
+
+    def test_detect_protobuf(self):
+        source, received = self._receive(ProtobufStreamer())
+        eq_(source.format, "protobuf")
+        eq_([message['value'] for message in received],
+                [message['value'] for message in MESSAGES])
+
+    def test_connection_refused(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(('127.0.0.1', 0))
+        port = server.getsockname()[1]
+        server.close()
+        source = AsyncNetworkDataSource(host='127.0.0.1', port=port)
+        self.assertRaises(DataSourceError, self._run, source.open())
+
+    def test_connected_socket(self):
+        port, server_thread = serve_once(JsonStreamer().serialize_many(
+            MESSAGES))
+        connection = socket.create_connection(('127.0.0.1', port))
+        source = AsyncSocketDataSource(sock=connection)
+        eq_(self._run(self._collect(source)), MESSAGES)
+        self._run(source.close())
+        server_thread.join()
+
+
+class AsyncTraceDataSourceTests(AsyncTestCase):
+    def test_same_as_threaded(self):
+        expected = []
+        source = TraceDataSource(filename="tests/trace.json",
+                callback=expected.append, loop=False, realtime=False)
+        source.start()
+        source.join()
+
+        received = self._run(self._collect(AsyncTraceDataSource(
+            filename="tests/trace.json", loop=False, realtime=False)))
+        eq_(received, expected)
+
+    def test_realtime(self):
+        source = AsyncTraceDataSource(filename="tests/trace.json",
+                loop=False, speed=10)
+        started = time.perf_counter()
+        received = self._run(self._collect(source))
+        elapsed = time.perf_counter() - started
+        duration = received[-1]['timestamp'] - received[0]['timestamp']
+        ok_(elapsed >= duration / 10 * 0.9)
+
+    def test_missing_file(self):
+        self.assertRaises(DataSourceError, AsyncTraceDataSource,
+                filename="tests/missing.json")
+
+
+class AsyncCorruptTraceTests(TraceFileTests, AsyncTestCase):
+    def setUp(self):
+        super(AsyncCorruptTraceTests, self).setUp()
+        self.filename = self._write("corrupt.json.xz",
+                corrupt_trace(lzma.compress))
+
+    def test_corrupt_trace(self):
+        source = AsyncTraceDataSource(filename=self.filename, loop=False,
+                realtime=False)
+        self.assertRaises(DataSourceError, self._run, self._collect(source))
+
+    def test_vehicle_stops_reading_corrupt_trace(self):
+        vehicle = AsyncVehicle(AsyncTraceDataSource(filename=self.filename,
+                loop=False, realtime=False))
+        received = self._run(self._collect(vehicle))
+        ok_(0 < len(received) < 20000)
+
+
+class AsyncVehicleTests(AsyncTestCase):
+    def test_merge_sources(self):
+        vehicle = AsyncVehicle()
+        for _ in range(2):
+            vehicle.add_source(AsyncTraceDataSource(
+                filename="tests/trace.json", loop=False, realtime=False))
+        received = self._run(self._collect(vehicle))
+        eq_(len(received), 500)
+        ok_(vehicle.get(VehicleSpeed) is not None)
+
+    def test_run(self):
+        vehicle = AsyncVehicle(AsyncTraceDataSource(
+            filename="tests/trace.json", loop=False, realtime=False))
+        self._run(vehicle.run())
+        ok_(vehicle.get(VehicleSpeed) is not None)
+
+    def test_source_error(self):
+        class FailingSource(AsyncTraceDataSource):
+            async def read(self):
+                raise ValueError("broken")
+
+        vehicle = AsyncVehicle(FailingSource(filename="tests/trace.json"))
+        self.assertRaises(ValueError, self._run, vehicle.run())
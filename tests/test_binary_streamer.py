@@ -1,15 +1,139 @@
+from nose.tools import eq_, ok_
 import unittest
 
 from .streamer_test_utils import BaseStreamerTests, BaseFormatterTests
-from openxc.formats.binary import ProtobufStreamer, ProtobufFormatter
+from openxc.formats.binary import ProtobufStreamer, ProtobufFormatter, \
+        ProtobufMessageView, UnrecognizedBinaryCommandError
+from openxc.formats.json import JsonFormatter
+from openxc.measurements import Measurement
+from openxc.sources.base import BytestreamDataSource
 
 class ProtobufStreamerTests(unittest.TestCase, BaseStreamerTests):
     def setUp(self):
         super(ProtobufStreamerTests, self).setUp()
         self.streamer = ProtobufStreamer()
 
+    def test_resync_after_garbage(self):
+        first = self.streamer.serialize_for_stream({'name': "foo", 'value': 42})
+        second = self.streamer.serialize_for_stream({'name': "bar", 'value': 24})
+        garbage = b"\x05\xff\x01\x08\x00\x7f" * 10
+        self.streamer.receive(first + garbage + second)
+
+        messages = self.streamer.parse_all()
+        eq_([message['name'] for message in messages], ["foo", "bar"])
+        eq_(self.streamer.bytes_skipped, len(garbage))
+        eq_(self.streamer.resync_events, 1)
+        eq_(len(self.streamer.message_buffer), 0)
+
+    def test_corrupted_frame_counted_once(self):
+        first = self.streamer.serialize_for_stream({'name': "foo", 'value': 42})
+        second = self.streamer.serialize_for_stream({'name': "bar", 'value': 24})
+        third = self.streamer.serialize_for_stream({'name': "baz", 'value': 1})
+        # keep the length prefix and field key, and fill the rest with more
+        # plausible looking frames that fail to parse while resynchronizing
+        corrupted = second[:2] + (b"\x02\x12\xff" * 10)[:len(second) - 2]
+        self.streamer.receive(first + corrupted + third)
+
+        messages = self.streamer.parse_all()
+        eq_([message['name'] for message in messages], ["foo", "baz"])
+        eq_(self.streamer.messages_invalid, 1)
+        eq_(self.streamer.bytes_skipped, len(corrupted))
+        eq_(self.streamer.resync_events, 1)
+        eq_(self.streamer.stats()['messages_parsed'], {'simple': 2})
+
+    def test_no_resync_on_clean_stream(self):
+        self.streamer.receive(self.streamer.serialize_for_stream(
+                {'name': "foo", 'value': 42}))
+        ok_(self.streamer.parse_next_message() is not None)
+        eq_(self.streamer.bytes_skipped, 0)
+        eq_(self.streamer.resync_events, 0)
+
 
 class ProtobufFormatterTests(unittest.TestCase, BaseFormatterTests):
     def setUp(self):
         super(ProtobufFormatterTests, self).setUp()
         self.formatter = ProtobufFormatter
+
+    def test_reused_message_is_cleared(self):
+        can_message = self.formatter.serialize({"bus": 1, "id": 1234,
+            "data": "0x12345678", "frame_format": "extended"})
+        eq_(self.formatter.deserialize(self.formatter.serialize(
+            {"bus": 2, "id": 42, "data": "0x12"})),
+            {"bus": 2, "id": 42, "data": "0x12"})
+        self.formatter.deserialize(can_message)
+        eq_(self.formatter.deserialize(self.formatter.serialize(
+            {'name': "foo", 'value': 42})),
+            {'name': "foo", 'value': 42, 'event': False})
+
+    def test_unrecognized_command(self):
+        self.assertRaises(UnrecognizedBinaryCommandError,
+                self.formatter.serialize, {'command': "not_a_command"})
+
+
+class ProtobufMessageViewTests(unittest.TestCase):
+    MESSAGES = [
+        {'name': "foo", 'event': False, 'value': 42},
+        {'name': "button_event", 'value': "up", 'event': "pressed"},
+        {'bus': 1, 'id': 1234, 'data': "0x12345678",
+            'frame_format': "extended"},
+        {'bus': 1, 'id': 1234, 'mode': 1, 'pid': 5, 'frame': 0,
+            'success': True, 'payload': "0x1234"},
+    ]
+
+    def _view(self, message):
+        view = ProtobufFormatter.deserialize(
+                ProtobufFormatter.serialize(message), lazy=True)
+        ok_(isinstance(view, ProtobufMessageView))
+        return view
+
+    def test_equal_to_eager_dict(self):
+        for message in self.MESSAGES:
+            view = self._view(message)
+            eq_(view, message)
+            eq_(view.to_dict(), ProtobufFormatter.deserialize(
+                ProtobufFormatter.serialize(message)))
+            eq_(len(view), len(message))
+            eq_(set(view), set(message))
+
+    def test_decodes_on_access(self):
+        view = self._view({'bus': 1, 'id': 1234, 'data': "0x12345678"})
+        ok_('data' in view)
+        eq_(view._values, {})
+        eq_(view['id'], 1234)
+        eq_(list(view._values), ['id'])
+        eq_(view.get('name', 'can_message'), 'can_message')
+
+    def test_modify(self):
+        view = self._view({'name': "foo", 'value': 42})
+        view['timestamp'] = 1332794184.319
+        view['value'] = 24
+        del view['event']
+        eq_(view, {'name': "foo", 'value': 24, 'timestamp': 1332794184.319})
+        ok_('event' not in view)
+        self.assertRaises(KeyError, view.__getitem__, 'event')
+
+    def test_serialize_view(self):
+        view = self._view({'name': "foo", 'value': 42})
+        eq_(JsonFormatter.deserialize(JsonFormatter.serialize(view)),
+                {'name': "foo", 'value': 42, 'event': False})
+        eq_(ProtobufFormatter.deserialize(ProtobufFormatter.serialize(view)),
+                view)
+
+    def test_consumers(self):
+        view = self._view({'name': "foo", 'value': 42})
+        ok_(BytestreamDataSource(payload_format="protobuf")._message_valid(
+                view))
+        measurement = Measurement.from_dict(view)
+        eq_(measurement.name, "foo")
+
+    def test_commands_are_dicts(self):
+        message = ProtobufFormatter.deserialize(ProtobufFormatter.serialize(
+                {'command': "version"}), lazy=True)
+        eq_(type(message), dict)
+
+    def test_lazy_streamer(self):
+        streamer = ProtobufStreamer(lazy=True)
+        streamer.receive(streamer.serialize_for_stream(self.MESSAGES[0]))
+        message = streamer.parse_next_message()
+        ok_(isinstance(message, ProtobufMessageView))
+        eq_(message, self.MESSAGES[0])
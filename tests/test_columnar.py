@@ -0,0 +1,152 @@
+import gzip
+import math
+import os
+import unittest
+from nose.tools import eq_, ok_
+
+from openxc.columnar import ColumnarTrace, BOOLEAN, NUMERIC, STATE, \
+        MISSING_STATE, numpy
+from openxc.formats.binary import ProtobufStreamer
+from openxc.formats.json import JsonFormatter
+
+from .trace_test_utils import TraceFileTests
+
+MESSAGES = [
+    {'name': "vehicle_speed", 'value': 0, 'timestamp': 1.0},
+    {'name': "brake_pedal_status", 'value': True, 'timestamp': 1.1},
+    {'name': "transmission_gear_position", 'value': "first",
+        'timestamp': 1.2},
+    {'name': "door_status", 'value': "driver", 'event': True,
+        'timestamp': 1.3},
+    {'bus': 1, 'id': 42, 'data': "0x1234", 'timestamp': 1.4},
+    {'name': "vehicle_speed", 'value': 12.5, 'timestamp': 2.0},
+    {'name': "brake_pedal_status", 'value': False, 'timestamp': 2.1},
+    {'name': "transmission_gear_position", 'value': "second",
+        'timestamp': 2.2},
+    {'name': "transmission_gear_position", 'value': "first",
+        'timestamp': 2.3},
+    {'name': "door_status", 'value': "passenger", 'event': False,
+        'timestamp': 2.4},
+]
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class ColumnarTraceTests(TraceFileTests, unittest.TestCase):
+    def _write_messages(self, name, messages, compress=False):
+        data = b"".join(JsonFormatter.serialize(message) + b"\n"
+                for message in messages)
+        if compress:
+            data = gzip.compress(data)
+        return self._write(name, data)
+
+    def _check(self, columns):
+        eq_(sorted(columns), ["brake_pedal_status", "door_status",
+            "transmission_gear_position", "vehicle_speed"])
+        eq_(columns.skipped, 1)
+
+        speed = columns["vehicle_speed"]
+        eq_(speed.kind, NUMERIC)
+        eq_(speed.values.dtype, numpy.float64)
+        eq_(list(speed.timestamps), [1.0, 2.0])
+        eq_(list(speed.values), [0, 12.5])
+
+        brake = columns["brake_pedal_status"]
+        eq_(brake.kind, BOOLEAN)
+        eq_(brake.values.dtype, bool)
+        eq_(list(brake.values), [True, False])
+
+        gear = columns["transmission_gear_position"]
+        eq_(gear.kind, STATE)
+        eq_(list(gear.decoded_values()), ["first", "second", "first"])
+
+        door = columns["door_status"]
+        eq_(door.event_kind, BOOLEAN)
+        eq_(list(door.decoded_values()), ["driver", "passenger"])
+        eq_(list(door.decoded_events()), [True, False])
+
+    def test_convert(self):
+        columns = ColumnarTrace.from_traces(self._write_messages("trace.json",
+            MESSAGES))
+        self._check(columns)
+        gear = columns["transmission_gear_position"]
+        eq_(list(gear.values), [0, 1, 0])
+        eq_(list(gear.states), ["first", "second"])
+
+    def test_convert_protobuf(self):
+        streamer = ProtobufStreamer()
+        filename = self._write("trace.pb", b"".join(
+            streamer.serialize_for_stream(message) for message in MESSAGES))
+        columns = ColumnarTrace.from_traces(filename)
+        eq_(sorted(columns), sorted(ColumnarTrace.from_traces(
+            self._write_messages("trace.json", MESSAGES))))
+        eq_(list(columns["transmission_gear_position"].decoded_values()),
+                ["first", "second", "first"])
+
+    def test_same_as_trace(self):
+        columns = ColumnarTrace.from_traces("tests/trace.json")
+        with open("tests/trace.json", "rb") as trace_file:
+            messages = [JsonFormatter.deserialize(line)
+                    for line in trace_file if line.strip()]
+        speeds = [message for message in messages
+                if message['name'] == "engine_speed"]
+        eq_(list(columns["engine_speed"].timestamps),
+                [message['timestamp'] for message in speeds])
+        eq_(list(columns["engine_speed"].values),
+                [message['value'] for message in speeds])
+
+    def test_multiple_files_sorted(self):
+        filenames = [self._write_messages("later.json.gz", MESSAGES[5:], True),
+                self._write_messages("earlier.json", MESSAGES[:5])]
+        self._check(ColumnarTrace.from_traces(filenames))
+
+    def test_promotion(self):
+        columns = ColumnarTrace.from_traces(self._write_messages("trace.json", [
+            {'name': "boolean_gap", 'value': True},
+            {'name': "boolean_gap"},
+            {'name': "mixed", 'value': True},
+            {'name': "mixed", 'value': 2},
+            {'name': "mixed", 'value': "high"},
+            {'name': "missing_first"},
+            {'name': "missing_first", 'value': 3},
+        ]))
+        gap = columns["boolean_gap"]
+        eq_(gap.kind, NUMERIC)
+        eq_(gap.values[0], 1)
+        ok_(math.isnan(gap.values[1]))
+        ok_(math.isnan(gap.timestamps[0]))
+
+        mixed = columns["mixed"]
+        eq_(mixed.kind, STATE)
+        # samples from before the promotion were already stored as numbers
+        eq_(list(mixed.decoded_values()), ["1", "2", "high"])
+
+        missing_first = columns["missing_first"]
+        eq_(missing_first.kind, NUMERIC)
+        ok_(math.isnan(missing_first.values[0]))
+        eq_(missing_first.values[1], 3)
+
+    def test_missing_state(self):
+        columns = ColumnarTrace.from_traces(self._write_messages("trace.json", [
+            {'name': "gear", 'value': "first"},
+            {'name': "gear"},
+        ]))
+        eq_(list(columns["gear"].values), [0, MISSING_STATE])
+        eq_(list(columns["gear"].decoded_values()), ["first", None])
+
+    def test_save_and_load_npz(self):
+        columns = ColumnarTrace.from_traces(self._write_messages("trace.json",
+            MESSAGES))
+        for compress in (False, True):
+            path = os.path.join(self.directory, "columns-%s.npz" % compress)
+            columns.save(path, compress=compress)
+            self._check(ColumnarTrace.load(path))
+
+    def test_save_and_load_directory(self):
+        path = os.path.join(self.directory, "columns")
+        ColumnarTrace.from_traces(self._write_messages("trace.json", MESSAGES)).save(
+                path)
+        columns = ColumnarTrace.load(path)
+        self._check(columns)
+        ok_(isinstance(columns["vehicle_speed"].values, numpy.memmap))
+        ok_(not isinstance(ColumnarTrace.load(path, mmap=False)[
+            "vehicle_speed"].values, numpy.memmap))
@@ -0,0 +1,66 @@
+from nose.tools import eq_, ok_
+import unittest
+
+from openxc.controllers.base import Controller
+from openxc.formats.binary import ProtobufStreamer
+from openxc.formats.json import JsonStreamer
+
+
+class ControllerTests(unittest.TestCase):
+    def setUp(self):
+        super(ControllerTests, self).setUp()
+        self.controller = TestController(JsonStreamer())
+
+    def _received_messages(self):
+        streamer = self.controller.streamer.__class__()
+        for write in self.controller.writes:
+            streamer.receive(write)
+        return streamer.parse_all()
+
+    def test_write_many_batches(self):
+        messages = [{'id': 0x123, 'data': "0x1234567890abcdef", 'bus': 1}
+                for _ in range(100)]
+        bytes_written = self.controller.write_many(messages)
+        eq_(bytes_written, sum(len(write) for write in self.controller.writes))
+        ok_(1 < len(self.controller.writes) < len(messages))
+        for write in self.controller.writes:
+            ok_(len(write) <= Controller.WRITE_BATCH_SIZE)
+        eq_(self._received_messages(), messages)
+
+    def test_write_many_protobuf(self):
+        self.controller = TestController(ProtobufStreamer())
+        messages = [{'name': "turn_signal_status", 'value': "left"},
+                {'id': 0x123, 'data': "0x12", 'frame_format': "standard"}]
+        self.controller.write_many(messages)
+        eq_(len(self.controller.writes), 1)
+        eq_(self._received_messages(), [
+            {'name': "turn_signal_status", 'value': "left", 'event': False},
+            {'id': 0x123, 'data': "0x12", 'frame_format': "standard"}])
+
+    def test_write_many_massages_values(self):
+        self.controller.write_many([{'name': "foo", 'value': "true",
+            'event': "42", 'timestamp': 1332794184.319},
+            {'id': "0x123", 'data': "0x12"}])
+        eq_(self._received_messages(), [
+            {'name': "foo", 'value': True, 'event': 42.0},
+            {'id': 0x123, 'data': "0x12"}])
+
+    def test_write_many_empty(self):
+        eq_(self.controller.write_many([]), 0)
+        eq_(self.controller.writes, [])
+
+    def test_message_larger_than_batch(self):
+        self.controller.WRITE_BATCH_SIZE = 10
+        self.controller.write_many([{'name': "foo", 'value': 1},
+            {'name': "bar", 'value': 2}])
+        eq_(len(self.controller.writes), 2)
+
+
+class TestController(Controller):
+    def __init__(self, streamer):
+        self.streamer = streamer
+        self.writes = []
+
+    def write_bytes(self, data):
+        self.writes.append(data)
+        return len(data)
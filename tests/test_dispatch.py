@@ -0,0 +1,142 @@
+import threading
+import time
+import unittest
+from nose.tools import eq_, ok_
+
+from openxc.sources import TraceDataSource
+from openxc.sources.dispatch import DispatchQueue, signal_key, BLOCK, \
+        DROP_OLDEST, DROP_NEWEST, LATEST
+
+
+def speed(value):
+    return {'name': "vehicle_speed", 'value': value}
+
+
+def rpm(value):
+    return {'name': "engine_speed", 'value': value}
+
+
+class DispatchQueueTests(unittest.TestCase):
+    def _drain(self, queue):
+        messages = []
+        while len(queue) > 0:
+            messages.append(queue.get())
+        return messages
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, DispatchQueue, 0)
+        self.assertRaises(ValueError, DispatchQueue, 10, "drop-everything")
+
+    def test_fifo(self):
+        queue = DispatchQueue(10)
+        for value in range(5):
+            ok_(queue.put(speed(value)))
+        eq_([message['value'] for message in self._drain(queue)],
+                list(range(5)))
+        eq_(queue.get(timeout=0.01), None)
+
+    def test_drop_oldest(self):
+        queue = DispatchQueue(3, DROP_OLDEST)
+        for value in range(5):
+            ok_(queue.put(speed(value)))
+        eq_([message['value'] for message in self._drain(queue)], [2, 3, 4])
+        eq_(queue.dropped, 2)
+        eq_(queue.peak_depth, 3)
+
+    def test_drop_newest(self):
+        queue = DispatchQueue(3, DROP_NEWEST)
+        eq_([queue.put(speed(value)) for value in range(5)],
+                [True, True, True, False, False])
+        eq_([message['value'] for message in self._drain(queue)], [0, 1, 2])
+        eq_(queue.stats()['dropped'], 2)
+
+    def test_latest(self):
+        queue = DispatchQueue(10, LATEST)
+        queue.put(speed(1))
+        queue.put(rpm(1000))
+        queue.put(speed(2))
+        queue.put({'command_response': "version", 'message': "7.0"})
+        queue.put({'command_response': "version", 'message': "7.0"})
+        eq_(self._drain(queue), [speed(2), rpm(1000),
+            {'command_response': "version", 'message': "7.0"},
+            {'command_response': "version", 'message': "7.0"}])
+        eq_(queue.dropped, 1)
+
+    def test_latest_full(self):
+        queue = DispatchQueue(2, LATEST)
+        queue.put(speed(1))
+        queue.put(rpm(1000))
+        queue.put(rpm(2000))
+        queue.put({'name': "fuel_level", 'value': 50})
+        eq_(self._drain(queue), [rpm(2000), {'name': "fuel_level",
+            'value': 50}])
+        eq_(queue.dropped, 2)
+
+    def test_signal_key(self):
+        eq_(signal_key(speed(1)), signal_key(speed(2)))
+        ok_(signal_key({'name': "door_status", 'value': "driver",
+            'event': True}) != signal_key({'name': "door_status",
+                'value': "passenger", 'event': True}))
+        eq_(signal_key({'bus': 1, 'id': 42, 'data': "0x1"}),
+                signal_key({'bus': 1, 'id': 42, 'data': "0x2"}))
+        eq_(signal_key({'command_response': "version"}), None)
+
+    def test_block(self):
+        queue = DispatchQueue(1, BLOCK)
+        queue.put(speed(1))
+        thread = threading.Thread(target=queue.put, args=(speed(2),))
+        thread.start()
+        thread.join(0.05)
+        ok_(thread.is_alive())
+        eq_(queue.get(), speed(1))
+        thread.join(1)
+        ok_(not thread.is_alive())
+        eq_(queue.get(), speed(2))
+
+    def test_close(self):
+        queue = DispatchQueue(1, BLOCK)
+        queue.put(speed(1))
+        thread = threading.Thread(target=queue.put, args=(speed(2),))
+        thread.start()
+        queue.close()
+        thread.join(1)
+        ok_(not thread.is_alive())
+        eq_(queue.get(), speed(1))
+        eq_(queue.get(), None)
+        eq_(queue.dropped, 1)
+
+
+class DispatchingSourceTests(unittest.TestCase):
+    def _replay(self, callback, **kwargs):
+        source = TraceDataSource(filename="tests/trace.json",
+                callback=callback, loop=False, realtime=False, **kwargs)
+        source.start()
+        source.join()
+        return source
+
+    def test_same_as_without_queue(self):
+        for direct in (False, True):
+            expected = []
+            self._replay(expected.append, direct=direct)
+            received = []
+            source = self._replay(received.append, direct=direct,
+                    dispatch_queue_size=8)
+            eq_(received, expected)
+            stats = source.stats()['dispatch']
+            eq_(stats['dropped'], 0)
+            eq_(stats['queued'], len(expected))
+            ok_(stats['peak_depth'] <= 8)
+
+    def test_slow_callback_drops(self):
+        received = []
+
+        def slow_callback(message):
+            time.sleep(0.001)
+            received.append(message)
+
+        source = self._replay(slow_callback, direct=True,
+                dispatch_queue_size=4, dispatch_policy=DROP_NEWEST)
+        stats = source.stats()['dispatch']
+        ok_(stats['dropped'] > 0)
+        eq_(len(received) + stats['dropped'], 250)
+        eq_(stats['depth'], 0)
@@ -1,8 +1,55 @@
+import os
+import shutil
+import tempfile
 import unittest
+from nose.tools import eq_, ok_
 
 from openxc.sinks import FileRecorderSink
+from openxc.sources import TraceDataSource
 
 class FileRecorderSinkTest(unittest.TestCase):
+    def setUp(self):
+        super(FileRecorderSinkTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+        super(FileRecorderSinkTest, self).tearDown()
 
     def test_create(self):
         FileRecorderSink()
+
+    def test_invalid_format(self):
+        self.assertRaises(ValueError, FileRecorderSink, trace_format="xml")
+
+    def _record(self, trace_format):
+        sink = FileRecorderSink(trace_format=trace_format)
+        for value in range(10):
+            sink.receive({'name': "foo", 'value': value})
+        sink.queue.join()
+        filenames = os.listdir(self.directory)
+        eq_(len(filenames), 1)
+
+        received = []
+        source = TraceDataSource(filename=filenames[0],
+                callback=received.append, loop=False, realtime=False)
+        source.start()
+        source.join()
+        return filenames[0], source, received
+
+    def test_record_json(self):
+        filename, source, received = self._record("json")
+        ok_(filename.endswith(".json"))
+        eq_(source.format, "json")
+        eq_([message['value'] for message in received], list(range(10)))
+        ok_(all('timestamp' in message for message in received))
+
+    def test_record_protobuf(self):
+        filename, source, received = self._record("protobuf")
+        ok_(filename.endswith(".pb"))
+        eq_(source.format, "protobuf")
+        eq_([message['value'] for message in received], list(range(10)))
+        ok_(all('timestamp' in message for message in received))
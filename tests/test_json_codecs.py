@@ -0,0 +1,84 @@
+from nose.tools import eq_, ok_
+import json
+import unittest
+
+from openxc.formats.json import JsonFormatter, JsonStreamer, JSON_CODECS, \
+        UnrecognizedJsonCodecError
+
+MESSAGES = [
+    {'name': "vehicle_speed", 'value': 42},
+    {'name': "latitude", 'value': 42.292834, 'timestamp': 1332794184.319},
+    {'name': "button_event", 'value': "up", 'event': "pressed"},
+    {'name': "door_status", 'value': "driver", 'event': False},
+    {'name': "unicode", 'value': "café → /path"},
+    {'bus': 1, 'id': 1234, 'data': "0x12345678", 'frame_format': "standard"},
+    {'command': "diagnostic_request", 'action': "add",
+        'request': {'bus': 1, 'id': 2015, 'mode': 1, 'pid': 12,
+            'payload': "0x1234", 'multiple_responses': False,
+            'frequency': 0.5, 'name': "my_pid"}},
+    {'command_response': "version", 'message': "v8.0.0 (default)",
+        'status': True},
+    {'bus': 1, 'id': 2024, 'mode': 1, 'pid': 12, 'frame': -1,
+        'success': False, 'negative_response_code': 17},
+    {'values': [1, 2.5, None, True, "x"]},
+]
+
+
+class JsonCodecConformanceTests(unittest.TestCase):
+    def tearDown(self):
+        super(JsonCodecConformanceTests, self).tearDown()
+        JsonFormatter.set_codec()
+
+    def test_stdlib_always_available(self):
+        ok_('json' in JSON_CODECS)
+
+    def test_round_trip(self):
+        for codec in JSON_CODECS.values():
+            for message in MESSAGES:
+                serialized = codec.dumps(message)
+                eq_(type(serialized), bytes)
+                eq_(json.loads(serialized.decode("utf8")), message,
+                        "%s didn't encode %s" % (codec, message))
+                eq_(codec.loads(serialized), message)
+
+    def test_identical_dicts_from_all_codecs(self):
+        for message in MESSAGES:
+            serialized = json.dumps(message)
+            for data in [serialized, serialized.encode("utf8"),
+                    bytearray(serialized.encode("utf8"))]:
+                for codec in JSON_CODECS.values():
+                    eq_(codec.loads(data), message,
+                            "%s didn't decode %r" % (codec, data))
+
+    def test_invalid_raises_value_error(self):
+        for codec in JSON_CODECS.values():
+            for data in [b"{\"name\": ", b"", b"\xff\xfe"]:
+                self.assertRaises(ValueError, codec.loads, data)
+
+    def test_streamer_with_each_codec(self):
+        for name in JSON_CODECS:
+            JsonFormatter.set_codec(name)
+            streamer = JsonStreamer()
+            for message in MESSAGES:
+                streamer.receive(streamer.serialize_for_stream(message))
+            eq_(streamer.parse_all(), MESSAGES)
+
+    def test_binary_can_data_with_each_codec(self):
+        for name in JSON_CODECS:
+            JsonFormatter.set_codec(name)
+            for data in [b"\x00\x12\xab", bytearray(b"\x00\x12\xab"),
+                    0x12ab]:
+                serialized = JsonFormatter.serialize(
+                        {'bus': 1, 'id': 1234, 'data': data})
+                eq_(json.loads(serialized.decode("utf8"))['data'],
+                        "0x0012ab" if not isinstance(data, int) else "0x12ab")
+
+    def test_set_codec(self):
+        JsonFormatter.set_codec("json")
+        eq_(JsonFormatter.codec.name, "json")
+        JsonFormatter.set_codec("auto")
+        eq_(JsonFormatter.codec, list(JSON_CODECS.values())[0])
+
+    def test_unknown_codec(self):
+        self.assertRaises(UnrecognizedJsonCodecError, JsonFormatter.set_codec,
+                "not-a-json-library")
@@ -0,0 +1,61 @@
+from nose.tools import eq_, ok_
+import unittest
+
+from openxc.formats.base import MessageBuffer
+
+class MessageBufferTests(unittest.TestCase):
+    def setUp(self):
+        super(MessageBufferTests, self).setUp()
+        self.buffer = MessageBuffer()
+
+    def test_extend_and_take(self):
+        self.buffer.extend(b"foo\x00bar")
+        eq_(len(self.buffer), 7)
+        eq_(self.buffer.find(b"\x00"), 3)
+        eq_(self.buffer.take(3), b"foo")
+        self.buffer.consume(1)
+        eq_(len(self.buffer), 3)
+        eq_(self.buffer[0], ord("b"))
+        eq_(self.buffer.find(b"\x00"), -1)
+
+    def test_take_until(self):
+        self.buffer.extend(b"foo\x00bar")
+        eq_(self.buffer.take_until(b"\x00"), b"foo")
+        eq_(self.buffer.take_until(b"\x00"), None)
+        eq_(len(self.buffer), 3)
+
+    def test_decode_varint(self):
+        self.buffer.extend(b"\x00\xac\x02\x01")
+        self.buffer.consume(1)
+        eq_(self.buffer.decode_varint(), (300, 2))
+        eq_(self.buffer.decode_varint(2), (1, 3))
+        self.buffer.consume(3)
+        self.buffer.extend(b"\x80")
+        self.assertRaises(IndexError, self.buffer.decode_varint)
+
+    def test_view_is_relative_to_offset(self):
+        self.buffer.extend(b"foobar")
+        self.buffer.consume(3)
+        with self.buffer.view(0, 2) as view:
+            eq_(view.tobytes(), b"ba")
+
+    def test_compacts_consumed_prefix(self):
+        chunk = b"x" * 1024
+        for _ in range(MessageBuffer.COMPACT_THRESHOLD // len(chunk) * 4):
+            self.buffer.extend(chunk)
+            self.buffer.consume(len(chunk) - 1)
+        ok_(len(self.buffer._data) < MessageBuffer.COMPACT_THRESHOLD * 2)
+
+    def test_extend_with_outstanding_view(self):
+        self.buffer.extend(b"foo")
+        view = self.buffer.view()
+        self.buffer.extend(b"bar")
+        eq_(self.buffer.take(6), b"foobar")
+        eq_(view.tobytes(), b"foo")
+
+    def test_max_size(self):
+        self.buffer = MessageBuffer(max_size=4)
+        eq_(self.buffer.extend(b"foobar"), 2)
+        eq_(len(self.buffer), 4)
+        eq_(self.buffer.bytes_dropped, 2)
+        eq_(self.buffer.take(4), b"obar")
@@ -0,0 +1,72 @@
+from nose.tools import eq_, ok_
+import time
+import unittest
+
+from .streamer_test_utils import BaseStreamerTests, BaseFormatterTests
+from .test_json_codecs import MESSAGES
+from openxc.formats.json import JsonStreamer
+from openxc.formats.messagepack import MessagePackStreamer, \
+        MessagePackFormatter
+
+class MessagePackStreamerTests(unittest.TestCase, BaseStreamerTests):
+    def setUp(self):
+        super(MessagePackStreamerTests, self).setUp()
+        self.streamer = MessagePackStreamer()
+
+    def test_same_as_json(self):
+        json_streamer = JsonStreamer()
+        json_streamer.receive(json_streamer.serialize_many(MESSAGES))
+        self.streamer.receive(self.streamer.serialize_many(MESSAGES))
+        eq_(self.streamer.parse_all(), json_streamer.parse_all())
+
+    def test_resync(self):
+        serialized_message = self.streamer.serialize_for_stream(
+                {'name': "foo", 'value': 42})
+        self.streamer.receive(b"\xc1\xc1" + serialized_message)
+        eq_(self.streamer.parse_all(), [{'name': "foo", 'value': 42}])
+        eq_(self.streamer.bytes_skipped, 2)
+        eq_(len(self.streamer.message_buffer), 0)
+
+    def test_resync_long_garbage(self):
+        serialized_message = self.streamer.serialize_for_stream(
+                {'name': "foo", 'value': 42})
+        # map markers that can't start a message, which used to cost a new
+        # unpacker over the rest of the buffer for every byte
+        garbage = b"\xde\xc1\x81\xc1" * (64 * 1024)
+        self.streamer.receive(serialized_message + garbage + serialized_message)
+        started = time.perf_counter()
+        eq_(self.streamer.parse_all(), [{'name': "foo", 'value': 42}] * 2)
+        ok_(time.perf_counter() - started < 1)
+        eq_(self.streamer.bytes_skipped, len(garbage))
+        eq_(self.streamer.messages_invalid, 1)
+        eq_(len(self.streamer.message_buffer), 0)
+
+    def test_resync_across_receives(self):
+        serialized_message = self.streamer.serialize_for_stream(
+                {'name': "foo", 'value': 42})
+        self.streamer.receive(b"\xc1\xc1" + serialized_message[:1])
+        eq_(self.streamer.parse_all(), [])
+        self.streamer.receive(serialized_message[1:])
+        eq_(self.streamer.parse_all(), [{'name': "foo", 'value': 42}])
+        eq_(self.streamer.bytes_skipped, 2)
+
+    def test_parse_next_message_in_one_pass(self):
+        messages = [{'name': "foo", 'value': value} for value in range(3)]
+        self.streamer.receive(self.streamer.serialize_many(messages))
+        eq_(self.streamer.parse_next_message(), messages[0])
+        # everything was parsed in the first pass
+        eq_(len(self.streamer.message_buffer), 0)
+        eq_(self.streamer.parse_next_message(), messages[1])
+        eq_(self.streamer.parse_all(), messages[2:])
+        eq_(self.streamer.parse_next_message(), None)
+
+    def test_non_map_is_invalid(self):
+        self.streamer.receive(b"\x05" + self.streamer.serialize_for_stream(
+                {'name': "foo", 'value': 42}))
+        eq_(len(self.streamer.parse_all()), 1)
+        eq_(self.streamer.messages_invalid, 1)
+
+class MessagePackFormatterTests(unittest.TestCase, BaseFormatterTests):
+    def setUp(self):
+        super(MessagePackFormatterTests, self).setUp()
+        self.formatter = MessagePackFormatter
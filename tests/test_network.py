@@ -1,9 +1,14 @@
 from nose.tools import eq_, ok_
+import socket
+import threading
+import time
 import unittest
 
 import openxc.measurements
 from openxc.sources import NetworkDataSource
 from openxc.sources import DataSourceError
+from openxc.sources.socket import SocketDataSource
+from openxc.formats.json import JsonStreamer
 
 class NetworkDataSourceTests(unittest.TestCase):
     def setUp(self):
@@ -17,3 +22,157 @@ class NetworkDataSourceTests(unittest.TestCase):
             s = NetworkDataSource(callback=callback, host='localhost')
         except DataSourceError as e:
             pass
+
+    def test_receive_from_local_server(self):
+        message_count = 20000
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+
+        def serve():
+            connection, _ = server.accept()
+            streamer = JsonStreamer()
+            connection.sendall(streamer.serialize_many(
+                    {'name': "vehicle_speed", 'value': value}
+                    for value in range(message_count)))
+            connection.close()
+            server.close()
+
+        server_thread = threading.Thread(target=serve)
+        server_thread.start()
+
+        received = []
+        source = NetworkDataSource(callback=received.append, host='127.0.0.1',
+                port=server.getsockname()[1], payload_format="json",
+                receive_size=16384)
+        started = time.time()
+        source.start()
+        source.join(10)
+        server_thread.join()
+        elapsed = time.time() - started
+
+        eq_(len(received), message_count)
+        eq_(received[-1]['value'], message_count - 1)
+        ok_(elapsed < 10)
+
+    def test_recv_fallback(self):
+        class RecvOnlySocket(object):
+            def __init__(self, data):
+                self.data = data
+
+            def recv(self, size):
+                data, self.data = self.data[:size], self.data[size:]
+                return data
+
+        source = SocketDataSource(receive_size=4)
+        source.socket = RecvOnlySocket(b"foo\x00bar")
+        eq_(source.read(), b"foo\x00")
+        eq_(source.read(), b"bar")
+
+
+class NetworkReconnectTests(unittest.TestCase):
+    def setUp(self):
+        super(NetworkReconnectTests, self).setUp()
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(1)
+        self.port = self.server.getsockname()[1]
+
+    def tearDown(self):
+        self.server.close()
+        super(NetworkReconnectTests, self).tearDown()
+
+    def _messages(self, start, count):
+        return JsonStreamer().serialize_many(
+                {'name': "vehicle_speed", 'value': value}
+                for value in range(start, start + count))
+
+    def test_reconnect_after_dropped_connections(self):
+        partial = self._messages(100, 1)[:10]
+
+        def serve():
+            # drop the first connection in the middle of a message, and the
+            # second one cleanly
+            for payload in [self._messages(0, 100) + partial,
+                    self._messages(200, 100)]:
+                connection, _ = self.server.accept()
+                connection.sendall(payload)
+                connection.close()
+            connection, _ = self.server.accept()
+            connection.sendall(self._messages(300, 100))
+            # keep the last connection open until the source stops
+            connection.recv(1)
+            connection.close()
+
+        server_thread = threading.Thread(target=serve)
+        server_thread.start()
+
+        received = []
+        source = NetworkDataSource(callback=received.append, host='127.0.0.1',
+                port=self.port, reconnect=True, reconnect_delay=0.01)
+        source.start()
+        deadline = time.time() + 10
+        while len(received) < 300 and time.time() < deadline:
+            time.sleep(0.01)
+
+        source.stop()
+        source.socket.shutdown(socket.SHUT_RDWR)
+        source.join(1)
+        server_thread.join(1)
+
+        eq_([message['value'] for message in received],
+                list(range(100)) + list(range(200, 400)))
+        eq_(source.format, "json")
+        stats = source.stats()['connection']
+        eq_(stats['reconnects'], 2)
+        eq_(stats['bytes_lost'], len(partial))
+        ok_(stats['total_uptime'] > 0)
+
+    def test_backoff_delays(self):
+        source = NetworkDataSource(host='127.0.0.1', port=self.port,
+                reconnect=True, reconnect_delay=1, max_reconnect_delay=5,
+                max_reconnect_attempts=6)
+        eq_(list(source._reconnect_delays()), [1, 2, 4, 5, 5, 5])
+        source.socket.close()
+
+    def test_give_up_reconnecting(self):
+        def serve():
+            connection, _ = self.server.accept()
+            connection.sendall(self._messages(0, 10))
+            connection.close()
+            self.server.close()
+
+        server_thread = threading.Thread(target=serve)
+        server_thread.start()
+
+        received = []
+        source = NetworkDataSource(callback=received.append, host='127.0.0.1',
+                port=self.port, reconnect=True, reconnect_delay=0.01,
+                max_reconnect_attempts=3)
+        source.start()
+        source.join(5)
+        server_thread.join(1)
+
+        ok_(not source.is_alive())
+        eq_(len(received), 10)
+        stats = source.stats()['connection']
+        eq_(stats['reconnects'], 0)
+        eq_(stats['failed_reconnects'], 3)
+        eq_(stats['connected'], False)
+        eq_(stats['uptime'], 0)
+
+    def test_no_reconnect_by_default(self):
+        def serve():
+            connection, _ = self.server.accept()
+            connection.close()
+
+        server_thread = threading.Thread(target=serve)
+        server_thread.start()
+        source = NetworkDataSource(host='127.0.0.1', port=self.port,
+                payload_format="json")
+        source.start()
+        source.join(5)
+        server_thread.join(1)
+        ok_(not source.is_alive())
+        eq_(source.stats()['connection']['reconnects'], 0)
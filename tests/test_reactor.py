@@ -0,0 +1,138 @@
+from nose.tools import eq_, ok_
+import os
+import socket
+import threading
+import time
+import unittest
+
+from openxc.formats.binary import ProtobufStreamer
+from openxc.formats.json import JsonStreamer
+from openxc.sources import NetworkDataSource, SerialDataSource, \
+        SourceReactor, TraceDataSource, DataSourceError
+from openxc.sources import serial
+
+MESSAGE_COUNT = 500
+
+
+def serialized(streamer, source_index):
+    return streamer.serialize_many({'name': "vehicle_speed",
+        'value': source_index * MESSAGE_COUNT + value}
+        for value in range(MESSAGE_COUNT))
+
+
+class SourceReactorTests(unittest.TestCase):
+    def setUp(self):
+        super(SourceReactorTests, self).setUp()
+        self.reactor = SourceReactor(select_timeout=0.1)
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(32)
+        self.connections = []
+
+    def tearDown(self):
+        self.reactor.stop()
+        if self.reactor.is_alive():
+            self.reactor.join(1)
+        for connection in self.connections:
+            connection.close()
+        self.server.close()
+        super(SourceReactorTests, self).tearDown()
+
+    def _network_source(self, received, **kwargs):
+        source = NetworkDataSource(callback=received.append,
+                host='127.0.0.1', port=self.server.getsockname()[1],
+                **kwargs)
+        connection, _ = self.server.accept()
+        self.connections.append(connection)
+        return source, connection
+
+    def _wait_for(self, condition, timeout=10):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            time.sleep(0.01)
+        return condition()
+
+    def test_many_network_sources_one_thread(self):
+        source_count = 20
+        threads_before = threading.active_count()
+        received = [[] for _ in range(source_count)]
+        for index in range(source_count):
+            source, connection = self._network_source(received[index])
+            self.reactor.add_source(source)
+            streamer = ProtobufStreamer() if index % 2 else JsonStreamer()
+            connection.sendall(serialized(streamer, index))
+        self.reactor.start()
+
+        ok_(self._wait_for(lambda: all(len(messages) == MESSAGE_COUNT
+            for messages in received)))
+        eq_(threading.active_count(), threads_before + 1)
+        for index, messages in enumerate(received):
+            eq_([message['value'] for message in messages],
+                    list(range(index * MESSAGE_COUNT,
+                        (index + 1) * MESSAGE_COUNT)))
+        eq_(self.reactor.stats()['sources'], source_count)
+
+    def test_closed_source_removed(self):
+        received = []
+        source, connection = self._network_source(received,
+                payload_format="json")
+        self.reactor.start()
+        self.reactor.add_source(source)
+        connection.sendall(serialized(JsonStreamer(), 0))
+        connection.close()
+        ok_(self._wait_for(lambda: len(received) == MESSAGE_COUNT))
+        ok_(self._wait_for(lambda: len(self.reactor.sources) == 0))
+
+    def test_remove_source(self):
+        received = []
+        source, connection = self._network_source(received,
+                payload_format="json")
+        self.reactor.start()
+        self.reactor.add_source(source)
+        ok_(self._wait_for(lambda: len(self.reactor.sources) == 1))
+        self.reactor.remove_source(source)
+        ok_(self._wait_for(lambda: len(self.reactor.sources) == 0))
+        connection.sendall(serialized(JsonStreamer(), 0))
+        time.sleep(0.1)
+        eq_(received, [])
+
+    def test_dispatch_queue(self):
+        received = []
+        source, connection = self._network_source(received,
+                payload_format="json", dispatch_queue_size=16)
+        self.reactor.add_source(source)
+        self.reactor.start()
+        connection.sendall(serialized(JsonStreamer(), 0))
+        ok_(self._wait_for(lambda: len(received) == MESSAGE_COUNT))
+
+    def test_source_without_file_descriptor(self):
+        self.assertRaises(DataSourceError, self.reactor.add_source,
+                TraceDataSource(filename="tests/trace.json"))
+
+    @unittest.skipIf(serial.serial is None or
+            not hasattr(os, 'openpty'), "requires pyserial and a pty")
+    def test_network_and_serial_devices(self):
+        received = [[], []]
+        source, connection = self._network_source(received[0])
+        self.reactor.add_source(source)
+        connection.sendall(serialized(JsonStreamer(), 0))
+
+        master, slave = os.openpty()
+        serial_device = SerialDataSource(port=os.ttyname(slave),
+                callback=received[1].append, payload_format="json")
+        os.close(slave)
+        self.reactor.add_source(serial_device)
+        self.reactor.start()
+        data = serialized(JsonStreamer(), 1)
+        for start in range(0, len(data), 1024):
+            os.write(master, data[start:start + 1024])
+
+        try:
+            ok_(self._wait_for(lambda: len(received[0]) == MESSAGE_COUNT and
+                len(received[1]) == MESSAGE_COUNT))
+            eq_(received[1][-1]['value'], 2 * MESSAGE_COUNT - 1)
+        finally:
+            self.reactor.remove_source(serial_device)
+            self._wait_for(lambda: serial_device not in self.reactor.sources)
+            serial_device.device.close()
+            os.close(master)
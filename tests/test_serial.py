@@ -1,9 +1,13 @@
 from nose.tools import eq_, ok_
+import os
+import threading
 import unittest
 
 import openxc.measurements
 from openxc.sources import SerialDataSource
 from openxc.sources import DataSourceError
+from openxc.sources import serial as serial_source
+from openxc.formats.json import JsonStreamer
 
 class SerialDataSourceTests(unittest.TestCase):
     def setUp(self):
@@ -17,3 +21,47 @@ class SerialDataSourceTests(unittest.TestCase):
             s = SerialDataSource(callback=callback)
         except DataSourceError as e:
             pass
+
+    @unittest.skipIf(serial_source.serial is None or
+            not hasattr(os, 'openpty'), "requires pyserial and a pty")
+    def test_bulk_read_from_pty(self):
+        master, slave = os.openpty()
+        received = []
+        source = SerialDataSource(port=os.ttyname(slave),
+                callback=received.append, payload_format="json")
+        os.close(slave)
+        message_count = 2000
+        serialized = JsonStreamer().serialize_many(
+                {'name': "vehicle_speed", 'value': value}
+                for value in range(message_count))
+
+        def write():
+            for start in range(0, len(serialized), 1024):
+                os.write(master, serialized[start:start + 1024])
+
+        reads = []
+        read = source.read
+        def counting_read():
+            data = read()
+            reads.append(len(data))
+            return data
+        source.read = counting_read
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        source.start()
+        writer.join()
+        for _ in range(50):
+            if len(received) == message_count:
+                break
+            source.join(0.1)
+        source.stop()
+        source.join(1)
+        source.device.close()
+        os.close(master)
+
+        eq_(len(received), message_count)
+        eq_(received[-1]['value'], message_count - 1)
+        # many bytes per read, not one
+        ok_(len(serialized) / float(len([size for size in reads if size > 0]))
+                > 16)
@@ -0,0 +1,57 @@
+from nose.tools import eq_, ok_
+import unittest
+
+from openxc.formats.binary import ProtobufStreamer
+from openxc.formats.json import JsonStreamer
+from openxc.formats.sniff import sniff_payload_format, PayloadFormatSniffer
+
+MESSAGES = [{'name': "vehicle_speed", 'value': 42},
+        {'bus': 1, 'id': 1234, 'data': "0x1234"},
+        {'name': "button_event", 'value': "up", 'event': "pressed"}]
+
+
+class SniffPayloadFormatTests(unittest.TestCase):
+    def setUp(self):
+        super(SniffPayloadFormatTests, self).setUp()
+        self.json = JsonStreamer().serialize_many(MESSAGES)
+        self.protobuf = ProtobufStreamer().serialize_many(MESSAGES)
+
+    def test_json(self):
+        eq_(sniff_payload_format(self.json), "json")
+
+    def test_json_from_middle_of_message(self):
+        eq_(sniff_payload_format(self.json[5:]), "json")
+
+    def test_partial_json_needs_more_data(self):
+        eq_(sniff_payload_format(self.json[:10]), None)
+        eq_(sniff_payload_format(self.json[:10], final=True), "json")
+
+    def test_protobuf(self):
+        eq_(sniff_payload_format(self.protobuf), "protobuf")
+
+    def test_protobuf_from_middle_of_message(self):
+        protobuf = ProtobufStreamer().serialize_many(MESSAGES * 10)
+        eq_(sniff_payload_format(protobuf[3:]), "protobuf")
+
+    def test_partial_protobuf_needs_more_data(self):
+        eq_(sniff_payload_format(self.protobuf[:3]), None)
+        eq_(sniff_payload_format(self.protobuf[:3], final=True), "protobuf")
+
+    def test_empty(self):
+        eq_(sniff_payload_format(b""), None)
+        eq_(sniff_payload_format(b"\x00\x00", final=True), None)
+
+    def test_sniffer_accumulates(self):
+        sniffer = PayloadFormatSniffer()
+        for start in range(0, len(self.protobuf), 2):
+            payload_format = sniffer.receive(self.protobuf[start:start + 2])
+            if payload_format is not None:
+                break
+        eq_(payload_format, "protobuf")
+        eq_(bytes(sniffer.buffer), self.protobuf[:start + 2])
+
+    def test_sniffer_gives_up(self):
+        sniffer = PayloadFormatSniffer()
+        eq_(sniffer.receive(b"{" + b" " * 10), None)
+        eq_(sniffer.receive(b" " * PayloadFormatSniffer.MAX_SNIFF_SIZE),
+                "json")
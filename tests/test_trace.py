@@ -1,9 +1,25 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+import threading
+import time
 import unittest
-from nose.tools import ok_
+from nose.tools import eq_, ok_
 
-from openxc.sources import TraceDataSource
+from openxc.formats.binary import ProtobufStreamer
+from openxc.formats.json import JsonFormatter
+from openxc.sources import TraceDataSource, MultiTraceDataSource, \
+        DataSourceError
+from openxc.sources.tracefile import compression_format, trace_format, \
+        ReadAheadFile
+from openxc.sources.traceindex import TraceIndex, record_timestamp
+from openxc.tools.tracesplit import TripSplitter, TimeSplitter
 
-class TraceDataSourceTests(unittest.TestCase):
+from .trace_test_utils import TraceFileTests, corrupt_trace
+
+class TraceDataSourceTests(TraceFileTests, unittest.TestCase):
     def _receive(self, message, **kwargs):
         self.received = True
 
@@ -22,3 +38,338 @@ class TraceDataSourceTests(unittest.TestCase):
         self.source.start()
         self.source.join()
         ok_(self.received)
+
+    def test_stats(self):
+        self.source = TraceDataSource(filename="tests/trace-no-timestamp.json",
+                callback=self._receive, loop=False)
+        eq_(self.source.format, "json")
+        eq_(sum(self.source.stats()['messages_parsed'].values()), 0)
+        self.source.start()
+        self.source.join()
+        stats = self.source.stats()
+        ok_(stats['bytes_received'] > 0)
+        ok_(sum(stats['messages_parsed'].values()) > 0)
+        eq_(stats['callback_time']['count'],
+                sum(stats['messages_parsed'].values()) -
+                stats['corrupted_messages'])
+
+    def test_direct_same_as_stream(self):
+        streamed = self._replay(filename="tests/trace-shorter.json")
+        direct = self._replay(filename="tests/trace-shorter.json",
+                direct=True)
+        eq_(len(direct), 1000)
+        eq_(direct, streamed)
+        stats = self.source.stats()
+        eq_(sum(stats['messages_parsed'].values()), 1000)
+        eq_(stats['corrupted_messages'], 0)
+
+    def test_direct_loop(self):
+        received = []
+        source = TraceDataSource(filename="tests/trace-no-timestamp.json",
+                callback=received.append, loop=True, realtime=False,
+                direct=True)
+        source.start()
+        while len(received) < 30:
+            source.join(0.01)
+        source.stop()
+        source.join()
+        eq_(received[0], received[9])
+
+
+class TraceSplitterTests(unittest.TestCase):
+    def test_split_by_trip(self):
+        buckets = TripSplitter().split(["tests/trace.json"])
+        eq_(sum(len(records) for records in buckets.values()), 250)
+
+
+class TraceWindowTests(TraceFileTests, unittest.TestCase):
+    def setUp(self):
+        super(TraceWindowTests, self).setUp()
+        self.filename = self._write("trace.json", b"".join(
+            JsonFormatter.serialize({'name': "foo", 'value': index,
+                'timestamp': 1000 + index * 0.1}) + b"\n"
+            for index in range(5000)))
+
+    def _values(self, **kwargs):
+        return [message['value'] for message in self._replay(
+            filename=self.filename, direct=True, **kwargs)]
+
+    def test_window(self):
+        eq_(self._values(start_time=1250, end_time=1260), list(range(2500,
+            2601)))
+        ok_(os.path.exists(TraceIndex.index_filename(self.filename)))
+
+    def test_window_without_index(self):
+        eq_(self._values(start_time=1250, end_time=1260, use_index=False),
+                list(range(2500, 2601)))
+        ok_(not os.path.exists(TraceIndex.index_filename(self.filename)))
+
+    def test_open_ended_windows(self):
+        eq_(self._values(start_time=1499.85), [4999])
+        eq_(self._values(end_time=1000.15), [0, 1])
+        eq_(self._values(start_time=2000), [])
+
+    def test_index(self):
+        index = TraceIndex.build(self.filename, records_per_entry=100)
+        eq_(len(index.offsets), 50)
+        eq_(index.offset_for(0), 0)
+        with open(self.filename, "rb") as trace_file:
+            trace_file.seek(index.offset_for(1250))
+            ok_(record_timestamp(trace_file.readline()) <= 1250)
+        eq_(index.offset_for(5000), os.path.getsize(self.filename))
+
+    def test_index_reused_until_trace_changes(self):
+        TraceIndex.for_trace(self.filename)
+        ok_(TraceIndex.load(self.filename) is not None)
+        with open(self.filename, "ab") as trace_file:
+            trace_file.write(b'{"name": "foo", "value": 1, "timestamp": 9}\n')
+        ok_(TraceIndex.load(self.filename) is None)
+
+    def test_replay_speed(self):
+        # 50 records over 4.9s of trace time
+        started = time.time()
+        received = self._replay(filename=self.filename, realtime=True,
+                direct=True, end_time=1004.9, speed=20)
+        elapsed = time.time() - started
+        eq_(len(received), 50)
+        ok_(0.2 < elapsed < 0.5)
+        drift = self.source.stats()['replay_drift']
+        eq_(drift['count'], 50)
+        ok_(drift['max'] < 0.05)
+
+    def test_invalid_speed(self):
+        self.assertRaises(DataSourceError, TraceDataSource,
+                filename=self.filename, speed=0)
+
+
+class CompressedTraceTests(TraceFileTests, unittest.TestCase):
+    def setUp(self):
+        super(CompressedTraceTests, self).setUp()
+        with open("tests/trace.json", "rb") as trace_file:
+            self.trace = trace_file.read()
+
+    def test_compressed_traces(self):
+        expected = self._replay(filename="tests/trace.json", direct=True)
+        eq_(len(expected), 250)
+        for name, compress, compression in [
+                ("trace.json.gz", gzip.compress, "gzip"),
+                ("trace.json.bz2", bz2.compress, "bz2"),
+                ("trace.json.xz", lzma.compress, "xz"),
+                # detected by magic bytes, not extension
+                ("trace-gzip.json", gzip.compress, "gzip")]:
+            filename = self._write(name, compress(self.trace))
+            eq_(compression_format(filename), compression)
+            eq_(self._replay(filename=filename, direct=True), expected)
+            eq_(self._replay(filename=filename), expected)
+
+    def test_compressed_window(self):
+        filename = self._write("trace.json.gz", gzip.compress(self.trace))
+        received = self._replay(filename=filename, direct=True,
+                start_time=1364323939.1, end_time=1364323939.3)
+        ok_(len(received) > 0)
+        ok_(all(1364323939.1 <= message['timestamp'] <= 1364323939.3
+                for message in received))
+        eq_(received, [message for message in self._replay(
+            filename="tests/trace.json", direct=True)
+            if 1364323939.1 <= message['timestamp'] <= 1364323939.3])
+
+    def test_plain_trace_not_compressed(self):
+        eq_(compression_format("tests/trace.json"), None)
+
+    def test_corrupt_compressed_traces(self):
+        for name, compress in [("corrupt.json.xz", lzma.compress),
+                ("corrupt.json.gz", gzip.compress)]:
+            filename = self._write(name, corrupt_trace(compress))
+            for direct in (True, False):
+                source = TraceDataSource(filename=filename, loop=False,
+                        realtime=False, direct=direct)
+                records = 0
+                with self.assertRaises(DataSourceError) as context:
+                    while True:
+                        source._read_record()
+                        records += 1
+                ok_("Unable to read trace file" in str(context.exception))
+                ok_(0 < records < 20000)
+                eq_(source.trace_file, None)
+
+    def test_corrupt_compressed_trace_ends_replay(self):
+        errors = []
+        original_excepthook = threading.excepthook
+        threading.excepthook = errors.append
+        try:
+            filename = self._write("corrupt.json.xz",
+                    corrupt_trace(lzma.compress))
+            received = self._replay(filename=filename)
+        finally:
+            threading.excepthook = original_excepthook
+        eq_(errors, [])
+        ok_(0 < len(received) < 20000)
+
+
+class ProtobufTraceTests(TraceFileTests, unittest.TestCase):
+    def setUp(self):
+        super(ProtobufTraceTests, self).setUp()
+        with open("tests/trace.json", "rb") as trace_file:
+            self.messages = [JsonFormatter.deserialize(line)
+                    for line in trace_file if line.strip()]
+        streamer = ProtobufStreamer()
+        self.trace = b"".join(streamer.serialize_for_stream(message)
+                for message in self.messages)
+        self.filename = self._write("trace.pb", self.trace)
+
+    def _replayed(self, filename, **kwargs):
+        return [(message['name'], message['timestamp'])
+                for message in self._replay(filename=filename, **kwargs)]
+
+    def _expected(self, start_time=None, end_time=None):
+        return [(message['name'], message['timestamp'])
+                for message in self.messages
+                if (start_time is None or message['timestamp'] >= start_time)
+                and (end_time is None or message['timestamp'] <= end_time)]
+
+    def test_detected(self):
+        eq_(trace_format(self.filename), "protobuf")
+        eq_(trace_format("tests/trace.json"), "json")
+        eq_(TraceDataSource(filename=self.filename).format, "protobuf")
+
+    def test_replay(self):
+        eq_(self._replayed(self.filename, direct=True), self._expected())
+        eq_(self._replayed(self.filename), self._expected())
+
+    def test_compressed(self):
+        filename = self._write("trace.pb.gz", gzip.compress(self.trace))
+        eq_(self._replayed(filename, direct=True), self._expected())
+
+    def test_partial_last_message(self):
+        filename = self._write("partial.pb", self.trace[:-3])
+        eq_(self._replayed(filename, direct=True), self._expected()[:-1])
+
+    def test_window(self):
+        start_time, end_time = 1364323939.1, 1364323939.3
+        ok_(len(self._expected(start_time, end_time)) > 0)
+        TraceIndex.build(self.filename, records_per_entry=10).save(
+                self.filename)
+        eq_(self._replayed(self.filename, direct=True, start_time=start_time,
+            end_time=end_time), self._expected(start_time, end_time))
+
+    def test_compressed_index_past_the_end(self):
+        filename = self._write("trace.pb.gz", gzip.compress(self.trace))
+        index = TraceIndex.build(filename, records_per_entry=10)
+        # past the end of the decompressed records, not the compressed file
+        eq_(index.offset_for(float("inf")), len(self.trace))
+        index.save(filename)
+        eq_(TraceIndex.load(filename).end, len(self.trace))
+        eq_(self._replayed(filename, direct=True,
+            start_time=self.messages[-1]['timestamp'] + 1), [])
+
+    def test_merge_with_json_fails(self):
+        self.assertRaises(DataSourceError, MultiTraceDataSource,
+                filenames=[self.filename, "tests/trace.json"])
+
+
+class ReadAheadFileTests(unittest.TestCase):
+    def setUp(self):
+        super(ReadAheadFileTests, self).setUp()
+        self.data = b"".join(b"line %d\n" % index for index in range(1000))
+
+    def _file(self, data):
+        read_ahead_file = ReadAheadFile(io.BytesIO(data))
+        read_ahead_file.CHUNK_SIZE = 7
+        return read_ahead_file
+
+    def test_lines_across_chunks(self):
+        with self._file(self.data) as read_ahead_file:
+            eq_(list(read_ahead_file), self.data.splitlines(True))
+
+    def test_last_line_without_newline(self):
+        read_ahead_file = self._file(b"foo\nbar")
+        eq_(read_ahead_file.readline(), b"foo\n")
+        eq_(read_ahead_file.readline(), b"bar")
+        eq_(read_ahead_file.readline(), b"")
+        read_ahead_file.close()
+
+    def test_seek_before_reading(self):
+        read_ahead_file = self._file(self.data)
+        read_ahead_file.seek(len(b"line 0\n"))
+        eq_(read_ahead_file.readline(), b"line 1\n")
+        self.assertRaises(IOError, read_ahead_file.seek, 0)
+        read_ahead_file.close()
+
+    def test_error_raised_again(self):
+        class FailingFile(io.BytesIO):
+            def read(self, size=-1):
+                raise lzma.LZMAError("Corrupt input data")
+
+        read_ahead_file = ReadAheadFile(FailingFile())
+        for _ in range(3):
+            self.assertRaises(lzma.LZMAError, read_ahead_file.readline)
+        self.assertRaises(lzma.LZMAError, read_ahead_file.read, 10)
+        self.assertRaises(lzma.LZMAError, list, read_ahead_file)
+        read_ahead_file.close()
+
+    def test_close_while_reading_ahead(self):
+        read_ahead_file = self._file(self.data * 10)
+        read_ahead_file.readline()
+        read_ahead_file.close()
+
+
+class MultiTraceDataSourceTests(TraceFileTests, unittest.TestCase):
+    def setUp(self):
+        super(MultiTraceDataSourceTests, self).setUp()
+        self.filenames = []
+        for part in range(3):
+            records = b"".join(JsonFormatter.serialize({'name': "foo",
+                'value': index, 'timestamp': 1000 + index * 0.1}) + b"\n"
+                for index in range(part, 3000, 3))
+            name = "trace-%d.json" % part
+            if part == 2:
+                name += ".gz"
+                records = gzip.compress(records)
+            self.filenames.append(self._write(name, records))
+
+    def _values(self, filenames, **kwargs):
+        kwargs.setdefault('direct', True)
+        return [message['value'] for message in self._replay(
+            MultiTraceDataSource, filenames=filenames, **kwargs)]
+
+    def test_merge(self):
+        eq_(self._values(self.filenames), list(range(3000)))
+
+    def test_merge_stream_mode(self):
+        eq_(self._values(self.filenames, direct=False), list(range(3000)))
+
+    def test_glob(self):
+        eq_(self._values(os.path.join(self.directory, "trace-*")),
+                list(range(3000)))
+
+    def test_window(self):
+        eq_(self._values(self.filenames, start_time=1100, end_time=1110),
+                list(range(1000, 1101)))
+
+    def test_no_files(self):
+        self.assertRaises(DataSourceError, MultiTraceDataSource,
+                filenames=os.path.join(self.directory, "missing-*"))
+
+    def test_split(self):
+        buckets = TimeSplitter("hour").split(self.filenames)
+        eq_([record['value'] for records in buckets.values()
+            for record in records], list(range(3000)))
+
+    def _write_unsorted(self):
+        return self._write("unsorted.json", b"".join(
+            JsonFormatter.serialize({'name': "foo", 'value': index,
+                'timestamp': 1000 + index * 0.1}) + b"\n"
+            for index in [3001, 3000]))
+
+    def test_unsorted_file_warns(self):
+        filenames = self.filenames + [self._write_unsorted()]
+        with self.assertLogs("openxc.sources.trace", "WARNING") as logs:
+            self._values(filenames)
+        eq_(len(logs.output), 1)
+        ok_("unsorted.json is not in time order" in logs.output[0])
+
+    def test_split_unsorted_file(self):
+        buckets = TimeSplitter("hour").split(self.filenames +
+                [self._write_unsorted()])
+        eq_([record['value'] for records in buckets.values()
+            for record in records], list(range(3002)))
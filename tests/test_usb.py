@@ -1,6 +1,11 @@
+from nose.tools import eq_, ok_
 import unittest
+from unittest import mock
+
+import usb.core
 
 from openxc.sources import UsbDataSource, DataSourceError
+from openxc.sources.usb import AdaptiveReadPolicy
 
 class UsbDataSourceTests(unittest.TestCase):
     def setUp(self):
@@ -9,3 +14,78 @@ class UsbDataSourceTests(unittest.TestCase):
     def test_create(self):
         def callback(message):
             pass
+
+
+class FakeUsbDevice(object):
+    """Stands in for a ``usb.core.Device``, producing ``bytes_per_read`` bytes
+    of data between each read.
+    """
+    def __init__(self, bytes_per_read=0):
+        self.bytes_per_read = bytes_per_read
+        self.pending = 0
+        self.requests = []
+
+    def set_configuration(self):
+        pass
+
+    def read(self, endpoint, size, interface, timeout):
+        self.requests.append((size, timeout))
+        self.pending += self.bytes_per_read
+        if self.pending == 0:
+            error = usb.core.USBError("timeout")
+            error.backend_error_code = UsbDataSource.LIBUSB1_TIMEOUT_CODE
+            raise error
+        received = min(size, self.pending)
+        self.pending -= received
+        return b"\x00" * received
+
+
+class AdaptiveReadPolicyTests(unittest.TestCase):
+    def _source(self, device, **kwargs):
+        with mock.patch('usb.core.find', return_value=[device]):
+            return UsbDataSource(**kwargs)
+
+    def _read(self, source, count):
+        for _ in range(count):
+            source.read()
+
+    def test_grows_when_reads_are_full(self):
+        source = self._source(FakeUsbDevice(bytes_per_read=100000))
+        self._read(source, 20)
+        eq_(source.read_policy.read_size, AdaptiveReadPolicy.MAX_READ_SIZE)
+        eq_(source.read_policy.timeout,
+                AdaptiveReadPolicy.DEFAULT_TARGET_LATENCY)
+
+    def test_shrinks_when_reads_are_partial(self):
+        source = self._source(FakeUsbDevice(bytes_per_read=10))
+        self._read(source, 20)
+        eq_(source.read_policy.read_size, AdaptiveReadPolicy.MIN_READ_SIZE)
+        eq_(source.read_policy.partial_reads, 20)
+
+    def test_settles_near_data_rate(self):
+        device = FakeUsbDevice(bytes_per_read=1000)
+        source = self._source(device)
+        self._read(source, 50)
+        sizes = [size for size, _ in device.requests[-10:]]
+        ok_(all(512 <= size <= 2048 for size in sizes))
+
+    def test_timeout_backs_off_when_idle(self):
+        device = FakeUsbDevice()
+        source = self._source(device, read_policy=AdaptiveReadPolicy(
+                target_latency=20, max_timeout=160))
+        self._read(source, 10)
+        eq_([timeout for _, timeout in device.requests[:4]], [20, 40, 80, 160])
+        eq_(source.read_policy.timeout, 160)
+        eq_(source.read_policy.empty_reads, 10)
+
+        device.bytes_per_read = 10
+        source.read()
+        eq_(source.read_policy.timeout, 20)
+
+    def test_stats(self):
+        source = self._source(FakeUsbDevice(bytes_per_read=100000))
+        self._read(source, 3)
+        stats = source.stats()['usb_reads']
+        eq_(stats['read_size'], 4096)
+        eq_(stats['peak_read_size'], 4096)
+        eq_(stats['full_reads'], 3)
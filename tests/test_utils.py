@@ -0,0 +1,43 @@
+from nose.tools import eq_, ok_
+import unittest
+
+from openxc.utils import Histogram
+
+class HistogramTests(unittest.TestCase):
+    def setUp(self):
+        super(HistogramTests, self).setUp()
+        self.histogram = Histogram()
+
+    def test_empty(self):
+        eq_(self.histogram.count, 0)
+        eq_(self.histogram.mean, 0)
+        eq_(self.histogram.percentile(99), 0)
+
+    def test_record(self):
+        for microseconds in [1, 2, 3, 4, 100]:
+            self.histogram.record(microseconds / 1e6)
+        eq_(self.histogram.count, 5)
+        ok_(abs(self.histogram.mean - 22e-6) < 1e-9)
+        eq_(self.histogram.max, 100000)
+        eq_(sum(self.histogram.buckets), 5)
+
+    def test_record_ns(self):
+        self.histogram.record_ns(1500)
+        self.histogram.record(1.5e-6)
+        eq_(self.histogram.count, 2)
+        eq_(self.histogram.total, 3000)
+        eq_(self.histogram.max, 1500)
+
+    def test_percentile_upper_bound(self):
+        for _ in range(99):
+            self.histogram.record(1e-6)
+        self.histogram.record(1e-3)
+        ok_(1e-6 <= self.histogram.percentile(50) < 2e-6)
+        ok_(1e-6 <= self.histogram.percentile(99) < 2e-6)
+        eq_(self.histogram.percentile(100), 1e-3)
+
+    def test_clear(self):
+        self.histogram.record(1)
+        self.histogram.clear()
+        eq_(self.histogram.count, 0)
+        eq_(self.histogram.as_dict()['buckets'], {})
@@ -0,0 +1,50 @@
+import os
+import shutil
+import tempfile
+
+from openxc.sources import TraceDataSource
+
+
+def corrupt_trace(compress):
+    """Return a compressed trace that's corrupt halfway through."""
+    # random values so the archive is big enough to corrupt well after the
+    # start
+    trace = b"".join(b'{"name": "vehicle_speed", "value": %d, '
+            b'"timestamp": %d}\n' % (int.from_bytes(os.urandom(6), "big"),
+                1364323939 + index) for index in range(20000))
+    data = bytearray(compress(trace))
+    middle = len(data) // 2
+    data[middle:middle + 64] = b"\xff" * 64
+    return bytes(data)
+
+
+class TraceFileTests(object):
+    """Mixin for tests that write trace files to a temporary directory and
+    replay them.
+    """
+    def setUp(self):
+        super(TraceFileTests, self).setUp()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(TraceFileTests, self).tearDown()
+
+    def _write(self, name, data):
+        filename = os.path.join(self.directory, name)
+        with open(filename, "wb") as trace_file:
+            trace_file.write(data)
+        return filename
+
+    def _replay(self, source_class=TraceDataSource, **kwargs):
+        """Replay a trace from start to finish with a ``source_class`` built
+        from ``kwargs``, returning the messages received. The source is kept
+        in ``self.source``.
+        """
+        received = []
+        kwargs.setdefault('loop', False)
+        kwargs.setdefault('realtime', False)
+        self.source = source_class(callback=received.append, **kwargs)
+        self.source.start()
+        self.source.join()
+        return received